@@ -0,0 +1,133 @@
+# casino_app/asgi.py
+"""
+Async serving mode: the same API as main.py on an event loop.
+
+Every route awaits the database through pymongo's asyncio client instead of
+holding a worker thread, so one process serves thousands of concurrent
+connections. Game engines, validation and response shapes are shared with
+the WSGI app, and tokens issued by either app are accepted by both.
+
+Usage:
+    uvicorn asgi:app --workers 4
+    GUNICORN_PROFILE=asgi gunicorn -c gunicorn.conf.py
+"""
+import asyncio
+import os
+import logging
+from quart import Quart, Response, jsonify, request
+from dotenv import load_dotenv
+
+from auth.async_user_management import auth_blueprint
+from games.async_game_manager import game_blueprint
+from betting.async_bet_manager import betting_blueprint
+from payments.async_transaction_manager import payment_blueprint
+from stats.async_stats_manager import stats_blueprint
+from stats.stats_manager import operator_error
+from utils.provably_fair import verify_fairness
+from utils.verification import MAX_BULK_VERIFICATIONS, bulk_cost, verification_args, verification_error, verify_games
+from utils.settlement import game_results_queue
+from utils.player_stats import stats_queue
+from utils.ledger import ledger_queue
+from utils.password_hashing import password_hasher
+from utils.rate_limit import admission_control, rate_limited_async
+from utils.user_cache import user_cache
+from utils.json_provider import FastJSONProvider
+from utils import metrics
+from db.database import get_async_db, get_db
+from db.indexes import ensure_indexes
+from games.game_registry import load_engines
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler("casino_app.log"), logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
+
+app.json = FastJSONProvider(app)
+metrics.init_async_app(app)
+
+app.register_blueprint(auth_blueprint, url_prefix='/api/auth')
+app.register_blueprint(game_blueprint, url_prefix='/api/games')
+app.register_blueprint(betting_blueprint, url_prefix='/api/betting')
+app.register_blueprint(payment_blueprint, url_prefix='/api/payments')
+app.register_blueprint(stats_blueprint, url_prefix='/api/stats')
+
+@app.before_serving
+async def open_storage():
+    # The async client binds to this worker's event loop on first use
+    await get_async_db().ping()
+    load_engines()
+    await asyncio.to_thread(password_hasher.needs_rehash, '')
+    if os.getenv('ENSURE_INDEXES', 'True') == 'True':
+        await asyncio.to_thread(ensure_indexes, get_db())
+
+@app.after_serving
+async def close_storage():
+    await asyncio.to_thread(game_results_queue.close)
+    await asyncio.to_thread(stats_queue.close)
+    await asyncio.to_thread(ledger_queue.close)
+    await get_async_db().close()
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        "status": "healthy",
+        "version": "1.0.0",
+        "audit_queue": game_results_queue.stats(),
+        "stats_queue": stats_queue.stats(),
+        "ledger_queue": ledger_queue.stats(),
+        "password_hasher": password_hasher.stats(),
+        "user_cache": user_cache.stats(),
+        "rate_limiter": admission_control.stats()
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics_endpoint():
+    # Same port as the players, so only scrapers holding the operator token
+    error = operator_error(request.headers.get('X-Operator-Token'))
+    if error:
+        return jsonify(error[0]), error[1]
+    # Merging the workers' sample files is file I/O
+    body, content_type = await asyncio.to_thread(metrics.render_metrics)
+    return Response(body, content_type=content_type)
+
+@app.route('/api/verify-fairness', methods=['POST'])
+async def fairness_check():
+    game = await request.get_json(silent=True)
+    error = verification_error(game)
+    if error:
+        return jsonify({"error": error}), 400
+    result = verify_fairness(*verification_args(game))
+    return jsonify({"verified": result})
+
+@app.route('/api/verify-fairness/bulk', methods=['POST'])
+@rate_limited_async('verify.bulk', cost=bulk_cost, anonymous=True)
+async def bulk_fairness_check():
+    data = await request.get_json(silent=True)
+    games = data.get('games') if isinstance(data, dict) else None
+
+    if not isinstance(games, list) or not games:
+        return jsonify({"error": "games must be a non-empty list"}), 400
+    if len(games) > MAX_BULK_VERIFICATIONS:
+        return jsonify({"error": f"At most {MAX_BULK_VERIFICATIONS} games per request"}), 400
+
+    # Replaying thousands of rounds is CPU work; run it beside the loop
+    verdicts = await asyncio.to_thread(verify_games, [verification_args(game) for game in games])
+
+    return jsonify({
+        "results": [{"index": i, "verified": verified} for i, verified in enumerate(verdicts)],
+        "verified": sum(verdicts),
+        "failed": len(verdicts) - sum(verdicts)
+    })
+
+if __name__ == '__main__':
+    app.run(debug=os.getenv('FLASK_DEBUG', 'True') == 'True')
@@ -0,0 +1,91 @@
+# casino_app/betting/async_bet_manager.py
+from quart import Blueprint, Response, jsonify, request
+from auth.async_user_management import jwt_required, get_jwt_identity
+from betting.bet_manager import BET_FIELDS
+from db.database import get_async_db
+from utils.rate_limit import rate_limited_async
+from utils.settlement import debit_async, positive_amount, record_bet_async
+from utils.user_cache import user_key
+from utils.pagination import EXPORT_FORMATS, export_rows_async, keyset_page_async, parse_fields, parse_page_size
+
+# Same routes and responses as betting.bet_manager
+
+betting_blueprint = Blueprint('betting', __name__)
+
+@betting_blueprint.route('/place-bet', methods=['POST'])
+@jwt_required()
+@rate_limited_async('betting.place_bet')
+async def place_bet():
+    current_user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    game_id = data.get('game_id')
+    amount = data.get('amount')
+    bet_details = data.get('bet_details', {})
+
+    if not positive_amount(amount):
+        return jsonify({"error": "Bet amount must be positive"}), 400
+
+    db = get_async_db()
+
+    remaining_balance = await debit_async(db, current_user_id, amount)
+    if remaining_balance is None:
+        if not await db.users.find_one({"_id": user_key(current_user_id)}, {"_id": True}):
+            return jsonify({"error": "User not found"}), 404
+        return jsonify({"error": "Insufficient balance"}), 400
+
+    created_at = db.server_timestamp()
+    bet_id = (await db.bets.insert_one({
+        "user_id": current_user_id,
+        "game_id": game_id,
+        "amount": amount,
+        "bet_details": bet_details,
+        "status": "placed",
+        "created_at": created_at
+    })).inserted_id
+    await record_bet_async(current_user_id, bet_id, game_id, amount, created_at)
+
+    return jsonify({
+        "message": "Bet placed successfully",
+        "bet_id": str(bet_id),
+        "remaining_balance": remaining_balance
+    })
+
+@betting_blueprint.route('/bet-history', methods=['GET'])
+@jwt_required()
+async def get_bet_history():
+    current_user_id = get_jwt_identity()
+    db = get_async_db()
+
+    page_size = parse_page_size(request.args.get('limit'))
+    _, projection = parse_fields(request.args.get('fields'), BET_FIELDS)
+
+    try:
+        bets, next_cursor = await keyset_page_async(
+            db.bets,
+            {"user_id": current_user_id},
+            page_size,
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    return jsonify({"bets": bets, "next_cursor": next_cursor})
+
+@betting_blueprint.route('/bet-history/export', methods=['GET'])
+@jwt_required()
+async def export_bet_history():
+    current_user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Format must be ndjson or csv"}), 400
+
+    fields, _ = parse_fields(request.args.get('fields'), BET_FIELDS)
+    rows = export_rows_async(get_async_db().bets, {"user_id": current_user_id}, fields, fmt)
+
+    return Response(
+        rows,
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=bet-history.{fmt}"}
+    )
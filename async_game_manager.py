@@ -0,0 +1,219 @@
+# casino_app/games/async_game_manager.py
+import time
+from quart import Blueprint, Response, jsonify, request
+from auth.async_user_management import jwt_required, get_jwt_identity
+from db.database import get_async_db
+from games.game_manager import (AVAILABLE_GAMES_CACHE_CONTROL, MAX_BATCH_SPINS, available_games_body,
+                                batch_cost, game_record, valid_spins)
+from games.game_registry import get_engine
+from games.seed_sessions import get_active_session_async, claim_nonces_async, rotate_session_async
+from utils.provably_fair import RNG_VERSION, generate_server_seed, hash_server_seed
+from utils.settlement import (claim_prepared_seed_async, positive_amount, release_prepared_seed_async,
+                              settle_rounds_async)
+from utils.metrics import record_rounds
+from utils.rate_limit import rate_limited_async
+
+# Same routes and responses as games.game_manager. The slot engine is
+# shared; a round is a few microseconds of hashing, so it runs on the loop.
+
+game_blueprint = Blueprint('games', __name__)
+
+@game_blueprint.route('/available', methods=['GET'])
+async def get_available_games():
+    return Response(available_games_body(), mimetype='application/json',
+                    headers={"Cache-Control": AVAILABLE_GAMES_CACHE_CONTROL})
+
+@game_blueprint.route('/prepare', methods=['POST'])
+@jwt_required()
+async def prepare_game():
+    data = await request.get_json()
+    game_type = data.get('game_type')
+
+    server_seed = generate_server_seed()
+    server_seed_hash = hash_server_seed(server_seed)
+
+    db = get_async_db()
+    await db.game_seeds.insert_one({
+        "user_id": get_jwt_identity(),
+        "game_type": game_type,
+        "server_seed": server_seed,
+        "server_seed_hash": server_seed_hash,
+        "used": False,
+        "created_at": db.server_timestamp()
+    })
+
+    return jsonify({
+        "game_type": game_type,
+        "server_seed_hash": server_seed_hash,
+        "message": "Game prepared, ready for client seed"
+    })
+
+@game_blueprint.route('/seed-session', methods=['GET'])
+@jwt_required()
+async def get_seed_session():
+    session = await get_active_session_async(get_async_db(), get_jwt_identity())
+
+    return jsonify({
+        "server_seed_hash": session['server_seed_hash'],
+        "next_nonce": session['nonce']
+    })
+
+@game_blueprint.route('/seed-session/rotate', methods=['POST'])
+@jwt_required()
+async def rotate_seed_session():
+    previous, session = await rotate_session_async(get_async_db(), get_jwt_identity())
+
+    response = {
+        "server_seed_hash": session['server_seed_hash'],
+        "next_nonce": session['nonce']
+    }
+    if previous:
+        response["previous_session"] = {
+            "server_seed": previous['server_seed'],
+            "server_seed_hash": previous['server_seed_hash'],
+            "rounds_played": previous['nonce']
+        }
+    return jsonify(response)
+
+async def _claim_seed(db, user_id, server_seed_hash, use_seed_session, prepared_nonces):
+    if use_seed_session:
+        return await claim_nonces_async(db, user_id, server_seed_hash, len(prepared_nonces))
+
+    seed_doc = await claim_prepared_seed_async(db, user_id, server_seed_hash)
+    if not seed_doc:
+        return None, None
+    return seed_doc, prepared_nonces
+
+@game_blueprint.route('/play', methods=['POST'])
+@jwt_required()
+@rate_limited_async('games.play')
+async def play_game():
+    current_user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    game_type = data.get('game_type')
+    bet_amount = data.get('bet_amount')
+    client_seed = data.get('client_seed')
+    server_seed_hash = data.get('server_seed_hash')
+    use_seed_session = data.get('seed_session', False)
+
+    game = get_engine(game_type)
+    if not game:
+        return jsonify({"error": "Invalid game type"}), 400
+
+    if not positive_amount(bet_amount):
+        return jsonify({"error": "Bet amount must be positive"}), 400
+
+    db = get_async_db()
+    seed_doc, nonces = await _claim_seed(db, current_user_id, server_seed_hash, use_seed_session, [None])
+    if not seed_doc:
+        return jsonify({"error": "Invalid or used server seed"}), 400
+    nonce = nonces[0]
+
+    engine_started = time.perf_counter()
+    try:
+        result = game.play(
+            bet_amount=bet_amount,
+            client_seed=client_seed,
+            server_seed=seed_doc['server_seed'],
+            nonce=nonce
+        )
+    except Exception:
+        # The round never happened; let the prepared seed be played again
+        if not use_seed_session:
+            await release_prepared_seed_async(db, seed_doc)
+        raise
+    engine_seconds = time.perf_counter() - engine_started
+
+    new_balance = await settle_rounds_async(db, current_user_id, bet_amount, result['payout'], [
+        game_record(current_user_id, game_type, bet_amount, result, client_seed,
+                    seed_doc, nonce, use_seed_session, db.server_timestamp())
+    ])
+    if new_balance is None:
+        if not use_seed_session:
+            await release_prepared_seed_async(db, seed_doc)
+        return jsonify({"error": "Insufficient balance"}), 400
+
+    record_rounds(game_type, 'play', engine_seconds, 1, bet_amount, result['payout'])
+
+    response = {
+        "result": result,
+        "new_balance": new_balance,
+        "nonce": nonce,
+        "rng_version": RNG_VERSION
+    }
+    if not use_seed_session:
+        response["server_seed"] = seed_doc['server_seed']  # Reveal the server seed after use
+    return jsonify(response)
+
+@game_blueprint.route('/play-batch', methods=['POST'])
+@jwt_required()
+@rate_limited_async('games.play', cost=batch_cost)
+async def play_batch():
+    current_user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    game_type = data.get('game_type')
+    bet_amount = data.get('bet_amount')
+    client_seed = data.get('client_seed')
+    server_seed_hash = data.get('server_seed_hash')
+    num_spins = data.get('num_spins')
+    use_seed_session = data.get('seed_session', False)
+
+    if game_type != 'slots':
+        return jsonify({"error": "Batch play is only available for slots"}), 400
+
+    if not valid_spins(num_spins):
+        return jsonify({"error": f"num_spins must be between 1 and {MAX_BATCH_SPINS}"}), 400
+
+    if not positive_amount(bet_amount):
+        return jsonify({"error": "Bet amount must be positive"}), 400
+
+    game = get_engine(game_type)
+
+    db = get_async_db()
+    seed_doc, nonces = await _claim_seed(db, current_user_id, server_seed_hash, use_seed_session,
+                                         list(range(num_spins)))
+    if not seed_doc:
+        return jsonify({"error": "Invalid or used server seed"}), 400
+
+    engine_started = time.perf_counter()
+    try:
+        results = game.play_batch(
+            bet_amount=bet_amount,
+            client_seed=client_seed,
+            server_seed=seed_doc['server_seed'],
+            nonces=nonces
+        )
+    except Exception:
+        # No spin was settled; let the prepared seed be played again
+        if not use_seed_session:
+            await release_prepared_seed_async(db, seed_doc)
+        raise
+    engine_seconds = time.perf_counter() - engine_started
+
+    total_bet = bet_amount * num_spins
+    total_payout = sum(result['payout'] for result in results)
+    timestamp = db.server_timestamp()
+    new_balance = await settle_rounds_async(db, current_user_id, total_bet, total_payout, [
+        game_record(current_user_id, game_type, bet_amount, result, client_seed,
+                    seed_doc, nonce, use_seed_session, timestamp)
+        for nonce, result in zip(nonces, results)
+    ])
+    if new_balance is None:
+        if not use_seed_session:
+            await release_prepared_seed_async(db, seed_doc)
+        return jsonify({"error": "Insufficient balance"}), 400
+
+    record_rounds(game_type, 'play_batch', engine_seconds, num_spins, total_bet, total_payout)
+
+    response = {
+        "results": [dict(result, nonce=nonce) for nonce, result in zip(nonces, results)],
+        "total_bet": total_bet,
+        "total_payout": total_payout,
+        "new_balance": new_balance,
+        "rng_version": RNG_VERSION
+    }
+    if not use_seed_session:
+        response["server_seed"] = seed_doc['server_seed']  # Reveal the server seed after use
+    return jsonify(response)
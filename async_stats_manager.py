@@ -0,0 +1,45 @@
+# casino_app/stats/async_stats_manager.py
+from quart import Blueprint, jsonify, request
+from auth.async_user_management import jwt_required, get_jwt_identity
+from db.database import get_async_db
+from stats.stats_manager import operator_error
+from utils.player_stats import (dashboard_summary, dashboard_window, parse_dashboard_hours, player_summary,
+                                vip_summary)
+from utils.user_cache import load_profile_async, user_key
+
+# Same routes and responses as stats.stats_manager
+
+stats_blueprint = Blueprint('stats', __name__)
+
+@stats_blueprint.route('/me', methods=['GET'])
+@jwt_required()
+async def get_player_stats():
+    doc = await get_async_db().player_stats.find_one({"_id": user_key(get_jwt_identity())})
+    return jsonify(player_summary(doc))
+
+@stats_blueprint.route('/vip', methods=['GET'])
+@jwt_required()
+async def get_vip_status():
+    current_user_id = get_jwt_identity()
+    db = get_async_db()
+
+    profile = await load_profile_async(db, current_user_id)
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+
+    doc = await db.player_stats.find_one({"_id": user_key(current_user_id)}, {"totals.wagered": True})
+    return jsonify(vip_summary(profile.user.get('vip_status'), doc))
+
+@stats_blueprint.route('/dashboard', methods=['GET'])
+async def get_dashboard():
+    error = operator_error(request.headers.get('X-Operator-Token'))
+    if error:
+        return jsonify(error[0]), error[1]
+
+    db = get_async_db()
+    hours = parse_dashboard_hours(request.args.get('hours'))
+    hourly_filter, since = dashboard_window(hours, db.server_timestamp())
+
+    game_docs = await db.game_stats.find({}).to_list()
+    hourly_docs = await db.game_stats_hourly.find(hourly_filter).sort([("hour", 1), ("game_type", 1)]).to_list()
+    return jsonify(dashboard_summary(game_docs, hourly_docs, hours, since))
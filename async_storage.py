@@ -0,0 +1,150 @@
+# casino_app/db/async_storage.py
+from abc import ABC, abstractmethod
+from db.storage import utc_now
+
+# The ASGI app talks to storage through the pymongo async API: collection
+# methods are coroutines, find() returns a cursor that is chained
+# synchronously (sort, skip, limit, batch_size) and then consumed with
+# `async for` or `await cursor.to_list(length)`. Filters, updates and errors
+# are the same as for the synchronous backends described in db.storage.
+
+class AsyncStorage(ABC):
+    """A database for the event loop: named collections plus a server-side clock."""
+
+    @abstractmethod
+    def collection(self, name):
+        """Return the collection called name, creating it if needed."""
+
+    def server_timestamp(self):
+        """Timestamp stored in created_at/timestamp fields."""
+        return utc_now()
+
+    async def ping(self):
+        """Check the backend is reachable."""
+        return True
+
+    async def close(self):
+        """Release connections held by the backend."""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.collection(name)
+
+    def __getitem__(self, name):
+        return self.collection(name)
+
+class AsyncMongoStorage(AsyncStorage):
+    """Storage backed by MongoDB through pymongo's native asyncio client."""
+
+    def __init__(self, uri, **client_options):
+        from pymongo import AsyncMongoClient
+        self.client = AsyncMongoClient(uri, **client_options)
+        self.database = self.client.get_default_database('casino')
+
+    def collection(self, name):
+        return self.database[name]
+
+    async def ping(self):
+        await self.client.admin.command('ping')
+        return True
+
+    async def close(self):
+        await self.client.close()
+
+class _AsyncCursor:
+    """Async iteration over a synchronous cursor that never waits on I/O."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, key_or_list, direction=None):
+        self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self._cursor.limit(count)
+        return self
+
+    def batch_size(self, size):
+        self._cursor.batch_size(size)
+        return self
+
+    async def __aiter__(self):
+        for doc in self._cursor:
+            yield doc
+
+    async def to_list(self, length=None):
+        docs = []
+        for doc in self._cursor:
+            if length is not None and len(docs) >= length:
+                break
+            docs.append(doc)
+        return docs
+
+class _AsyncCollection:
+    """Coroutine facade over a collection of an in-memory backend."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return self._collection.count_documents(*args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return self._collection.insert_one(*args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return self._collection.insert_many(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return self._collection.update_one(*args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return self._collection.update_many(*args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return self._collection.bulk_write(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self._collection.find_one_and_update(*args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return self._collection.delete_one(*args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return self._collection.delete_many(*args, **kwargs)
+
+    async def create_indexes(self, *args, **kwargs):
+        return self._collection.create_indexes(*args, **kwargs)
+
+class AsyncEmbeddedStorage(AsyncStorage):
+    """
+    The embedded engine behind the async API.
+
+    Its operations run in memory under a short lock, so they are called
+    straight from the event loop. It wraps the same EmbeddedStorage the WSGI
+    app and the write-behind queues use, so both see the same data.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def collection(self, name):
+        return _AsyncCollection(self.storage.collection(name))
+
+    def server_timestamp(self):
+        return self.storage.server_timestamp()
+
+    async def ping(self):
+        return self.storage.ping()
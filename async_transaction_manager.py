@@ -0,0 +1,182 @@
+# casino_app/payments/async_transaction_manager.py
+import uuid
+from quart import Blueprint, Response, jsonify, request
+from pymongo.errors import DuplicateKeyError
+from auth.async_user_management import jwt_required, get_jwt_identity
+from db.database import get_async_db
+from payments.deposit_ingestion import MAX_WEBHOOK_EVENTS, ingest_deposits_async, webhook_error
+from payments.transaction_manager import DEPOSIT_METHODS, TRANSACTION_FIELDS
+from utils.ledger import deposit_entry, post_entries_async, withdrawal_entry
+from utils.settlement import adjust_balance_async, debit_async, positive_amount
+from utils.user_cache import user_cache, user_key
+from utils.pagination import EXPORT_FORMATS, export_rows_async, keyset_page_async, parse_fields, parse_page_size
+
+# Same routes and responses as payments.transaction_manager
+
+payment_blueprint = Blueprint('payments', __name__)
+
+@payment_blueprint.route('/deposit/methods', methods=['GET'])
+@jwt_required()
+async def get_deposit_methods():
+    return jsonify({"methods": DEPOSIT_METHODS})
+
+@payment_blueprint.route('/deposit/bitcoin/address', methods=['GET'])
+@jwt_required()
+async def get_bitcoin_address():
+    current_user_id = get_jwt_identity()
+    db = get_async_db()
+
+    wallet = await db.wallets.find_one({"user_id": user_key(current_user_id)})
+
+    if not wallet:
+        return jsonify({"error": "Wallet not found"}), 404
+
+    if not wallet.get('bitcoin_address'):
+        # Simulated Bitcoin address generation
+        bitcoin_address = f"bc1q{uuid.uuid4().hex[:32]}"
+
+        await db.wallets.update_one(
+            {"_id": wallet['_id']},
+            {"$set": {"bitcoin_address": bitcoin_address}, "$inc": {"version": 1}}
+        )
+        user_cache.invalidate(current_user_id)
+    else:
+        bitcoin_address = wallet['bitcoin_address']
+
+    return jsonify({
+        "address": bitcoin_address,
+        "qr_code_url": f"https://chart.googleapis.com/chart?chs=250x250&cht=qr&chl={bitcoin_address}"
+    })
+
+@payment_blueprint.route('/deposit/confirm', methods=['POST'])
+@jwt_required()
+async def confirm_deposit():
+    current_user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    amount = data.get('amount')
+    payment_method = data.get('payment_method')
+    transaction_id = data.get('transaction_id', str(uuid.uuid4()))
+
+    db = get_async_db()
+
+    created_at = db.server_timestamp()
+    try:
+        await db.transactions.insert_one({
+            "user_id": current_user_id,
+            "type": "deposit",
+            "amount": amount,
+            "payment_method": payment_method,
+            "transaction_id": transaction_id,
+            "status": "completed",
+            "created_at": created_at
+        })
+    except DuplicateKeyError:
+        return jsonify({
+            "message": "Deposit already confirmed",
+            "transaction_id": transaction_id,
+            "duplicate": True
+        })
+
+    if await adjust_balance_async(db, current_user_id, amount) is not None:
+        await post_entries_async(db, [deposit_entry(current_user_id, transaction_id, payment_method, amount, created_at)])
+
+    return jsonify({
+        "message": "Deposit confirmed successfully",
+        "amount": amount,
+        "transaction_id": transaction_id
+    })
+
+@payment_blueprint.route('/deposit/webhook', methods=['POST'])
+async def deposit_webhook():
+    error = webhook_error(await request.get_data(), request.headers.get('X-Webhook-Signature'))
+    if error:
+        return jsonify(error[0]), error[1]
+
+    data = await request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "events must be a non-empty list"}), 400
+    if len(events) > MAX_WEBHOOK_EVENTS:
+        return jsonify({"error": f"At most {MAX_WEBHOOK_EVENTS} events per request"}), 400
+
+    return jsonify(await ingest_deposits_async(get_async_db(), events))
+
+@payment_blueprint.route('/withdraw', methods=['POST'])
+@jwt_required()
+async def request_withdrawal():
+    current_user_id = get_jwt_identity()
+    data = await request.get_json()
+
+    amount = data.get('amount')
+    payment_method = data.get('payment_method')
+    destination = data.get('destination')
+
+    if not positive_amount(amount):
+        return jsonify({"error": "Withdrawal amount must be positive"}), 400
+
+    db = get_async_db()
+
+    remaining_balance = await debit_async(db, current_user_id, amount)
+    if remaining_balance is None:
+        if not await db.users.find_one({"_id": user_key(current_user_id)}, {"_id": True}):
+            return jsonify({"error": "User not found"}), 404
+        return jsonify({"error": "Insufficient balance"}), 400
+
+    created_at = db.server_timestamp()
+    withdrawal_id = (await db.transactions.insert_one({
+        "user_id": current_user_id,
+        "type": "withdrawal",
+        "amount": amount,
+        "payment_method": payment_method,
+        "destination": destination,
+        "status": "pending",
+        "created_at": created_at
+    })).inserted_id
+    await post_entries_async(db, [withdrawal_entry(current_user_id, withdrawal_id, payment_method, amount, created_at)])
+
+    return jsonify({
+        "message": "Withdrawal request submitted",
+        "withdrawal_id": str(withdrawal_id),
+        "status": "pending",
+        "remaining_balance": remaining_balance
+    })
+
+@payment_blueprint.route('/transactions', methods=['GET'])
+@jwt_required()
+async def get_transactions():
+    current_user_id = get_jwt_identity()
+    db = get_async_db()
+
+    page_size = parse_page_size(request.args.get('limit'))
+    _, projection = parse_fields(request.args.get('fields'), TRANSACTION_FIELDS)
+
+    try:
+        transactions, next_cursor = await keyset_page_async(
+            db.transactions,
+            {"user_id": current_user_id},
+            page_size,
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    return jsonify({"transactions": transactions, "next_cursor": next_cursor})
+
+@payment_blueprint.route('/transactions/export', methods=['GET'])
+@jwt_required()
+async def export_transactions():
+    current_user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Format must be ndjson or csv"}), 400
+
+    fields, _ = parse_fields(request.args.get('fields'), TRANSACTION_FIELDS)
+    rows = export_rows_async(get_async_db().transactions, {"user_id": current_user_id}, fields, fmt)
+
+    return Response(
+        rows,
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{fmt}"}
+    )
@@ -0,0 +1,150 @@
+# casino_app/auth/async_user_management.py
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+import jwt as pyjwt
+from quart import Blueprint, current_app, g, jsonify, request
+from auth.user_management import HASHER_BUSY_ERROR
+from db.database import get_async_db
+from utils.password_hashing import HasherBusy, password_hasher
+from utils.user_cache import load_profile_async, newest_seen_versions
+
+auth_blueprint = Blueprint('auth', __name__)
+
+# Tokens are interchangeable with the WSGI app: the same secret, algorithm,
+# claims and lifetime that flask_jwt_extended uses by default
+JWT_ALGORITHM = 'HS256'
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+
+def create_access_token(identity):
+    now = datetime.now(timezone.utc)
+    claims = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        "sub": identity,
+        "nbf": now,
+        "exp": now + ACCESS_TOKEN_EXPIRES
+    }
+    return pyjwt.encode(claims, current_app.config['JWT_SECRET_KEY'], algorithm=JWT_ALGORITHM)
+
+def jwt_required():
+    """Async counterpart of flask_jwt_extended.jwt_required, with its error responses."""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            header = request.headers.get('Authorization')
+            if not header:
+                return jsonify({"msg": "Missing Authorization Header"}), 401
+
+            scheme, _, token = header.partition(' ')
+            if scheme != 'Bearer' or not token:
+                return jsonify({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}), 422
+
+            try:
+                claims = pyjwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=[JWT_ALGORITHM])
+            except pyjwt.ExpiredSignatureError:
+                return jsonify({"msg": "Token has expired"}), 401
+            except pyjwt.InvalidTokenError as e:
+                return jsonify({"msg": str(e)}), 422
+            if claims.get('type') != 'access' or 'sub' not in claims:
+                return jsonify({"msg": "Only non-refresh tokens are allowed"}), 422
+
+            g.jwt_identity = claims['sub']
+            return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_jwt_identity():
+    return g.jwt_identity
+
+async def rehash_password(db, user, password):
+    """Async counterpart of auth.user_management.rehash_password."""
+    try:
+        new_hash = await password_hasher.hash_async(password)
+    except HasherBusy:
+        return
+    await db.users.update_one(
+        {"_id": user['_id'], "password": user['password']},
+        {"$set": {"password": new_hash}}
+    )
+
+@auth_blueprint.route('/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    db = get_async_db()
+
+    # Check if user exists
+    if await db.users.find_one({"username": data['username']}):
+        return jsonify({"error": "Username already exists"}), 400
+
+    # Hashing is deliberately slow CPU work; it runs on the hashing pool
+    try:
+        hashed_password = await password_hasher.hash_async(data['password'])
+    except HasherBusy:
+        return jsonify({"error": HASHER_BUSY_ERROR}), 503, {"Retry-After": "1"}
+    new_user = {
+        "username": data['username'],
+        "password": hashed_password,
+        "email": data['email'],
+        "balance": 0,
+        "vip_status": "standard",
+        "version": 0,
+        "created_at": db.server_timestamp()
+    }
+
+    user_id = (await db.users.insert_one(new_user)).inserted_id
+
+    # Create initial wallet for the user
+    await db.wallets.insert_one({
+        "user_id": user_id,
+        "bitcoin_address": "",  # To be generated or provided by user
+        "balance": 0,
+        "transactions": [],
+        "version": 0
+    })
+
+    return jsonify({"message": "User registered successfully"}), 201
+
+@auth_blueprint.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    db = get_async_db()
+
+    user = await db.users.find_one({"username": data['username']})
+
+    try:
+        valid = bool(user) and await password_hasher.verify_async(user['password'], data['password'])
+    except HasherBusy:
+        return jsonify({"error": HASHER_BUSY_ERROR}), 503, {"Retry-After": "1"}
+
+    if not valid:
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    if password_hasher.needs_rehash(user['password']):
+        await rehash_password(db, user, data['password'])
+
+    access_token = create_access_token(identity=str(user['_id']))
+    return jsonify({"token": access_token, "user_id": str(user['_id'])}), 200
+
+@auth_blueprint.route('/profile', methods=['GET'])
+@jwt_required()
+async def get_profile():
+    """See auth.user_management.get_profile, including its staleness bound."""
+    current_user_id = get_jwt_identity()
+
+    profile = await load_profile_async(get_async_db(), current_user_id, newest_seen_versions(request.if_none_match))
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+
+    if profile.etag in request.if_none_match:
+        return '', 304, {"ETag": f'"{profile.etag}"', "Cache-Control": "private, no-cache"}
+
+    response = jsonify({
+        "user": profile.user,
+        "wallet": profile.wallet
+    })
+    response.set_etag(profile.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response, 200
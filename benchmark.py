@@ -0,0 +1,312 @@
+# casino_app/benchmarks/benchmark.py
+"""
+Benchmarks for the API and the provably fair hot paths.
+
+The workload mode drives the real Flask app (main.app) through its test
+client with scripted players: register and log in, deposit, play prepared
+rounds and a seed-session batch, place bets, read history and withdraw.
+Players run concurrently on threads against an in-process EmbeddedStorage,
+so no MongoDB or network is involved and the numbers reflect the
+application code itself. Every request is timed and reported per endpoint
+as throughput and p50/p95/p99 latency.
+
+The micro mode times SlotMachine.play, generate_random_number and
+verify_fairness in tight loops.
+
+Results are written as JSON together with the git commit they were taken
+at; --compare checks them against an earlier file and exits non-zero when
+anything is slower by more than --threshold.
+
+Usage:
+    python -m benchmarks.benchmark workload --players 200 --concurrency 16 --output bench.json
+    python -m benchmarks.benchmark micro --iterations 20000 --output micro.json
+    python -m benchmarks.benchmark all --output new.json --compare baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def _summarize(samples, elapsed):
+    """Latency and throughput summary for a list of seconds."""
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "throughput_rps": len(samples) / elapsed if elapsed else None,
+        "mean_ms": sum(samples) / len(samples) * 1000 if samples else None,
+        "p50_ms": _percentile(samples, 0.50) * 1000 if samples else None,
+        "p95_ms": _percentile(samples, 0.95) * 1000 if samples else None,
+        "p99_ms": _percentile(samples, 0.99) * 1000 if samples else None,
+        "max_ms": samples[-1] * 1000 if samples else None
+    }
+
+class _Recorder:
+    """Collects per-endpoint latencies and status codes from many threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def call(self, client, method, endpoint, **kwargs):
+        started = time.perf_counter()
+        response = client.open(endpoint, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        name = f"{method} {endpoint}"
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][response.status_code] += 1
+        return response
+
+def _play_session(client, recorder, player, rounds, batch_spins, bet):
+    """One scripted player from registration to withdrawal."""
+    username = f"bench-{player}"
+    recorder.call(client, 'POST', '/api/auth/register',
+                  json={"username": username, "password": "bench-password", "email": f"{username}@example.com"})
+    login = recorder.call(client, 'POST', '/api/auth/login',
+                          json={"username": username, "password": "bench-password"})
+    if login.status_code != 200:
+        raise RuntimeError(f"Login for {username} failed with {login.status_code}: {login.get_data(as_text=True)}")
+    headers = {"Authorization": f"Bearer {login.get_json()['token']}"}
+
+    recorder.call(client, 'POST', '/api/payments/deposit/confirm', headers=headers,
+                  json={"amount": bet * (rounds + batch_spins) * 4 + 100, "payment_method": "bitcoin"})
+    recorder.call(client, 'GET', '/api/auth/profile', headers=headers)
+
+    for round_number in range(rounds):
+        prepared = recorder.call(client, 'POST', '/api/games/prepare', headers=headers,
+                                 json={"game_type": "slots"})
+        recorder.call(client, 'POST', '/api/games/play', headers=headers, json={
+            "game_type": "slots",
+            "bet_amount": bet,
+            "client_seed": f"{username}-{round_number}",
+            "server_seed_hash": prepared.get_json()['server_seed_hash']
+        })
+        if round_number % 5 == 4:
+            recorder.call(client, 'POST', '/api/betting/place-bet', headers=headers,
+                          json={"game_id": "slots", "amount": bet, "bet_details": {"round": round_number}})
+            recorder.call(client, 'GET', '/api/auth/profile', headers=headers)
+
+    if batch_spins:
+        session = recorder.call(client, 'GET', '/api/games/seed-session', headers=headers)
+        recorder.call(client, 'POST', '/api/games/play-batch', headers=headers, json={
+            "game_type": "slots",
+            "bet_amount": bet,
+            "client_seed": username,
+            "server_seed_hash": session.get_json()['server_seed_hash'],
+            "num_spins": batch_spins,
+            "seed_session": True
+        })
+
+    recorder.call(client, 'GET', '/api/betting/bet-history', headers=headers)
+    recorder.call(client, 'POST', '/api/payments/withdraw', headers=headers,
+                  json={"amount": bet, "payment_method": "bitcoin", "destination": "bc1qbenchmark"})
+    recorder.call(client, 'GET', '/api/payments/transactions', headers=headers)
+
+def run_workload(players=100, concurrency=8, rounds=20, batch_spins=10, bet=1):
+    """
+    Drive main.app with scripted players against an in-process database.
+
+    Returns:
+        dict: Overall and per-endpoint throughput and latency, plus status
+        code counts per endpoint
+    """
+    from db.database import set_db
+    from db.embedded_storage import EmbeddedStorage
+    from utils.metrics import record_db_operation
+
+    # Scripted players play as fast as they can; admission control would
+    # turn most of them away and the run would measure 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    # Install the stand-in database before the app opens one
+    set_db(EmbeddedStorage(listeners=[record_db_operation]))
+    from main import app
+    from utils.settlement import game_results_queue
+    from utils.player_stats import stats_queue
+    from utils.ledger import ledger_queue
+
+    recorder = _Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    local = threading.local()
+
+    def player_task(player):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        _play_session(local.client, recorder, f"{run_id}-{player}", rounds, batch_spins, bet)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Surface the first failure instead of reporting a partial run
+        for future in [pool.submit(player_task, player) for player in range(players)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    game_results_queue.close()
+    stats_queue.close()
+    ledger_queue.close()
+
+    all_samples = [sample for samples in recorder.latencies.values() for sample in samples]
+    return {
+        "config": {
+            "players": players,
+            "concurrency": concurrency,
+            "rounds": rounds,
+            "batch_spins": batch_spins,
+            "bet": bet
+        },
+        "elapsed_seconds": elapsed,
+        "overall": _summarize(all_samples, elapsed),
+        "endpoints": {
+            name: dict(_summarize(samples, elapsed),
+                       statuses={str(status): count for status, count in recorder.statuses[name].items()})
+            for name, samples in sorted(recorder.latencies.items())
+        }
+    }
+
+def _time_loop(fn, iterations, repeats):
+    """Best and median nanoseconds per call over repeats runs of iterations calls."""
+    per_call = []
+    for _ in range(repeats):
+        started = time.perf_counter_ns()
+        for i in range(iterations):
+            fn(i)
+        per_call.append((time.perf_counter_ns() - started) / iterations)
+    per_call.sort()
+    best = per_call[0]
+    return {
+        "iterations": iterations,
+        "repeats": repeats,
+        "best_ns_per_op": best,
+        "median_ns_per_op": per_call[len(per_call) // 2],
+        "ops_per_second": 1e9 / best if best else None
+    }
+
+def run_micro(iterations=10000, repeats=5):
+    """Time the provably fair hot paths in isolation."""
+    from games.slots import SlotMachine
+    from utils.provably_fair import (RNG_VERSION, generate_random_number, generate_server_seed, hash_server_seed,
+                                     verify_fairness)
+
+    machine = SlotMachine()
+    client_seed = 'benchmark-client-seed'
+    server_seed = generate_server_seed()
+    server_seed_hash = hash_server_seed(server_seed)
+    results = [machine.play(1, client_seed, server_seed, nonce=i) for i in range(iterations)]
+
+    return {
+        "slot_machine_play": _time_loop(
+            lambda i: machine.play(1, client_seed, server_seed, nonce=i), iterations, repeats),
+        "generate_random_number": _time_loop(
+            lambda i: generate_random_number(client_seed, server_seed, nonce=i), iterations, repeats),
+        "verify_fairness": _time_loop(
+            lambda i: verify_fairness('slots', client_seed, server_seed_hash, server_seed, i, results[i],
+                                      RNG_VERSION),
+            iterations, repeats)
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline, threshold):
+    """
+    List metrics that got worse than baseline by more than threshold.
+
+    Endpoint p95/p99 latencies and micro-benchmark best times are compared;
+    lower is better for all of them.
+
+    Returns:
+        list: (metric, baseline value, new value, relative change) tuples
+    """
+    pairs = []
+    for name, stats in report.get('workload', {}).get('endpoints', {}).items():
+        before = baseline.get('workload', {}).get('endpoints', {}).get(name)
+        if before:
+            for key in ('p95_ms', 'p99_ms'):
+                pairs.append((f"{name} {key}", before.get(key), stats.get(key)))
+    for name, stats in report.get('micro', {}).items():
+        before = baseline.get('micro', {}).get(name)
+        if before:
+            pairs.append((f"{name} best_ns_per_op", before.get('best_ns_per_op'), stats.get('best_ns_per_op')))
+
+    regressions = []
+    for metric, before, after in pairs:
+        if before and after is not None:
+            change = (after - before) / before
+            if change > threshold:
+                regressions.append((metric, before, after, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the casino API and provably fair code paths")
+    modes = parser.add_subparsers(dest='mode', required=True)
+
+    common_args = argparse.ArgumentParser(add_help=False)
+    common_args.add_argument('--output', help="Write the JSON report here instead of stdout")
+    common_args.add_argument('--compare', help="Earlier JSON report to check for regressions")
+    common_args.add_argument('--threshold', type=float, default=0.10,
+                             help="Relative slowdown that counts as a regression (default: 0.10)")
+
+    workload_args = argparse.ArgumentParser(add_help=False)
+    workload_args.add_argument('--players', type=int, default=100)
+    workload_args.add_argument('--concurrency', type=int, default=8, help="Players running at once")
+    workload_args.add_argument('--rounds', type=int, default=20, help="Prepared rounds per player")
+    workload_args.add_argument('--batch-spins', type=int, default=10, help="Seed-session batch size (0 to skip)")
+    workload_args.add_argument('--bet', type=float, default=1)
+
+    micro_args = argparse.ArgumentParser(add_help=False)
+    micro_args.add_argument('--iterations', type=int, default=10000)
+    micro_args.add_argument('--repeats', type=int, default=5)
+
+    modes.add_parser('workload', parents=[common_args, workload_args], help="Scripted players against main.app")
+    modes.add_parser('micro', parents=[common_args, micro_args], help="Hot-path micro-benchmarks")
+    modes.add_parser('all', parents=[common_args, workload_args, micro_args], help="Both")
+
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+    if args.mode in ('micro', 'all'):
+        report['micro'] = run_micro(args.iterations, args.repeats)
+    if args.mode in ('workload', 'all'):
+        report['workload'] = run_workload(args.players, args.concurrency, args.rounds, args.batch_spins, args.bet)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for metric, before, after, change in regressions:
+            print(f"REGRESSION {metric}: {before:.3f} -> {after:.3f} (+{change:.0%})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,17 @@
 # casino_app/betting/bet_manager.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from db.database import get_db
+from utils.rate_limit import rate_limited
+from utils.settlement import debit, positive_amount, record_bet
+from utils.user_cache import user_key
+from utils.pagination import EXPORT_FORMATS, export_rows, keyset_page, parse_fields, parse_page_size
 
 betting_blueprint = Blueprint('betting', __name__)
 
 @betting_blueprint.route('/place-bet', methods=['POST'])
 @jwt_required()
+@rate_limited('betting.place_bet')
 def place_bet():
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -16,54 +21,75 @@ def place_bet():
     bet_details = data.get('bet_details', {})
     
     # Validate bet amount
-    if amount <= 0:
+    if not positive_amount(amount):
         return jsonify({"error": "Bet amount must be positive"}), 400
     
     db = get_db()
     
-    # Check user balance
-    user = db.users.find_one({"_id": current_user_id})
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-    if user['balance'] < amount:
+    # Reserve the bet amount (deduct from balance if it is covered)
+    remaining_balance = debit(db, current_user_id, amount)
+    if remaining_balance is None:
+        if not db.users.find_one({"_id": user_key(current_user_id)}, {"_id": True}):
+            return jsonify({"error": "User not found"}), 404
         return jsonify({"error": "Insufficient balance"}), 400
     
-    # Reserve the bet amount (deduct from balance)
-    db.users.update_one(
-        {"_id": current_user_id},
-        {"$inc": {"balance": -amount}}
-    )
-    
     # Create bet record
+    created_at = db.server_timestamp()
     bet_id = db.bets.insert_one({
         "user_id": current_user_id,
         "game_id": game_id,
         "amount": amount,
         "bet_details": bet_details,
         "status": "placed",
-        "created_at": db.server_timestamp()
+        "created_at": created_at
     }).inserted_id
+    record_bet(current_user_id, bet_id, game_id, amount, created_at)
     
     return jsonify({
         "message": "Bet placed successfully",
         "bet_id": str(bet_id),
-        "remaining_balance": user['balance'] - amount
+        "remaining_balance": remaining_balance
     })
 
+# Fields a client may request from the bet history
+BET_FIELDS = ('game_id', 'amount', 'bet_details', 'status', 'created_at')
+
 @betting_blueprint.route('/bet-history', methods=['GET'])
 @jwt_required()
 def get_bet_history():
     current_user_id = get_jwt_identity()
     db = get_db()
     
-    # Get user's betting history
-    bets = list(db.bets.find({"user_id": current_user_id}).sort("created_at", -1).limit(50))
+    page_size = parse_page_size(request.args.get('limit'))
+    _, projection = parse_fields(request.args.get('fields'), BET_FIELDS)
+    
+    # Get one page of the user's betting history
+    try:
+        bets, next_cursor = keyset_page(
+            db.bets,
+            {"user_id": current_user_id},
+            page_size,
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
     
-    # Format bets for JSON response
-    formatted_bets = []
-    for bet in bets:
-        bet['_id'] = str(bet['_id'])
-        formatted_bets.append(bet)
+    return jsonify({"bets": bets, "next_cursor": next_cursor})
+
+@betting_blueprint.route('/bet-history/export', methods=['GET'])
+@jwt_required()
+def export_bet_history():
+    current_user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Format must be ndjson or csv"}), 400
     
-    return jsonify({"bets": formatted_bets})
+    fields, _ = parse_fields(request.args.get('fields'), BET_FIELDS)
+    rows = export_rows(get_db().bets, {"user_id": current_user_id}, fields, fmt)
+    
+    return Response(
+        stream_with_context(rows),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=bet-history.{fmt}"}
+    )
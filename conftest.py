@@ -0,0 +1,87 @@
+# casino_app/tests/conftest.py
+"""
+Shared fixtures: every test runs against a fresh embedded store, so the
+suite needs no MongoDB.
+"""
+import os
+import sys
+import tempfile
+import time
+
+# The app reads its configuration when it is imported
+_STATE_DIR = tempfile.mkdtemp(prefix='casino-tests-')
+os.environ.setdefault('STORAGE_BACKEND', 'embedded')
+os.environ.setdefault('RATE_LIMIT_PATH', os.path.join(_STATE_DIR, 'rate-limit.sqlite3'))
+os.environ.setdefault('WRITE_BEHIND_SPILL_DIR', os.path.join(_STATE_DIR, 'write-behind'))
+os.environ.setdefault('OPERATOR_TOKEN', 'test-operator-token')
+os.environ.setdefault('PAYMENT_WEBHOOK_SECRET', 'test-webhook-secret')
+OPERATOR_TOKEN = os.environ['OPERATOR_TOKEN']
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import pytest
+from bson import ObjectId
+from db.database import reset_db, set_db
+from db.embedded_storage import EmbeddedStorage
+from db.indexes import ensure_indexes
+
+def wait_until(predicate, timeout=5.0, interval=0.01):
+    """Poll predicate until it is true; fail the test after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail(f"Timed out after {timeout}s waiting for {predicate}")
+        time.sleep(interval)
+
+def drain(write_queue):
+    """Wait until a write-behind queue has written everything handed to it."""
+    wait_until(lambda: write_queue.stats()['depth'] == 0
+               and write_queue.stats()['flushed'] + write_queue.stats()['dead_lettered']
+               >= write_queue.stats()['enqueued'])
+
+@pytest.fixture
+def db():
+    """A fresh embedded store with every index, installed as the app's database."""
+    storage = EmbeddedStorage()
+    ensure_indexes(storage)
+    set_db(storage)
+    yield storage
+    reset_db()
+
+@pytest.fixture
+def app(db):
+    from main import app
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(db):
+    """Create a player; returns their JWT identity."""
+    def make_user(balance=0, vip_status='standard'):
+        user_id = ObjectId()
+        db.users.insert_one({
+            "_id": user_id,
+            "username": f"player-{user_id}",
+            "email": f"{user_id}@example.com",
+            "balance": balance,
+            "vip_status": vip_status,
+            "version": 0
+        })
+        db.wallets.insert_one({"user_id": user_id, "balance": 0, "transactions": [], "version": 0})
+        return str(user_id)
+    return make_user
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+
+    def auth_headers(user_id):
+        with app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+    return auth_headers
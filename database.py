@@ -0,0 +1,117 @@
+# casino_app/db/database.py
+import os
+import threading
+
+# STORAGE_BACKEND selects the engine behind get_db():
+#   mongo    - MongoDB at MONGO_URI (default)
+#   embedded - in-process engine; EMBEDDED_DB_PATH enables its write-ahead
+#              log, without it the data lives only in memory
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+
+_storage = None
+_storage_pid = None
+_async_storage = None
+_async_storage_pid = None
+_lock = threading.RLock()
+
+def mongo_client_options():
+    """MongoClient pool, timeout and concern settings from MONGO_* variables."""
+    options = {
+        "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+        # Keeps the connections a worker opens while warming up
+        "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', os.getenv('WARMUP_CONNECTIONS', '0'))),
+        "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000')),
+        "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        "socketTimeoutMS": int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '10000')),
+        "waitQueueTimeoutMS": int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+        "retryWrites": os.getenv('MONGO_RETRY_WRITES', 'True') == 'True',
+        # Sockets are opened on first use, never in the gunicorn master
+        "connect": False
+    }
+    if os.getenv('MONGO_WRITE_CONCERN'):
+        w = os.getenv('MONGO_WRITE_CONCERN')
+        options["w"] = int(w) if w.isdigit() else w
+    if os.getenv('MONGO_JOURNAL'):
+        options["journal"] = os.getenv('MONGO_JOURNAL') == 'True'
+    if os.getenv('MONGO_READ_CONCERN'):
+        options["readConcernLevel"] = os.getenv('MONGO_READ_CONCERN')
+    if os.getenv('MONGO_READ_PREFERENCE'):
+        options["readPreference"] = os.getenv('MONGO_READ_PREFERENCE')
+    return options
+
+def _create_storage():
+    # Every backend reports its operations to the request metrics
+    from utils.metrics import command_listener, record_db_operation
+    if STORAGE_BACKEND == 'mongo':
+        from db.mongo_storage import MongoStorage
+        return MongoStorage(os.getenv('MONGO_URI', 'mongodb://localhost:27017/casino'),
+                            event_listeners=[command_listener], **mongo_client_options())
+    if STORAGE_BACKEND == 'embedded':
+        from db.embedded_storage import EmbeddedStorage
+        return EmbeddedStorage(
+            path=os.getenv('EMBEDDED_DB_PATH') or None,
+            fsync=os.getenv('EMBEDDED_DB_FSYNC', 'False') == 'True',
+            listeners=[record_db_operation]
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'")
+
+def get_db():
+    """
+    Return the process-wide storage handle, creating it on first use.
+
+    A handle inherited through fork is never reused: MongoClient pools are
+    not fork-safe, so each worker process builds its own.
+    """
+    global _storage, _storage_pid
+    if _storage is None or _storage_pid != os.getpid():
+        with _lock:
+            if _storage is None or _storage_pid != os.getpid():
+                _storage = _create_storage()
+                _storage_pid = os.getpid()
+    return _storage
+
+def _create_async_storage():
+    from db.async_storage import AsyncEmbeddedStorage, AsyncMongoStorage
+    from db.mongo_storage import MongoStorage
+    from utils.metrics import command_listener
+    storage = get_db()
+    if isinstance(storage, MongoStorage):
+        return AsyncMongoStorage(os.getenv('MONGO_URI', 'mongodb://localhost:27017/casino'),
+                                 event_listeners=[command_listener], **mongo_client_options())
+    # In-process engines (including one installed with set_db) are shared
+    return AsyncEmbeddedStorage(storage)
+
+def get_async_db():
+    """
+    Return the process-wide handle for the ASGI app, creating it on first use.
+
+    With the mongo backend this is its own pymongo AsyncMongoClient, so it
+    must first be used from inside the worker's event loop. An in-process
+    engine is shared with get_db().
+    """
+    global _async_storage, _async_storage_pid
+    if _async_storage is None or _async_storage_pid != os.getpid():
+        with _lock:
+            if _async_storage is None or _async_storage_pid != os.getpid():
+                _async_storage = _create_async_storage()
+                _async_storage_pid = os.getpid()
+    return _async_storage
+
+def set_db(storage):
+    """Install a storage handle explicitly, e.g. an EmbeddedStorage for tests or load runs."""
+    global _storage, _storage_pid, _async_storage, _async_storage_pid
+    with _lock:
+        _storage = storage
+        _storage_pid = os.getpid()
+        _async_storage = None
+        _async_storage_pid = None
+
+def reset_db():
+    """Forget the current handle (without closing it) so the next get_db() builds a new one."""
+    global _storage, _storage_pid, _async_storage, _async_storage_pid
+    with _lock:
+        _storage = None
+        _storage_pid = None
+        _async_storage = None
+        _async_storage_pid = None
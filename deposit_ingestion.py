@@ -0,0 +1,271 @@
+# casino_app/payments/deposit_ingestion.py
+"""
+Batched, idempotent ingestion of deposit events from payment processors.
+
+Processors retry webhooks until they see a 2xx and replay whole backlogs
+after an outage, so the same event can arrive many times and in bursts.
+Every event carries the processor's transaction_id, and a unique index on
+deposit transaction_ids makes the database the arbiter: an event is credited
+by whichever request manages to insert its record, exactly once.
+
+A record goes pending -> crediting -> completed, and only the request whose
+conditional update moves it out of pending credits it. A batch costs at most
+seven round trips whatever its size:
+
+    1. find the users the events are for
+    2. insert_many(ordered=False) the new records as pending; duplicates
+       are reported back per event instead of aborting the batch
+    3. update_many every pending record of the batch to crediting under a
+       claim id: the ones just inserted, and any an earlier delivery
+       recorded but never got to credit
+    4. if there were duplicates, find which records the claim took and how
+       far the others got
+    5. bulk_write one $inc per user for the sum of that user's claimed deposits
+    6. insert_many one ledger entry per claimed deposit
+    7. update_many the claimed records to completed
+
+A crash before step 3 leaves records pending, and the processor's retry
+credits them. A crash after it leaves them crediting, where it cannot be
+told whether the $inc landed; retries report those as processing and never
+credit them again, and reconciliation against the ledger settles them.
+"""
+import hashlib
+import hmac
+import os
+import uuid
+from collections import defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.ledger import deposit_entry, post_entries, post_entries_async
+from utils.user_cache import user_cache, user_key
+from utils.write_behind import DUPLICATE_KEY
+
+# Shared secret the processor signs request bodies with (HMAC-SHA256, hex)
+WEBHOOK_SECRET = os.getenv('PAYMENT_WEBHOOK_SECRET')
+MAX_WEBHOOK_EVENTS = int(os.getenv('MAX_WEBHOOK_EVENTS', '1000'))
+
+def webhook_error(body, signature):
+    """
+    Returns:
+        The (error response body, status) for a request whose signature does
+        not match its body, or None if it does
+    """
+    if not WEBHOOK_SECRET:
+        return {"error": "Payment webhooks are not configured"}, 403
+    expected = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    if not signature or not hmac.compare_digest(signature.encode(), expected.encode()):
+        return {"error": "Invalid webhook signature"}, 401
+    return None
+
+def _validation_error(event):
+    if not isinstance(event, dict):
+        return "Event must be an object"
+    if not isinstance(event.get('transaction_id'), str) or not event['transaction_id']:
+        return "transaction_id is required"
+    if not isinstance(event.get('user_id'), str) or not event['user_id']:
+        return "user_id is required"
+    amount = event.get('amount')
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+        return "amount must be positive"
+    if not isinstance(event.get('payment_method'), str) or not event['payment_method']:
+        return "payment_method is required"
+    return None
+
+def _prepare(events):
+    """
+    Validate a batch and collapse repeats of a transaction_id within it.
+
+    Returns:
+        tuple: (one result dict per event, {transaction_id: index of its
+        first valid occurrence})
+    """
+    results = []
+    first_seen = {}
+    for index, event in enumerate(events):
+        error = _validation_error(event)
+        result = {"index": index, "transaction_id": event.get('transaction_id') if isinstance(event, dict) else None}
+        if error:
+            result.update(status="invalid", error=error)
+        elif event['transaction_id'] in first_seen:
+            result["status"] = "duplicate"
+        else:
+            first_seen[event['transaction_id']] = index
+        results.append(result)
+    return results, first_seen
+
+def _deposit_record(event, timestamp):
+    return {
+        "user_id": event['user_id'],
+        "type": "deposit",
+        "amount": event['amount'],
+        "payment_method": event['payment_method'],
+        "transaction_id": event['transaction_id'],
+        "status": "pending",
+        "source": "webhook",
+        "created_at": timestamp
+    }
+
+def _duplicate_positions(error):
+    """Positions insert_many rejected as duplicates; anything else is re-raised."""
+    positions = set()
+    for write_error in error.details.get('writeErrors', []):
+        if write_error.get('code') != DUPLICATE_KEY:
+            raise error
+        positions.add(write_error['index'])
+    return positions
+
+def _pending_records(events, first_seen, known_users, timestamp, results):
+    """
+    Records to insert for the first occurrence of each transaction_id;
+    events for users that do not exist are answered here.
+
+    Returns:
+        list: (event index, record) pairs
+    """
+    pending = []
+    for index in first_seen.values():
+        if events[index]['user_id'] in known_users:
+            pending.append((index, _deposit_record(events[index], timestamp)))
+        else:
+            results[index]["status"] = "unknown_user"
+    return pending
+
+def _batch_filter(pending):
+    return {"type": "deposit", "transaction_id": {"$in": [record['transaction_id'] for _, record in pending]}}
+
+def _claim_update(claim_id):
+    return {"$set": {"status": "crediting", "claim_id": claim_id}}
+
+def _claimed(pending, duplicates, claim_id, claim_result, existing):
+    """
+    The records this request claimed, as (event index, record) pairs.
+
+    Without duplicates every pending record is one this request just
+    inserted, so if the claim took as many as were inserted it took them all
+    and existing is not needed.
+    """
+    if not duplicates and claim_result.modified_count == len(pending):
+        return pending
+    records = {record['transaction_id']: record for record in existing}
+    return [(index, records[record['transaction_id']]) for index, record in pending
+            if records.get(record['transaction_id'], {}).get('claim_id') == claim_id]
+
+def _report_unclaimed(results, pending, claimed, existing):
+    # Credited, or being credited, by another delivery; report how far it got
+    statuses = {record['transaction_id']: record['status'] for record in existing}
+    claimed_indexes = {index for index, _ in claimed}
+    for index, record in pending:
+        if index not in claimed_indexes:
+            status = statuses.get(record['transaction_id'])
+            results[index]["status"] = "duplicate" if status == "completed" else "processing"
+
+def _credits(records):
+    """One $inc per user for the sum of their newly recorded deposits."""
+    totals = defaultdict(int)
+    for record in records:
+        totals[record['user_id']] += record['amount']
+    return totals, [
+        UpdateOne({"_id": user_key(user_id)}, {"$inc": {"balance": amount, "version": 1}})
+        for user_id, amount in totals.items()
+    ]
+
+def _ledger_entries(records):
+    return [deposit_entry(record['user_id'], record['transaction_id'], record['payment_method'], record['amount'],
+                          record['created_at']) for record in records]
+
+def _report_credited(results, claimed, totals):
+    for user_id in totals:
+        user_cache.invalidate(user_id)
+    for index, _ in claimed:
+        results[index]["status"] = "credited"
+
+def _summary(results):
+    counts = defaultdict(int)
+    for result in results:
+        counts[result['status']] += 1
+    return {"results": results, "counts": dict(counts)}
+
+def ingest_deposits(db, events):
+    """
+    Record and credit a batch of deposit events, each at most once.
+
+    Returns:
+        dict: Per-event results (credited, duplicate, processing,
+        unknown_user or invalid) in input order, and counts per status
+    """
+    results, first_seen = _prepare(events)
+    if not first_seen:
+        return _summary(results)
+
+    user_keys = list({user_key(events[index]['user_id']) for index in first_seen.values()})
+    known_users = {str(user['_id']) for user in db.users.find({"_id": {"$in": user_keys}}, {"_id": True})}
+    pending = _pending_records(events, first_seen, known_users, db.server_timestamp(), results)
+
+    if not pending:
+        return _summary(results)
+
+    duplicates = set()
+    try:
+        db.transactions.insert_many([record for _, record in pending], ordered=False)
+    except BulkWriteError as e:
+        duplicates = _duplicate_positions(e)
+
+    claim_id = uuid.uuid4().hex
+    claim_result = db.transactions.update_many(dict(_batch_filter(pending), status="pending", source="webhook"), _claim_update(claim_id))
+    existing = []
+    if duplicates or claim_result.modified_count != len(pending):
+        existing = list(db.transactions.find(_batch_filter(pending)))
+    claimed = _claimed(pending, duplicates, claim_id, claim_result, existing)
+    _report_unclaimed(results, pending, claimed, existing)
+
+    if claimed:
+        totals, credits = _credits([record for _, record in claimed])
+        db.users.bulk_write(credits, ordered=False)
+        post_entries(db, _ledger_entries([record for _, record in claimed]))
+        db.transactions.update_many(
+            {"_id": {"$in": [record['_id'] for _, record in claimed]}, "claim_id": claim_id},
+            {"$set": {"status": "completed"}}
+        )
+        _report_credited(results, claimed, totals)
+
+    return _summary(results)
+
+async def ingest_deposits_async(db, events):
+    results, first_seen = _prepare(events)
+    if not first_seen:
+        return _summary(results)
+
+    user_keys = list({user_key(events[index]['user_id']) for index in first_seen.values()})
+    known_users = {str(user['_id']) for user in
+                   await db.users.find({"_id": {"$in": user_keys}}, {"_id": True}).to_list()}
+    pending = _pending_records(events, first_seen, known_users, db.server_timestamp(), results)
+
+    if not pending:
+        return _summary(results)
+
+    duplicates = set()
+    try:
+        await db.transactions.insert_many([record for _, record in pending], ordered=False)
+    except BulkWriteError as e:
+        duplicates = _duplicate_positions(e)
+
+    claim_id = uuid.uuid4().hex
+    claim_result = await db.transactions.update_many(dict(_batch_filter(pending), status="pending", source="webhook"),
+                                                     _claim_update(claim_id))
+    existing = []
+    if duplicates or claim_result.modified_count != len(pending):
+        existing = await db.transactions.find(_batch_filter(pending)).to_list()
+    claimed = _claimed(pending, duplicates, claim_id, claim_result, existing)
+    _report_unclaimed(results, pending, claimed, existing)
+
+    if claimed:
+        totals, credits = _credits([record for _, record in claimed])
+        await db.users.bulk_write(credits, ordered=False)
+        await post_entries_async(db, _ledger_entries([record for _, record in claimed]))
+        await db.transactions.update_many(
+            {"_id": {"$in": [record['_id'] for _, record in claimed]}, "claim_id": claim_id},
+            {"$set": {"status": "completed"}}
+        )
+        _report_credited(results, claimed, totals)
+
+    return _summary(results)
@@ -0,0 +1,724 @@
+# casino_app/db/embedded_storage.py
+"""
+Embedded single-node storage engine.
+
+Collections live in memory as dicts keyed by _id, and every unique index
+as a dict from its key to the _id holding it: duplicate checks, and finds
+with an equality on each field of a unique index, are lookups rather than
+scans. Other queries scan the collection.
+
+When a path is given, every write appends the post-image of the changed
+documents to a write-ahead log before the call returns; opening the same
+path replays the log, and compact() folds it into a snapshot. Both files
+are sequences of BSON records, so reading them back never runs code.
+Without a path the engine is purely in memory, which suits tests and load
+runs.
+
+All collections share one lock, so a single process may use the engine from
+many threads. State is per process: run one gunicorn worker (with threads)
+on top of it, not several.
+"""
+import copy
+import functools
+import os
+import threading
+import time
+from datetime import timedelta
+import bson
+from bson import ObjectId
+from bson.errors import BSONError
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from db.storage import Storage, utc_now
+
+DUPLICATE_KEY = 11000
+
+# How often TTL indexes are enforced, in seconds
+TTL_SWEEP_INTERVAL = 60
+
+_MISSING = object()
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+class BulkWriteResult:
+    def __init__(self, matched_count, modified_count, upserted_ids):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_ids = upserted_ids
+        self.upserted_count = len(upserted_ids)
+        self.inserted_count = 0
+        self.deleted_count = 0
+        self.acknowledged = True
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+        self.acknowledged = True
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+def _set_path(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def _unset_path(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+def _hashable(value):
+    """value in a form usable as a dict key; equal values give equal keys."""
+    if isinstance(value, list):
+        return ('list', tuple(_hashable(item) for item in value))
+    if isinstance(value, dict):
+        return ('dict', tuple((key, _hashable(item)) for key, item in value.items()))
+    return value
+
+def _compare(value, operand, op):
+    if value is _MISSING or value is None or operand is None:
+        return False
+    try:
+        return op(value, operand)
+    except TypeError:
+        return False
+
+def _matches_condition(value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for op, operand in condition.items():
+            if op == '$eq':
+                if not _matches_condition(value, operand):
+                    return False
+            elif op == '$ne':
+                if _matches_condition(value, operand):
+                    return False
+            elif op == '$gt':
+                if not _compare(value, operand, lambda a, b: a > b):
+                    return False
+            elif op == '$gte':
+                if not _compare(value, operand, lambda a, b: a >= b):
+                    return False
+            elif op == '$lt':
+                if not _compare(value, operand, lambda a, b: a < b):
+                    return False
+            elif op == '$lte':
+                if not _compare(value, operand, lambda a, b: a <= b):
+                    return False
+            elif op == '$in':
+                if not any(_matches_condition(value, item) for item in operand):
+                    return False
+            elif op == '$nin':
+                if any(_matches_condition(value, item) for item in operand):
+                    return False
+            elif op == '$exists':
+                if (value is not _MISSING) != bool(operand):
+                    return False
+            else:
+                raise ValueError(f"Unsupported query operator {op}")
+        return True
+
+    if value is _MISSING:
+        return condition is None
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+def matches(doc, query):
+    """Evaluate a Mongo-style filter against a document."""
+    for key, condition in (query or {}).items():
+        if key == '$or':
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif not _matches_condition(_get_path(doc, key), condition):
+            return False
+    return True
+
+def _apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == '$set' or (op == '$setOnInsert' and inserting):
+            for path, value in fields.items():
+                _set_path(doc, path, copy.deepcopy(value))
+        elif op == '$setOnInsert':
+            continue
+        elif op == '$inc':
+            for path, amount in fields.items():
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING else current) + amount)
+        elif op == '$unset':
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == '$push':
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                items = [] if current is _MISSING else list(current)
+                if isinstance(value, dict) and '$each' in value:
+                    items.extend(copy.deepcopy(value['$each']))
+                    if '$slice' in value:
+                        items = items[value['$slice']:] if value['$slice'] < 0 else items[:value['$slice']]
+                else:
+                    items.append(copy.deepcopy(value))
+                _set_path(doc, path, items)
+        else:
+            raise ValueError(f"Unsupported update operator {op}")
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: True for field in projection}
+
+    include_id = projection.get('_id', True)
+    fields = {key: value for key, value in projection.items() if key != '_id'}
+    if not fields:
+        # {_id: 1} keeps only the id, {_id: 0} keeps everything else
+        result = {} if include_id else copy.deepcopy(doc)
+    elif all(fields.values()):
+        result = {}
+        for path in fields:
+            value = _get_path(doc, path)
+            if value is not _MISSING:
+                _set_path(result, path, copy.deepcopy(value))
+    else:
+        result = copy.deepcopy(doc)
+        for path in fields:
+            _unset_path(result, path)
+    if include_id and '_id' in doc:
+        result['_id'] = doc['_id']
+    else:
+        result.pop('_id', None)
+    return result
+
+def _sort_key(value):
+    # Missing and null sort before every other value, as in MongoDB
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, ObjectId):
+        return (4, value.binary)
+    return (3, type(value).__name__, value)
+
+def _normalize_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    return list(key_or_list)
+
+def _sorted(docs, sort):
+    docs = list(docs)
+    for path, direction in reversed(sort):
+        docs.sort(key=lambda doc: _sort_key(_get_path(doc, path)), reverse=direction < 0)
+    return docs
+
+class EmbeddedCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": {"stage": "EMBEDDED_SCAN"}}}
+
+    def __iter__(self):
+        started = time.perf_counter()
+        docs = self._collection._select(self._query, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        docs = [_project(doc, self._projection) for doc in docs]
+        self._collection._notify('find', started)
+        return iter(docs)
+
+def _observed(command):
+    """Report a collection method's run time to the storage listeners under command."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._notify(command, started)
+        return wrapper
+    return decorator
+
+class EmbeddedCollection:
+    def __init__(self, storage, name):
+        self._storage = storage
+        self.name = name
+        self._docs = {}
+        self._indexes = {}
+        # Unique index name -> {index key: _id of the document holding it}
+        self._unique = {}
+        self._last_sweep = 0.0
+
+    def _notify(self, command, started):
+        if self._storage.listeners:
+            elapsed = time.perf_counter() - started
+            for listener in self._storage.listeners:
+                listener(self.name, command, elapsed)
+
+    # Reads
+
+    def _select(self, query, sort=None):
+        with self._storage._lock:
+            self._sweep_expired()
+            doc_id = query.get('_id') if query else None
+            if doc_id is not None and not isinstance(doc_id, dict):
+                # Primary key lookups skip the scan
+                doc = self._docs.get(doc_id)
+                docs = [doc] if doc is not None and matches(doc, query) else []
+            else:
+                doc_id = self._unique_lookup(query) if query else None
+                if doc_id is None:
+                    docs = [doc for doc in self._docs.values() if matches(doc, query)]
+                else:
+                    doc = self._docs.get(doc_id)
+                    docs = [doc] if doc is not None and matches(doc, query) else []
+        return _sorted(docs, sort) if sort else docs
+
+    def _unique_lookup(self, query):
+        """
+        The only document that can match a query with an equality on every
+        field of a unique index.
+
+        Returns:
+            Its _id, _MISSING if no document can match, or None if no unique
+            index covers the query
+        """
+        for name, index in self._indexes.items():
+            if not index.get('unique'):
+                continue
+            # A partial index only holds the documents its filter matches
+            partial = index.get('partialFilterExpression')
+            if partial and any(query.get(path, _MISSING) != value for path, value in partial.items()):
+                continue
+            values = [query.get(path, _MISSING) for path, _ in index['key']]
+            if any(value is _MISSING or value is None or isinstance(value, (dict, list)) for value in values):
+                continue
+            return self._unique[name].get(tuple(values), _MISSING)
+        return None
+
+    def find(self, filter=None, projection=None, sort=None, limit=0):
+        cursor = EmbeddedCursor(self, filter or {}, projection)
+        if sort:
+            cursor.sort(sort)
+        if limit:
+            cursor.limit(limit)
+        return cursor
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        for doc in self.find(filter, projection, sort=sort, limit=1):
+            return doc
+        return None
+
+    @_observed('aggregate')
+    def count_documents(self, filter):
+        return len(self._select(filter))
+
+    # Writes
+
+    def _unique_keys(self, doc):
+        """(index name, key) of every unique index entry doc has."""
+        for name, index in self._indexes.items():
+            if not index.get('unique'):
+                continue
+            partial = index.get('partialFilterExpression')
+            if partial and not matches(doc, partial):
+                continue
+            yield name, tuple(_hashable(_get_path(doc, path)) for path, _ in index['key'])
+
+    def _rebuild_unique(self):
+        self._unique = {name: {} for name, index in self._indexes.items() if index.get('unique')}
+        for doc in self._docs.values():
+            for name, key in self._unique_keys(doc):
+                self._unique[name][key] = doc['_id']
+
+    def _check_unique(self, doc):
+        for name, key in self._unique_keys(doc):
+            holder = self._unique[name].get(key, _MISSING)
+            if holder is not _MISSING and holder != doc['_id']:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {name}",
+                    DUPLICATE_KEY
+                )
+
+    def _unindex(self, doc):
+        for name, key in self._unique_keys(doc):
+            if self._unique[name].get(key, _MISSING) == doc['_id']:
+                del self._unique[name][key]
+
+    def _store(self, doc):
+        self._check_unique(doc)
+        previous = self._docs.get(doc['_id'])
+        if previous is not None:
+            self._unindex(previous)
+        self._docs[doc['_id']] = doc
+        for name, key in self._unique_keys(doc):
+            self._unique[name][key] = doc['_id']
+        self._storage._log(('put', self.name, doc))
+
+    def _remove(self, doc_id):
+        self._unindex(self._docs.pop(doc_id))
+        self._storage._log(('delete', self.name, doc_id))
+
+    @_observed('insert')
+    def insert_one(self, document):
+        return self._insert_one(document)
+
+    def _insert_one(self, document):
+        with self._storage._lock:
+            if document.get('_id') in self._docs:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", DUPLICATE_KEY)
+            # Like pymongo, assign the _id on the caller's document
+            document.setdefault('_id', ObjectId())
+            self._store(copy.deepcopy(document))
+            return InsertOneResult(document['_id'])
+
+    @_observed('insert')
+    def insert_many(self, documents, ordered=True):
+        inserted_ids = []
+        errors = []
+        for index, document in enumerate(documents):
+            try:
+                inserted_ids.append(self._insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "nInserted": len(inserted_ids),
+                "writeConcernErrors": [],
+                "upserted": []
+            })
+        return InsertManyResult(inserted_ids)
+
+    def _upsert_document(self, filter, update):
+        doc = {key: copy.deepcopy(value) for key, value in filter.items()
+               if not key.startswith('$') and not (isinstance(value, dict) and any(k.startswith('$') for k in value))}
+        _apply_update(doc, update, inserting=True)
+        doc.setdefault('_id', ObjectId())
+        return doc
+
+    def _update(self, filter, update, upsert, many, sort=None):
+        with self._storage._lock:
+            targets = self._select(filter, sort)
+            if not many:
+                targets = targets[:1]
+            if not targets:
+                if not upsert:
+                    return UpdateResult(0, 0), None, None
+                doc = self._upsert_document(filter, update)
+                if doc['_id'] in self._docs:
+                    # The filter missed a document that has this _id
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_",
+                                            DUPLICATE_KEY)
+                self._store(doc)
+                return UpdateResult(0, 0, doc['_id']), None, doc
+
+            before = after = None
+            for target in targets:
+                updated = copy.deepcopy(target)
+                _apply_update(updated, update)
+                if updated != target:
+                    self._store(updated)
+                before, after = target, updated
+            modified = sum(1 for target in targets if self._docs[target['_id']] is not target)
+            return UpdateResult(len(targets), modified), before, after
+
+    @_observed('update')
+    def update_one(self, filter, update, upsert=False):
+        return self._update(filter, update, upsert, many=False)[0]
+
+    @_observed('update')
+    def update_many(self, filter, update, upsert=False):
+        return self._update(filter, update, upsert, many=True)[0]
+
+    @_observed('update')
+    def bulk_write(self, requests, ordered=True):
+        """Apply a list of pymongo UpdateOne/UpdateMany requests, like Collection.bulk_write."""
+        matched = modified = 0
+        upserted_ids = {}
+        errors = []
+        for index, operation in enumerate(requests):
+            if not isinstance(operation, (UpdateOne, UpdateMany)):
+                raise ValueError(f"Unsupported bulk write request {type(operation).__name__}")
+            try:
+                result = self._update(operation._filter, operation._doc, bool(operation._upsert),
+                                      many=isinstance(operation, UpdateMany))[0]
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(e), "op": operation._doc})
+                if ordered:
+                    break
+                continue
+            matched += result.matched_count
+            modified += result.modified_count
+            if result.upserted_id is not None:
+                upserted_ids[index] = result.upserted_id
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors,
+                "nMatched": matched,
+                "nModified": modified,
+                "nUpserted": len(upserted_ids),
+                "writeConcernErrors": [],
+                "upserted": [{"index": index, "_id": _id} for index, _id in upserted_ids.items()]
+            })
+        return BulkWriteResult(matched, modified, upserted_ids)
+
+    @_observed('findAndModify')
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE):
+        _, before, after = self._update(filter, update, upsert, many=False, sort=sort)
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return _project(doc, projection) if doc is not None else None
+
+    @_observed('delete')
+    def delete_one(self, filter):
+        return self._delete(filter, many=False)
+
+    @_observed('delete')
+    def delete_many(self, filter):
+        return self._delete(filter, many=True)
+
+    def _delete(self, filter, many):
+        with self._storage._lock:
+            targets = self._select(filter)
+            if not many:
+                targets = targets[:1]
+            for target in targets:
+                self._remove(target['_id'])
+            return DeleteResult(len(targets))
+
+    # Indexes
+
+    @_observed('createIndexes')
+    def create_indexes(self, models):
+        names = []
+        with self._storage._lock:
+            for model in models:
+                spec = dict(model.document)
+                spec['key'] = list(spec['key'].items())
+                self._indexes[spec['name']] = spec
+                self._storage._log(('index', self.name, spec))
+                names.append(spec['name'])
+            self._rebuild_unique()
+        return names
+
+    def index_information(self):
+        with self._storage._lock:
+            return {name: dict(index) for name, index in self._indexes.items()}
+
+    @_observed('dropIndexes')
+    def drop_index(self, name):
+        with self._storage._lock:
+            if name not in self._indexes:
+                raise OperationFailure(f"index not found with name [{name}]", 27)
+            del self._indexes[name]
+            self._unique.pop(name, None)
+            self._storage._log(('drop_index', self.name, name))
+
+    def _sweep_expired(self):
+        now = time.monotonic()
+        if now - self._last_sweep < TTL_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for index in self._indexes.values():
+            if 'expireAfterSeconds' not in index:
+                continue
+            path = index['key'][0][0]
+            cutoff = utc_now() - timedelta(seconds=index['expireAfterSeconds'])
+            partial = index.get('partialFilterExpression')
+            for doc_id, doc in list(self._docs.items()):
+                created = _get_path(doc, path)
+                if created is _MISSING or not hasattr(created, 'year') or created >= cutoff:
+                    continue
+                if partial and not matches(doc, partial):
+                    continue
+                self._remove(doc_id)
+
+class EmbeddedStorage(Storage):
+    """
+    In-memory storage engine with an optional write-ahead log.
+
+    Args:
+        path: Directory for the snapshot and write-ahead log; None keeps
+            everything in memory
+        fsync: fsync the log after every write instead of leaving it to the
+            OS page cache
+        listeners: Callables invoked as listener(collection, command,
+            seconds) after every operation, with Mongo command names
+    """
+
+    SNAPSHOT = 'snapshot.bson'
+    WAL = 'wal.bson'
+    # Files of the pickle format used before, which are never loaded
+    LEGACY_FILES = ('snapshot.pickle', 'wal.log')
+
+    def __init__(self, path=None, fsync=False, listeners=None):
+        self.listeners = list(listeners or [])
+        self._lock = threading.RLock()
+        self._collections = {}
+        self._path = path
+        self._fsync = fsync
+        self._wal = None
+        self._replaying = False
+        if path:
+            os.makedirs(path, exist_ok=True)
+            legacy = [name for name in self.LEGACY_FILES if os.path.exists(os.path.join(path, name))]
+            if legacy:
+                raise ValueError(f"{path} holds data in the retired pickle format ({', '.join(legacy)}); "
+                                 "it is no longer read, move those files aside to start a new store")
+            self._recover()
+            self._wal = open(os.path.join(path, self.WAL), 'ab')
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = EmbeddedCollection(self, name)
+            return self._collections[name]
+
+    @staticmethod
+    def _encode(record):
+        op, name, value = record
+        return bson.encode({"op": op, "collection": name, "value": value})
+
+    @staticmethod
+    def _records(f):
+        """
+        Records of a snapshot or log, up to the first one that is incomplete
+        or unreadable.
+
+        Yields:
+            tuple: (record, file offset just past it)
+        """
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                return
+            # A BSON document starts with its own length, header included
+            payload = header + f.read(int.from_bytes(header, 'little') - 4)
+            try:
+                record = bson.decode(payload)
+            except (BSONError, ValueError):
+                return
+            yield (record['op'], record['collection'], record['value']), f.tell()
+
+    def _log(self, record):
+        if self._wal is None or self._replaying:
+            return
+        self._wal.write(self._encode(record))
+        self._wal.flush()
+        if self._fsync:
+            os.fsync(self._wal.fileno())
+
+    def _apply(self, record):
+        op, name, value = record
+        collection = self.collection(name)
+        if op == 'put':
+            collection._docs[value['_id']] = value
+        elif op == 'delete':
+            collection._docs.pop(value, None)
+        elif op == 'index':
+            collection._indexes[value['name']] = value
+        elif op == 'drop_index':
+            collection._indexes.pop(value, None)
+
+    def _recover(self):
+        self._replaying = True
+        try:
+            snapshot_path = os.path.join(self._path, self.SNAPSHOT)
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path, 'rb') as f:
+                    for record, _ in self._records(f):
+                        self._apply(record)
+
+            wal_path = os.path.join(self._path, self.WAL)
+            if os.path.exists(wal_path):
+                valid_length = 0
+                with open(wal_path, 'rb') as f:
+                    for record, valid_length in self._records(f):
+                        self._apply(record)
+                # Cut off a record torn by a crash mid-write
+                with open(wal_path, 'ab') as f:
+                    f.truncate(valid_length)
+
+            for collection in self._collections.values():
+                collection._rebuild_unique()
+        finally:
+            self._replaying = False
+
+    def compact(self):
+        """Write a snapshot of every collection and start an empty log."""
+        if not self._path:
+            return
+        with self._lock:
+            tmp_path = os.path.join(self._path, self.SNAPSHOT + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                # The same records as the log: each index, then each document
+                for name, collection in self._collections.items():
+                    for index in collection._indexes.values():
+                        f.write(self._encode(('index', name, index)))
+                    for doc in collection._docs.values():
+                        f.write(self._encode(('put', name, doc)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self._path, self.SNAPSHOT))
+            self._wal.close()
+            self._wal = open(os.path.join(self._path, self.WAL), 'wb')
+
+    def close(self):
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
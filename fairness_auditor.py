@@ -0,0 +1,205 @@
+# casino_app/audit/fairness_auditor.py
+"""
+Offline fairness audit over the whole game_results collection.
+
+Every stored round is replayed through the provably fair code path and
+compared with its recorded result. Rounds are read in _id order from a
+batched cursor and verified in chunks on a process pool with a bounded
+number of chunks in flight, so memory stays flat however large the
+collection is. Progress is checkpointed after contiguous chunks complete,
+and --resume continues from the last checkpoint.
+
+Usage:
+    python -m audit.fairness_auditor --report mismatches.jsonl --checkpoint audit.json
+    python -m audit.fairness_auditor --report mismatches.jsonl --checkpoint audit.json --resume
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from bson import ObjectId
+from utils.provably_fair import verify_fairness_batch
+
+logger = logging.getLogger(__name__)
+
+AUDIT_FIELDS = {
+    "game_type": True,
+    "client_seed": True,
+    "server_seed_hash": True,
+    "server_seed": True,
+    "nonce": True,
+    "result": True,
+    "rng_version": True
+}
+
+def _verify_chunk(games):
+    """Return the positions in games whose replay does not match."""
+    verdicts = verify_fairness_batch(games)
+    return [i for i, verified in enumerate(verdicts) if not verified]
+
+def _read_chunks(collection, after_id, batch_size, chunk_size, limit=None):
+    """Yield (ids, games) chunks in _id order, starting after after_id."""
+    query = {"_id": {"$gt": after_id}} if after_id else {}
+    cursor = collection.find(query, AUDIT_FIELDS).sort("_id", 1).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    ids, games = [], []
+    for doc in cursor:
+        ids.append(doc['_id'])
+        games.append((
+            doc.get('game_type'),
+            doc.get('client_seed'),
+            doc.get('server_seed_hash'),
+            doc.get('server_seed'),
+            doc.get('nonce'),
+            doc.get('result'),
+            doc.get('rng_version')
+        ))
+        if len(ids) == chunk_size:
+            yield ids, games
+            ids, games = [], []
+    if ids:
+        yield ids, games
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename so an interrupted run never leaves a torn checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def run_audit(collection, report_path, checkpoint_path=None, resume=False, processes=None,
+              batch_size=5000, chunk_size=2000, limit=None):
+    """
+    Replay every stored round and write mismatches to report_path as JSON lines.
+
+    Returns:
+        dict: Totals and throughput for this run
+    """
+    processes = processes or os.cpu_count() or 1
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    after_id = ObjectId(checkpoint['last_id']) if checkpoint else None
+    processed = checkpoint['processed'] if checkpoint else 0
+    mismatches = checkpoint['mismatches'] if checkpoint else 0
+
+    started = time.perf_counter()
+    run_processed = 0
+    chunks = _read_chunks(collection, after_id, batch_size, chunk_size, limit)
+
+    # Chunks finish out of order; the checkpoint only moves past a chunk once
+    # every chunk before it has finished too
+    in_flight = {}
+    finished = {}
+    next_submit = 0
+    next_commit = 0
+
+    with ProcessPoolExecutor(max_workers=processes) as pool, \
+            open(report_path, 'a' if resume else 'w') as report:
+        if checkpoint:
+            # Drop report lines written after the last checkpoint; those
+            # chunks are about to be replayed
+            report.truncate(checkpoint.get('report_offset', report.tell()))
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < processes * 2:
+                try:
+                    ids, games = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = pool.submit(_verify_chunk, games)
+                in_flight[future] = (next_submit, ids, games)
+                next_submit += 1
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                sequence, ids, games = in_flight.pop(future)
+                finished[sequence] = (ids, games, future.result())
+
+            # Mismatches are reported in commit order, in step with the
+            # checkpoint
+            committed = False
+            while next_commit in finished:
+                ids, games, failed = finished.pop(next_commit)
+                for i in failed:
+                    report.write(json.dumps({
+                        "_id": str(ids[i]),
+                        "game_type": games[i][0],
+                        "server_seed_hash": games[i][2],
+                        "nonce": games[i][4]
+                    }) + '\n')
+                mismatches += len(failed)
+                processed += len(ids)
+                run_processed += len(ids)
+                after_id = ids[-1]
+                next_commit += 1
+                committed = True
+
+            if committed and checkpoint_path:
+                report.flush()
+                save_checkpoint(checkpoint_path, {
+                    "last_id": str(after_id),
+                    "processed": processed,
+                    "mismatches": mismatches,
+                    "report_offset": report.tell()
+                })
+                elapsed = time.perf_counter() - started
+                logger.info("Audited %d rounds (%.0f/s), %d mismatches", processed,
+                            run_processed / elapsed if elapsed else 0, mismatches)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "processed_this_run": run_processed,
+        "mismatches": mismatches,
+        "last_id": str(after_id) if after_id else None,
+        "elapsed_seconds": elapsed,
+        "rounds_per_second": run_processed / elapsed if elapsed else None,
+        "processes": processes
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay every stored game through the provably fair code path")
+    parser.add_argument('--report', required=True, help="JSON lines file receiving one entry per mismatch")
+    parser.add_argument('--checkpoint', help="Progress file used to resume an interrupted audit")
+    parser.add_argument('--resume', action='store_true', help="Continue from --checkpoint")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Documents per cursor batch")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="Rounds per worker task")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many rounds")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from db.database import get_db
+    summary = run_audit(
+        get_db().game_results,
+        args.report,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        limit=args.limit
+    )
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['mismatches'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,39 +1,35 @@
 # casino_app/games/game_manager.py
-from flask import Blueprint, jsonify, request
+import time
+from functools import lru_cache
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from db.database import get_db
-from games.slots import SlotMachine
-from games.blackjack import BlackjackGame
-from games.roulette import RouletteGame
-from games.poker import PokerGame
-from utils.provably_fair import generate_server_seed, hash_server_seed
+from games.game_registry import catalog, get_engine
+from games.seed_sessions import get_active_session, claim_nonces, rotate_session
+from utils.provably_fair import RNG_VERSION, generate_server_seed, hash_server_seed
+from utils.settlement import claim_prepared_seed, positive_amount, release_prepared_seed, settle_rounds
+from utils.metrics import record_rounds
+from utils.rate_limit import rate_limited
+from utils.json_provider import dumps_bytes
 
 game_blueprint = Blueprint('games', __name__)
 
-# Game factory to create the right game instance
-def get_game_instance(game_type):
-    game_classes = {
-        'slots': SlotMachine,
-        'blackjack': BlackjackGame,
-        'roulette': RouletteGame,
-        'poker': PokerGame
-    }
-    
-    game_class = game_classes.get(game_type)
-    if not game_class:
-        return None
-    
-    return game_class()
+# Build the slot engine at import so a misconfigured paytable stops the
+# worker before it serves traffic
+get_engine('slots')
+
+# The catalog only changes with a deploy, so browsers and proxies may reuse it
+AVAILABLE_GAMES_CACHE_CONTROL = 'public, max-age=300'
+
+@lru_cache(maxsize=None)
+def available_games_body():
+    """The /available response body, serialized once per worker."""
+    return dumps_bytes({"games": list(catalog())})
 
 @game_blueprint.route('/available', methods=['GET'])
 def get_available_games():
-    games = [
-        {"id": "slots", "name": "Slot Machine", "min_bet": 1, "max_bet": 100},
-        {"id": "blackjack", "name": "Blackjack", "min_bet": 5, "max_bet": 500},
-        {"id": "roulette", "name": "Roulette", "min_bet": 1, "max_bet": 1000},
-        {"id": "poker", "name": "Poker", "min_bet": 10, "max_bet": 1000}
-    ]
-    return jsonify({"games": games})
+    return Response(available_games_body(), mimetype='application/json',
+                    headers={"Cache-Control": AVAILABLE_GAMES_CACHE_CONTROL})
 
 @game_blueprint.route('/prepare', methods=['POST'])
 @jwt_required()
@@ -62,8 +58,72 @@ def prepare_game():
         "message": "Game prepared, ready for client seed"
     })
 
+@game_blueprint.route('/seed-session', methods=['GET'])
+@jwt_required()
+def get_seed_session():
+    # One committed server seed serves every round until the player rotates it
+    session = get_active_session(get_db(), get_jwt_identity())
+    
+    return jsonify({
+        "server_seed_hash": session['server_seed_hash'],
+        "next_nonce": session['nonce']
+    })
+
+@game_blueprint.route('/seed-session/rotate', methods=['POST'])
+@jwt_required()
+def rotate_seed_session():
+    previous, session = rotate_session(get_db(), get_jwt_identity())
+    
+    response = {
+        "server_seed_hash": session['server_seed_hash'],
+        "next_nonce": session['nonce']
+    }
+    if previous:
+        # Reveal the retired seed so every round played with it can be verified
+        response["previous_session"] = {
+            "server_seed": previous['server_seed'],
+            "server_seed_hash": previous['server_seed_hash'],
+            "rounds_played": previous['nonce']
+        }
+    return jsonify(response)
+
+
+def _claim_seed(db, user_id, server_seed_hash, use_seed_session, prepared_nonces):
+    """
+    Claim the server seed and nonces for the next rounds in one round trip.
+    
+    Seed sessions hand out their next nonces; a prepared seed is marked used
+    and serves prepared_nonces.
+    
+    Returns:
+        tuple: (seed document, list of nonces), or (None, None)
+    """
+    if use_seed_session:
+        return claim_nonces(db, user_id, server_seed_hash, len(prepared_nonces))
+    
+    seed_doc = claim_prepared_seed(db, user_id, server_seed_hash)
+    if not seed_doc:
+        return None, None
+    return seed_doc, prepared_nonces
+
+def game_record(user_id, game_type, bet_amount, result, client_seed, seed_doc, nonce, use_seed_session, timestamp):
+    return {
+        "user_id": user_id,
+        "game_type": game_type,
+        "bet_amount": bet_amount,
+        "result": result,
+        "client_seed": client_seed,
+        "server_seed": seed_doc['server_seed'],
+        "server_seed_hash": seed_doc['server_seed_hash'],
+        "nonce": nonce,
+        "rng_version": RNG_VERSION,
+        "seed_session": use_seed_session,
+        "timestamp": timestamp
+    }
+
 @game_blueprint.route('/play', methods=['POST'])
 @jwt_required()
+@rate_limited('games.play')
 def play_game():
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -72,62 +132,148 @@ def play_game():
     bet_amount = data.get('bet_amount')
     client_seed = data.get('client_seed')
     server_seed_hash = data.get('server_seed_hash')
+    use_seed_session = data.get('seed_session', False)
     
-    # Get game instance
-    game = get_game_instance(game_type)
+    # Shared engines are built on first use, the others per request
+    game = get_engine(game_type)
     if not game:
         return jsonify({"error": "Invalid game type"}), 400
     
-    # Get the server seed
-    db = get_db()
-    seed_doc = db.game_seeds.find_one({
-        "user_id": current_user_id,
-        "server_seed_hash": server_seed_hash,
-        "used": False
-    })
+    if not positive_amount(bet_amount):
+        return jsonify({"error": "Bet amount must be positive"}), 400
     
+    # Claim the server seed, either from the seed session or a prepared game
+    db = get_db()
+    seed_doc, nonces = _claim_seed(db, current_user_id, server_seed_hash, use_seed_session, [None])
     if not seed_doc:
         return jsonify({"error": "Invalid or used server seed"}), 400
+    nonce = nonces[0]
     
-    # Check if user has enough balance
-    user = db.users.find_one({"_id": current_user_id})
-    if user['balance'] < bet_amount:
+    # Play the game with the seeds
+    engine_started = time.perf_counter()
+    try:
+        result = game.play(
+            bet_amount=bet_amount,
+            client_seed=client_seed,
+            server_seed=seed_doc['server_seed'],
+            nonce=nonce
+        )
+    except Exception:
+        # The round never happened; let the prepared seed be played again
+        if not use_seed_session:
+            release_prepared_seed(db, seed_doc)
+        raise
+    engine_seconds = time.perf_counter() - engine_started
+    
+    # Debit the bet, credit the payout and record the result
+    new_balance = settle_rounds(db, current_user_id, bet_amount, result['payout'], [
+        game_record(current_user_id, game_type, bet_amount, result, client_seed,
+                     seed_doc, nonce, use_seed_session, db.server_timestamp())
+    ])
+    if new_balance is None:
+        if not use_seed_session:
+            release_prepared_seed(db, seed_doc)
         return jsonify({"error": "Insufficient balance"}), 400
     
-    # Play the game with the seeds
-    result = game.play(
-        bet_amount=bet_amount,
-        client_seed=client_seed,
-        server_seed=seed_doc['server_seed']
-    )
-    
-    # Mark the seed as used
-    db.game_seeds.update_one(
-        {"_id": seed_doc['_id']},
-        {"$set": {"used": True}}
-    )
-    
-    # Record game result
-    db.game_results.insert_one({
-        "user_id": current_user_id,
-        "game_type": game_type,
-        "bet_amount": bet_amount,
+    record_rounds(game_type, 'play', engine_seconds, 1, bet_amount, result['payout'])
+    
+    response = {
         "result": result,
-        "client_seed": client_seed,
-        "server_seed": seed_doc['server_seed'],
-        "server_seed_hash": server_seed_hash,
-        "timestamp": db.server_timestamp()
-    })
+        "new_balance": new_balance,
+        "nonce": nonce,
+        "rng_version": RNG_VERSION
+    }
+    if not use_seed_session:
+        response["server_seed"] = seed_doc['server_seed']  # Reveal the server seed after use
+    return jsonify(response)
+
+# Autoplay clients send many spins at once; cap a single batch
+MAX_BATCH_SPINS = 100
+
+def valid_spins(num_spins):
+    return isinstance(num_spins, int) and not isinstance(num_spins, bool) and 1 <= num_spins <= MAX_BATCH_SPINS
+
+def batch_cost(data):
+    """Rate limit tokens for a batch: one per spin, as if each were played alone."""
+    num_spins = data.get('num_spins') if isinstance(data, dict) else None
+    if valid_spins(num_spins):
+        return num_spins
+    # Rejected by the view anyway
+    return 1
+
+@game_blueprint.route('/play-batch', methods=['POST'])
+@jwt_required()
+@rate_limited('games.play', cost=batch_cost)
+def play_batch():
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
     
-    # Update user balance
-    new_balance = user['balance'] + result['payout'] - bet_amount
-    db.users.update_one(
-        {"_id": current_user_id},
-        {"$set": {"balance": new_balance}}
-    )
+    game_type = data.get('game_type')
+    bet_amount = data.get('bet_amount')
+    client_seed = data.get('client_seed')
+    server_seed_hash = data.get('server_seed_hash')
+    num_spins = data.get('num_spins')
+    use_seed_session = data.get('seed_session', False)
     
-    return jsonify({
-        "result": result,
+    # Only slots support batched rounds for now
+    if game_type != 'slots':
+        return jsonify({"error": "Batch play is only available for slots"}), 400
+    
+    if not valid_spins(num_spins):
+        return jsonify({"error": f"num_spins must be between 1 and {MAX_BATCH_SPINS}"}), 400
+    
+    if not positive_amount(bet_amount):
+        return jsonify({"error": "Bet amount must be positive"}), 400
+    
+    game = get_engine(game_type)
+    
+    # One seed serves the whole batch, each spin gets its own nonce
+    db = get_db()
+    seed_doc, nonces = _claim_seed(db, current_user_id, server_seed_hash, use_seed_session,
+                                 list(range(num_spins)))
+    if not seed_doc:
+        return jsonify({"error": "Invalid or used server seed"}), 400
+    
+    engine_started = time.perf_counter()
+    try:
+        results = game.play_batch(
+            bet_amount=bet_amount,
+            client_seed=client_seed,
+            server_seed=seed_doc['server_seed'],
+            nonces=nonces
+        )
+    except Exception:
+        # No spin was settled; let the prepared seed be played again
+        if not use_seed_session:
+            release_prepared_seed(db, seed_doc)
+        raise
+    engine_seconds = time.perf_counter() - engine_started
+    
+    # Settle the net outcome in one update; the balance must cover every
+    # spin even if none of them wins. Each spin is recorded so it can be
+    # verified on its own.
+    total_bet = bet_amount * num_spins
+    total_payout = sum(result['payout'] for result in results)
+    timestamp = db.server_timestamp()
+    new_balance = settle_rounds(db, current_user_id, total_bet, total_payout, [
+        game_record(current_user_id, game_type, bet_amount, result, client_seed,
+                     seed_doc, nonce, use_seed_session, timestamp)
+        for nonce, result in zip(nonces, results)
+    ])
+    if new_balance is None:
+        if not use_seed_session:
+            release_prepared_seed(db, seed_doc)
+        return jsonify({"error": "Insufficient balance"}), 400
+    
+    record_rounds(game_type, 'play_batch', engine_seconds, num_spins, total_bet, total_payout)
+    
+    response = {
+        "results": [dict(result, nonce=nonce) for nonce, result in zip(nonces, results)],
+        "total_bet": total_bet,
+        "total_payout": total_payout,
         "new_balance": new_balance,
-        "server_seed": seed_doc['server_seed']  # Reveal the server seed after use
-    })
+        "rng_version": RNG_VERSION
+    }
+    if not use_seed_session:
+        response["server_seed"] = seed_doc['server_seed']  # Reveal the server seed after use
+    return jsonify(response)
@@ -0,0 +1,83 @@
+# casino_app/games/game_registry.py
+"""
+Registry of the games the casino offers.
+
+Each game is described by a GameSpec; its engine module is only imported
+the first time the game is played, verified or listed. Engines marked
+shared are built once and then used by every request and thread, so they
+must be stateless once built: SlotMachine qualifies, as play only reads its
+read-only precompiled tables. Every other engine is constructed afresh for
+each request, as before the registry, until it has been checked the same
+way.
+
+The /available catalog is generated from the specs, together with the
+published return-to-player figures of engines that expose them.
+"""
+import importlib
+import threading
+from collections import namedtuple
+
+GameSpec = namedtuple('GameSpec', ['id', 'name', 'module', 'engine', 'min_bet', 'max_bet', 'publish_stats',
+                                   'shared'])
+
+GAME_SPECS = {spec.id: spec for spec in (
+    GameSpec('slots', "Slot Machine", 'games.slots', 'SlotMachine', 1, 100, True, True),
+    GameSpec('blackjack', "Blackjack", 'games.blackjack', 'BlackjackGame', 5, 500, False, False),
+    GameSpec('roulette', "Roulette", 'games.roulette', 'RouletteGame', 1, 1000, False, False),
+    GameSpec('poker', "Poker", 'games.poker', 'PokerGame', 10, 1000, False, False)
+)}
+
+_engines = {}
+_lock = threading.Lock()
+
+def _engine_class(spec):
+    return getattr(importlib.import_module(spec.module), spec.engine)
+
+def get_engine(game_type):
+    """
+    Engine for a game type: the shared instance, built on first use, or a
+    new one for games whose engines are not shared.
+
+    Returns:
+        The engine, or None if game_type is not a registered game
+    """
+    engine = _engines.get(game_type)
+    if engine is not None:
+        return engine
+
+    spec = GAME_SPECS.get(game_type)
+    if spec is None:
+        return None
+    if not spec.shared:
+        return _engine_class(spec)()
+
+    with _lock:
+        engine = _engines.get(game_type)
+        if engine is None:
+            engine = _engines[game_type] = _engine_class(spec)()
+    return engine
+
+def load_engines():
+    """Build every engine once now, so a broken game or paytable fails at startup instead of on a request."""
+    for game_type in GAME_SPECS:
+        get_engine(game_type)
+
+_catalog = None
+
+def catalog():
+    """
+    The game catalog served by /available, built once.
+
+    Returns:
+        tuple: One dict per game, in registry order
+    """
+    global _catalog
+    if _catalog is None:
+        games = []
+        for spec in GAME_SPECS.values():
+            entry = {"id": spec.id, "name": spec.name, "min_bet": spec.min_bet, "max_bet": spec.max_bet}
+            if spec.publish_stats:
+                entry.update(get_engine(spec.id).stats)
+            games.append(entry)
+        _catalog = tuple(games)
+    return _catalog
@@ -0,0 +1,84 @@
+# casino_app/gunicorn.conf.py
+import multiprocessing
+import os
+import shutil
+
+# GUNICORN_PROFILE picks how a worker waits on the database:
+#   sync    - one request per worker at a time (gunicorn's default)
+#   gthread - GUNICORN_THREADS requests per worker on a thread pool
+#   gevent  - GUNICORN_WORKER_CONNECTIONS requests per worker on greenlets
+#             (needs the gevent package)
+#   asgi    - serves asgi:app on an asyncio event loop per worker (needs the
+#             quart and uvicorn-worker packages)
+PROFILE = os.getenv('GUNICORN_PROFILE', 'gthread')
+
+wsgi_app = 'asgi:app' if PROFILE == 'asgi' else 'main:app'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+# An event loop keeps a core busy on its own, so asgi needs one worker per core
+default_workers = multiprocessing.cpu_count() if PROFILE == 'asgi' else multiprocessing.cpu_count() * 2 + 1
+workers = int(os.getenv('WEB_CONCURRENCY', str(default_workers)))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+if PROFILE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+elif PROFILE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+elif PROFILE == 'sync':
+    worker_class = 'sync'
+elif PROFILE == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    raise ValueError(f"Unknown GUNICORN_PROFILE '{PROFILE}'")
+
+# Import the app once in the master so workers share the compiled game tables
+# copy-on-write. gevent must patch the standard library before the app is
+# imported, so it loads the app in each worker instead.
+preload_app = PROFILE != 'gevent'
+
+# The embedded engine keeps its data in process memory
+if os.getenv('STORAGE_BACKEND') == 'embedded':
+    workers = 1
+
+# Each worker writes its metric samples here and /api/metrics merges them.
+# prometheus_client reads this when it is imported, so it must be set
+# before the app is loaded.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.getenv('METRICS_DIR', '/tmp/casino-metrics'))
+
+def on_starting(server):
+    # Samples left by a previous run would be merged into this one
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+def post_fork(server, worker):
+    # Never reuse a MongoClient created before the fork
+    from db.database import reset_db
+    reset_db()
+
+def post_worker_init(worker):
+    # The ASGI app warms up in its own before_serving hook, on its event loop
+    if PROFILE == 'asgi':
+        return
+    from main import app
+    from warmup import warm_up
+    warm_up(app, connections=int(os.getenv('WARMUP_CONNECTIONS', '0')))
+
+def worker_exit(server, worker):
+    # Flush audit records, ledger entries and stats events still queued in this worker
+    from utils.settlement import game_results_queue
+    from utils.player_stats import stats_queue
+    from utils.ledger import ledger_queue
+    game_results_queue.close()
+    ledger_queue.close()
+    stats_queue.close()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,181 @@
+# casino_app/db/indexes.py
+"""
+Index bootstrap for the casino collections.
+
+Usage:
+    python -m db.indexes            # create missing indexes
+    python -m db.indexes --explain  # also report queries that scan a collection
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from games.seed_sessions import SESSION_INDEXES
+
+# Prepared seeds nobody played are removed after this many seconds
+SEED_TTL_SECONDS = int(os.getenv('SEED_TTL_SECONDS', '86400'))
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "wallets": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "game_seeds": [
+        IndexModel(
+            [("user_id", ASCENDING), ("server_seed_hash", ASCENDING), ("used", ASCENDING)],
+            name="user_seed_lookup"
+        ),
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="unused_seed_ttl",
+            expireAfterSeconds=SEED_TTL_SECONDS,
+            partialFilterExpression={"used": False}
+        ),
+    ],
+    # Owned by games.seed_sessions, which relies on its unique index
+    "seed_sessions": SESSION_INDEXES,
+    "bets": [
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_history_keyset"
+        ),
+    ],
+    "transactions": [
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_history_keyset"
+        ),
+        # A processor's transaction_id is credited at most once
+        IndexModel(
+            [("transaction_id", ASCENDING)],
+            name="deposit_transaction_unique",
+            unique=True,
+            partialFilterExpression={"type": "deposit"}
+        ),
+        # Withdrawal worker: the pending queue, stale claims and claim lookups
+        IndexModel(
+            [("status", ASCENDING), ("created_at", ASCENDING)],
+            name="withdrawal_queue",
+            partialFilterExpression={"type": "withdrawal"}
+        ),
+        IndexModel(
+            [("claim_id", ASCENDING)],
+            name="withdrawal_claims",
+            partialFilterExpression={"type": "withdrawal"}
+        ),
+        # A rejected withdrawal is refunded at most once
+        IndexModel(
+            [("withdrawal_id", ASCENDING)],
+            name="refund_withdrawal_unique",
+            unique=True,
+            partialFilterExpression={"type": "refund"}
+        ),
+        # Refunds left pending or crediting, and claim lookups
+        IndexModel(
+            [("status", ASCENDING), ("created_at", ASCENDING)],
+            name="refund_queue",
+            partialFilterExpression={"type": "refund"}
+        ),
+    ],
+    "ledger": [
+        IndexModel([("user_id", ASCENDING), ("posted_at", ASCENDING)], name="user_ledger_posted"),
+    ],
+    "game_stats_hourly": [
+        IndexModel([("hour", ASCENDING), ("game_type", ASCENDING)], name="dashboard_window"),
+    ],
+}
+
+# Indexes replaced under a new name, dropped once their replacement exists.
+# An index's keys cannot change under the same name.
+RETIRED_INDEXES = {
+    "bets": ["user_history"],
+    "transactions": ["user_history"],
+    "ledger": ["user_ledger"],
+}
+
+# Query shapes issued by the blueprints, with placeholder values for explain()
+SAMPLE_ID = "000000000000000000000000"
+QUERY_SHAPES = [
+    ("auth.register/login", "users", {"username": "sample"}, None),
+    ("auth.profile", "wallets", {"user_id": SAMPLE_ID}, None),
+    ("games.play (prepared seed)", "game_seeds",
+     {"user_id": SAMPLE_ID, "server_seed_hash": "0" * 64, "used": False}, None),
+    ("games.seed_session", "seed_sessions", {"user_id": SAMPLE_ID, "active": True}, None),
+    ("games.play (seed session)", "seed_sessions",
+     {"user_id": SAMPLE_ID, "server_seed_hash": "0" * 64, "active": True}, None),
+    ("betting.bet_history", "bets", {"user_id": SAMPLE_ID}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("payments.transactions", "transactions", {"user_id": SAMPLE_ID},
+     [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("payments.bitcoin_address", "wallets", {"user_id": SAMPLE_ID}, None),
+    ("payments.deposit_webhook", "transactions", {"type": "deposit", "transaction_id": {"$in": ["sample"]}}, None),
+    ("withdrawal_worker.claim", "transactions", {"type": "withdrawal", "status": "pending"}, [("created_at", ASCENDING)]),
+    ("withdrawal_worker.claimed", "transactions", {"type": "withdrawal", "claim_id": SAMPLE_ID}, None),
+    ("withdrawal_worker.refund_recovery", "transactions", {"type": "refund", "status": "pending"}, None),
+    ("reconciliation.tail", "ledger", {"user_id": SAMPLE_ID, "posted_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("stats.dashboard", "game_stats_hourly", {"hour": {"$gte": datetime(2000, 1, 1)}},
+     [("hour", ASCENDING), ("game_type", ASCENDING)]),
+]
+
+def ensure_indexes(db):
+    """
+    Create every declared index that does not exist yet, then drop the
+    retired ones.
+
+    Returns:
+        dict: Index names per collection
+    """
+    created = {}
+    for collection, models in INDEXES.items():
+        created[collection] = db[collection].create_indexes(models)
+    for collection, names in RETIRED_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+    return created
+
+def _stages(plan):
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _stages(child)
+
+def find_collection_scans(db):
+    """
+    Explain each known query shape and report the ones that scan a collection.
+
+    Returns:
+        list: One entry per shape whose winning plan contains a COLLSCAN
+    """
+    scans = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        if 'COLLSCAN' in _stages(plan):
+            scans.append({"query": name, "collection": collection, "filter": query})
+    return scans
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create casino collection indexes")
+    parser.add_argument('--explain', action='store_true', help="Report queries that fall back to a collection scan")
+    args = parser.parse_args(argv)
+
+    from db.database import get_db
+    db = get_db()
+
+    report = {"indexes": ensure_indexes(db)}
+    if args.explain:
+        report["collection_scans"] = find_collection_scans(db)
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("collection_scans") else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
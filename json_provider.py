@@ -0,0 +1,64 @@
+# casino_app/utils/json_provider.py
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the standard library
+    orjson = None
+
+def _default(value):
+    """Encode the Mongo and numeric types the standard encoders reject."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, Decimal):
+        # A float would round amounts; the exact decimal string does not
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson:
+    def dumps_bytes(obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(obj, indent=False):
+        return json.dumps(obj, default=_default, indent=2 if indent else None,
+                          separators=None if indent else (',', ':')).encode()
+
+    loads = json.loads
+
+def dumps(obj):
+    """Serialize obj to a JSON string, handling ObjectId, datetime and Decimal."""
+    return dumps_bytes(obj).decode()
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson when it is installed.
+
+    ObjectId, datetime and Decimal values are encoded natively, so routes can
+    return Mongo documents as they come back from the driver; Decimal and
+    Decimal128 become exact decimal strings. Responses are built straight
+    from the encoded bytes.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, indent=self._app.debug), mimetype=self.mimetype)
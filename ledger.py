@@ -0,0 +1,121 @@
+# casino_app/utils/ledger.py
+"""
+Append-only double-entry ledger of every balance change.
+
+Each change to users.balance is posted as one or more entries that move an
+amount from a debit account to a credit account:
+
+    deposit     cash:<method>     -> player:<user id>
+    bet         player:<user id>  -> house:bets
+    stake       player:<user id>  -> house:games
+    payout      house:games       -> player:<user id>
+    withdrawal  player:<user id>  -> payouts:<method>
+    refund      payouts:<method>  -> player:<user id>
+
+A player's balance is therefore the sum of the entries crediting their
+account minus the ones debiting it. Entries are never updated or deleted;
+utils.reconciliation folds them into per-user snapshots and checks
+users.balance against them.
+
+Entries are posted after the balance update they describe. Game rounds and
+bets go through a write-behind queue like game_results does; payments are
+posted before the request returns. created_at is when the balance changed;
+posted_at is stamped by the writer on every insert attempt, so an entry
+that reaches the ledger late, after a database outage held up the queue,
+still sorts after everything that was already there. Snapshots are cut on
+posted_at.
+"""
+from db.database import get_db
+from utils.write_behind import create_queue, insert_many_idempotent, insert_many_idempotent_async
+
+HOUSE_GAMES = 'house:games'
+HOUSE_BETS = 'house:bets'
+
+def player_account(user_id):
+    return f'player:{user_id}'
+
+def cash_account(payment_method):
+    return f'cash:{payment_method}'
+
+def payout_account(payment_method):
+    return f'payouts:{payment_method}'
+
+def ledger_entry(user_id, kind, debit, credit, amount, timestamp, reference=None, **details):
+    """
+    One posting for a change to user_id's balance.
+
+    Args:
+        user_id: Player whose balance changed; one of debit and credit is
+            their account
+        kind: What moved the money (deposit, bet, stake, ...)
+        debit: Account the amount leaves
+        credit: Account the amount arrives in
+        amount: Non-negative amount moved
+        timestamp: When the balance changed
+        reference: Id of the bet or transaction behind the change
+    """
+    entry = {
+        "user_id": user_id,
+        "kind": kind,
+        "debit": debit,
+        "credit": credit,
+        "amount": amount,
+        "created_at": timestamp
+    }
+    if reference is not None:
+        entry["reference"] = reference
+    entry.update(details)
+    return entry
+
+def player_delta(entry):
+    """Signed effect of an entry on its player's balance."""
+    account = player_account(entry['user_id'])
+    if entry['credit'] == account:
+        return entry['amount']
+    if entry['debit'] == account:
+        return -entry['amount']
+    return 0
+
+def round_entries(user_id, game_type, total_bet, total_payout, rounds, timestamp):
+    """The stake and (if anything was won) the payout of settled rounds."""
+    entries = [ledger_entry(user_id, 'stake', player_account(user_id), HOUSE_GAMES, total_bet, timestamp,
+                            game_type=game_type, rounds=rounds)]
+    if total_payout:
+        entries.append(ledger_entry(user_id, 'payout', HOUSE_GAMES, player_account(user_id), total_payout,
+                                    timestamp, game_type=game_type, rounds=rounds))
+    return entries
+
+def bet_entry(user_id, bet_id, game_id, amount, timestamp):
+    return ledger_entry(user_id, 'bet', player_account(user_id), HOUSE_BETS, amount, timestamp,
+                        reference=str(bet_id), game_id=game_id)
+
+def deposit_entry(user_id, transaction_id, payment_method, amount, timestamp):
+    return ledger_entry(user_id, 'deposit', cash_account(payment_method), player_account(user_id), amount,
+                        timestamp, reference=transaction_id)
+
+def withdrawal_entry(user_id, withdrawal_id, payment_method, amount, timestamp):
+    return ledger_entry(user_id, 'withdrawal', player_account(user_id), payout_account(payment_method), amount,
+                        timestamp, reference=str(withdrawal_id))
+
+def refund_entry(user_id, withdrawal_id, payment_method, amount, timestamp):
+    return ledger_entry(user_id, 'refund', payout_account(payment_method), player_account(user_id), amount,
+                        timestamp, reference=str(withdrawal_id))
+
+def _stamped(db, entries):
+    posted_at = db.server_timestamp()
+    for entry in entries:
+        entry['posted_at'] = posted_at
+    return entries
+
+def post_entries(db, entries):
+    """Append entries to the ledger before returning."""
+    if entries:
+        insert_many_idempotent(db.ledger, _stamped(db, entries))
+
+async def post_entries_async(db, entries):
+    if entries:
+        await insert_many_idempotent_async(db.ledger, _stamped(db, entries))
+
+# Game rounds and bets are posted off the request path; each flush attempt
+# stamps its own posted_at
+ledger_queue = create_queue('ledger', lambda entries: post_entries(get_db(), entries), 'LEDGER_QUEUE')
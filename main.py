@@ -1,7 +1,7 @@
 # casino_app/main.py
 import os
 import logging
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from dotenv import load_dotenv
 
 # Import app components
@@ -9,7 +9,19 @@ from auth.user_management import auth_blueprint, jwt
 from games.game_manager import game_blueprint
 from betting.bet_manager import betting_blueprint
 from payments.transaction_manager import payment_blueprint
+from stats.stats_manager import operator_error, stats_blueprint
 from utils.provably_fair import verify_fairness
+from utils.verification import MAX_BULK_VERIFICATIONS, bulk_cost, verification_args, verification_error, verify_games
+from utils.settlement import game_results_queue
+from utils.player_stats import stats_queue
+from utils.ledger import ledger_queue
+from utils.password_hashing import password_hasher
+from utils.rate_limit import admission_control, rate_limited
+from utils.user_cache import user_cache
+from utils.json_provider import FastJSONProvider
+from utils import metrics
+from db.database import get_db
+from db.indexes import ensure_indexes
 
 # Load environment variables
 load_dotenv()
@@ -27,30 +39,76 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
 
+# Encode ObjectId, datetime and Decimal natively with a fast encoder
+app.json = FastJSONProvider(app)
+
 # Register JWT with app
 jwt.init_app(app)
 
+# Time every request and the database calls it makes
+metrics.init_app(app)
+
+# Make sure every query the blueprints issue has an index before serving.
+# Under gunicorn the worker warm-up hook does this after fork instead.
+if os.getenv('ENSURE_INDEXES', 'True') == 'True' and not os.getenv('SERVER_SOFTWARE', '').startswith('gunicorn'):
+    ensure_indexes(get_db())
+
 # Register blueprints
 app.register_blueprint(auth_blueprint, url_prefix='/api/auth')
 app.register_blueprint(game_blueprint, url_prefix='/api/games')
 app.register_blueprint(betting_blueprint, url_prefix='/api/betting')
 app.register_blueprint(payment_blueprint, url_prefix='/api/payments')
+app.register_blueprint(stats_blueprint, url_prefix='/api/stats')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "version": "1.0.0"})
+    return jsonify({
+        "status": "healthy",
+        "version": "1.0.0",
+        "audit_queue": game_results_queue.stats(),
+        "stats_queue": stats_queue.stats(),
+        "ledger_queue": ledger_queue.stats(),
+        "password_hasher": password_hasher.stats(),
+        "user_cache": user_cache.stats(),
+        "rate_limiter": admission_control.stats()
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Same port as the players, so only scrapers holding the operator token
+    error = operator_error(request.headers.get('X-Operator-Token'))
+    if error:
+        return jsonify(error[0]), error[1]
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
 
 @app.route('/api/verify-fairness', methods=['POST'])
 def fairness_check():
-    data = request.get_json()
-    result = verify_fairness(
-        data.get('game_type'),
-        data.get('client_seed'),
-        data.get('server_seed_hash'),
-        data.get('nonce'),
-        data.get('result')
-    )
+    game = request.get_json(silent=True)
+    error = verification_error(game)
+    if error:
+        return jsonify({"error": error}), 400
+    result = verify_fairness(*verification_args(game))
     return jsonify({"verified": result})
 
+@app.route('/api/verify-fairness/bulk', methods=['POST'])
+@rate_limited('verify.bulk', cost=bulk_cost, anonymous=True)
+def bulk_fairness_check():
+    data = request.get_json(silent=True)
+    games = data.get('games') if isinstance(data, dict) else None
+    
+    if not isinstance(games, list) or not games:
+        return jsonify({"error": "games must be a non-empty list"}), 400
+    if len(games) > MAX_BULK_VERIFICATIONS:
+        return jsonify({"error": f"At most {MAX_BULK_VERIFICATIONS} games per request"}), 400
+    
+    verdicts = verify_games([verification_args(game) for game in games])
+    
+    return jsonify({
+        "results": [{"index": i, "verified": verified} for i, verified in enumerate(verdicts)],
+        "verified": sum(verdicts),
+        "failed": len(verdicts) - sum(verdicts)
+    })
+
 if __name__ == '__main__':
     app.run(debug=os.getenv('FLASK_DEBUG', 'True') == 'True')
@@ -0,0 +1,179 @@
+# casino_app/utils/metrics.py
+"""
+Prometheus metrics for the API.
+
+Request latency is recorded per blueprint and route, together with the
+number and total time of database operations each request issued, and
+every database operation is timed per collection and command so the calls
+behind a slow route can be told apart. Game rounds record engine time,
+spins, wagers and payouts per game type, and requests turned away by
+admission control are counted per endpoint scope and reason.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up by gunicorn.conf.py) and /api/metrics merges them, so a scrape
+sees the whole server whichever worker answers it. The endpoint is served
+on the public port, so like the operator dashboard it requires the
+X-Operator-Token header.
+"""
+import os
+import time
+from contextvars import ContextVar
+from pymongo import monitoring
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+DB_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+ENGINE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+REQUEST_LATENCY = Histogram(
+    'casino_request_duration_seconds', 'Request latency',
+    ['blueprint', 'route', 'method', 'status'], buckets=REQUEST_BUCKETS
+)
+REQUEST_DB_OPERATIONS = Histogram(
+    'casino_request_db_operations', 'Database operations issued by one request',
+    ['blueprint', 'route'], buckets=DB_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    'casino_request_db_seconds', 'Time one request spent waiting on the database',
+    ['blueprint', 'route'], buckets=REQUEST_BUCKETS
+)
+DB_OPERATION_LATENCY = Histogram(
+    'casino_db_operation_duration_seconds', 'Database operation latency',
+    ['collection', 'command', 'outcome'], buckets=DB_BUCKETS
+)
+GAME_ENGINE_LATENCY = Histogram(
+    'casino_game_engine_duration_seconds', 'Time spent in a game engine per call',
+    ['game_type', 'mode'], buckets=ENGINE_BUCKETS
+)
+SPINS = Counter('casino_spins_total', 'Rounds played and settled', ['game_type'])
+WAGERED = Counter('casino_wagered_total', 'Amount staked on settled rounds', ['game_type'])
+PAID_OUT = Counter('casino_paid_out_total', 'Amount paid out on settled rounds', ['game_type'])
+RATE_LIMITED = Counter('casino_rate_limited_total', 'Requests turned away by admission control',
+                       ['scope', 'reason'])
+
+class _RequestStats:
+    __slots__ = ('started', 'db_operations', 'db_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_operations = 0
+        self.db_seconds = 0.0
+
+# Set for the duration of a request; contextvars follow both threads and
+# asyncio tasks, so database events land on the request that caused them
+_current_request = ContextVar('casino_request_stats', default=None)
+
+def record_db_operation(collection, command, seconds, failed=False):
+    DB_OPERATION_LATENCY.labels(collection or '', command, 'failed' if failed else 'ok').observe(seconds)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.db_operations += 1
+        stats.db_seconds += seconds
+
+# Commands the driver issues for its own bookkeeping rather than for a route
+_IGNORED_COMMANDS = frozenset(('hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'killCursors'))
+
+class DatabaseCommandListener(monitoring.CommandListener):
+    """Feeds pymongo command events into the database metrics."""
+
+    def __init__(self):
+        # request_id -> collection; events for one command arrive in order on
+        # the same connection, started first
+        self._collections = {}
+
+    def started(self, event):
+        if event.command_name not in _IGNORED_COMMANDS:
+            target = event.command.get(event.command_name)
+            self._collections[event.request_id] = target if isinstance(target, str) else ''
+
+    def _finished(self, event, failed):
+        collection = self._collections.pop(event.request_id, None)
+        if collection is not None:
+            record_db_operation(collection, event.command_name, event.duration_micros / 1e6, failed)
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+command_listener = DatabaseCommandListener()
+
+def record_rounds(game_type, mode, engine_seconds, spins, wagered, paid_out):
+    """Record a settled call into a game engine covering spins rounds."""
+    GAME_ENGINE_LATENCY.labels(game_type, mode).observe(engine_seconds)
+    SPINS.labels(game_type).inc(spins)
+    WAGERED.labels(game_type).inc(wagered)
+    PAID_OUT.labels(game_type).inc(paid_out)
+
+def record_rate_limited(scope, reason):
+    RATE_LIMITED.labels(scope, reason).inc()
+
+def start_request():
+    """Begin collecting stats for the current request; returns a token for finish_request."""
+    return _current_request.set(_RequestStats())
+
+def finish_request(token, blueprint, route, method, status):
+    stats = _current_request.get()
+    _current_request.reset(token)
+    if stats is None:
+        return
+    blueprint = blueprint or ''
+    route = route or 'unmatched'
+    REQUEST_LATENCY.labels(blueprint, route, method, str(status)).observe(time.perf_counter() - stats.started)
+    REQUEST_DB_OPERATIONS.labels(blueprint, route).observe(stats.db_operations)
+    REQUEST_DB_TIME.labels(blueprint, route).observe(stats.db_seconds)
+
+def render_metrics():
+    """
+    Returns:
+        tuple: (Prometheus text exposition bytes, content type)
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Merge the samples every worker has written
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def init_app(app):
+    """Time every request of a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_token = start_request()
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        token = g.pop('metrics_token', None)
+        if token is None:
+            return
+        status = g.pop('metrics_status', 500)
+        rule = request.url_rule.rule if request.url_rule else None
+        finish_request(token, request.blueprint, rule, request.method, status)
+
+    @app.after_request
+    def _capture_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+def init_async_app(app):
+    """Time every request of a Quart app."""
+    from quart import g, request
+
+    # The hooks are coroutines so they run in the request's own context
+    @app.before_request
+    async def _start_request_metrics():
+        g.metrics_token = start_request()
+
+    @app.after_request
+    async def _finish_request_metrics(response):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            rule = request.url_rule.rule if request.url_rule else None
+            finish_request(token, request.blueprint, rule, request.method, response.status_code)
+        return response
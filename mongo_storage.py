@@ -0,0 +1,20 @@
+# casino_app/db/mongo_storage.py
+from pymongo import MongoClient
+from db.storage import Storage
+
+class MongoStorage(Storage):
+    """Storage backed by a MongoDB database through pymongo."""
+
+    def __init__(self, uri, **client_options):
+        self.client = MongoClient(uri, **client_options)
+        self.database = self.client.get_default_database('casino')
+
+    def collection(self, name):
+        return self.database[name]
+
+    def ping(self):
+        self.client.admin.command('ping')
+        return True
+
+    def close(self):
+        self.client.close()
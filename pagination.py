@@ -0,0 +1,184 @@
+# casino_app/utils/pagination.py
+import base64
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+from utils.json_provider import dumps
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Rows fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# Newest first, with _id breaking ties between equal timestamps
+HISTORY_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+def encode_cursor(doc):
+    """Opaque cursor pointing just past doc in HISTORY_SORT order."""
+    position = {"created_at": doc['created_at'].isoformat(), "_id": str(doc['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position['created_at']), ObjectId(position['_id'])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+def parse_page_size(value):
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]."""
+    try:
+        page_size = int(value) if value is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def parse_fields(value, allowed):
+    """
+    Turn a comma separated field list into a projection.
+
+    Unknown fields are ignored; no list (or an empty one) selects every
+    allowed field.
+
+    Returns:
+        tuple: (list of field names, projection dict)
+    """
+    requested = [field.strip() for field in (value or '').split(',') if field.strip()]
+    fields = [field for field in requested if field in allowed] or list(allowed)
+    # created_at and _id are always read because the cursor is built from them
+    projection = {field: True for field in fields}
+    projection['created_at'] = True
+    return fields, projection
+
+def _page_filter(query, cursor):
+    page_filter = dict(query)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        page_filter["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}}
+        ]
+    return page_filter
+
+def _split_page(docs, page_size):
+    if len(docs) <= page_size:
+        return docs, None
+
+    docs = docs[:page_size]
+    return docs, encode_cursor(docs[-1])
+
+def keyset_page(collection, query, page_size, cursor=None, projection=None):
+    """
+    Fetch one page of a history in HISTORY_SORT order.
+
+    Instead of skipping rows, the next page starts strictly after the
+    (created_at, _id) of the previous page's last row, so every page costs
+    one index range scan no matter how deep it is.
+
+    Args:
+        collection: Collection to read
+        query: Filter selecting the history (e.g. by user_id)
+        page_size: Rows per page
+        cursor: Cursor returned with the previous page, if any
+        projection: Fields to return
+
+    Returns:
+        tuple: (list of documents, cursor for the next page or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    page_filter = _page_filter(query, cursor)
+    docs = list(collection.find(page_filter, projection).sort(HISTORY_SORT).limit(page_size + 1))
+    return _split_page(docs, page_size)
+
+async def keyset_page_async(collection, query, page_size, cursor=None, projection=None):
+    """keyset_page for a collection of the async storage API."""
+    page_filter = _page_filter(query, cursor)
+    docs = await collection.find(page_filter, projection).sort(HISTORY_SORT).limit(page_size + 1).to_list(page_size + 1)
+    return _split_page(docs, page_size)
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, (Decimal, ObjectId)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # Nested documents and arrays go in the cell as JSON
+    return dumps(value)
+
+def _export_format(fields, fmt):
+    """
+    Returns:
+        tuple: (header line, function rendering one document as a line)
+    """
+    if fmt != 'csv':
+        return '', lambda doc: dumps(doc) + '\n'
+
+    columns = ['_id'] + [field for field in fields if field != '_id']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(values):
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    return render(columns), lambda doc: render([_csv_value(doc.get(column)) for column in columns])
+
+def export_rows(collection, query, fields, fmt):
+    """
+    Stream a whole history as NDJSON or CSV lines.
+
+    Documents are pulled from the database cursor in EXPORT_BATCH_SIZE
+    batches and written out one at a time, so memory stays flat no matter
+    how long the history is.
+    """
+    projection = {field: True for field in fields}
+    docs = collection.find(query, projection).sort(HISTORY_SORT).batch_size(EXPORT_BATCH_SIZE)
+    header, render = _export_format(fields, fmt)
+
+    if header:
+        yield header
+    for doc in docs:
+        yield render(doc)
+
+async def export_rows_async(collection, query, fields, fmt):
+    """export_rows for a collection of the async storage API."""
+    projection = {field: True for field in fields}
+    docs = collection.find(query, projection).sort(HISTORY_SORT).batch_size(EXPORT_BATCH_SIZE)
+    header, render = _export_format(fields, fmt)
+
+    if header:
+        yield header
+    async for doc in docs:
+        yield render(doc)
@@ -0,0 +1,127 @@
+# casino_app/utils/password_hashing.py
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing is deliberately slow CPU work. It runs on a small pool of
+# its own so a burst of logins can use at most PASSWORD_HASH_WORKERS cores
+# per process and never the threads serving /play. hashlib's KDFs release
+# the GIL, so the pool hashes in parallel.
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool already has max_pending jobs."""
+
+class PasswordHasher:
+    """
+    Bounded executor for password hashing and verification.
+
+    At most workers hashes run at once, and at most max_pending jobs are
+    accepted (running plus waiting); beyond that callers get HasherBusy
+    straight away instead of queueing without limit.
+
+    Args:
+        method: werkzeug hash method, e.g. 'scrypt:32768:8:1' or
+            'pbkdf2:sha256:1000000'. Stored hashes made with other
+            parameters are reported by needs_rehash.
+        workers: Hashes run in parallel
+        max_pending: Jobs accepted before HasherBusy is raised
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=2, max_pending=64):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._method_prefix = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._submitted = 0
+        self._rejected = 0
+        self._pending = 0
+        self._completed = 0
+        self._queue_seconds_total = 0.0
+        self._queue_seconds_max = 0.0
+        self._hash_seconds_total = 0.0
+        self._hash_seconds_max = 0.0
+
+    def _submit(self, fn, *args):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Forked child: the parent's pool threads do not exist here
+                    self._reset()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy(f"{self.max_pending} password hashes already pending")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._submitted += 1
+            self._pending += 1
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self._completed += 1
+                    self._queue_seconds_total += started - submitted
+                    self._queue_seconds_max = max(self._queue_seconds_max, started - submitted)
+                    self._hash_seconds_total += finished - started
+                    self._hash_seconds_max = max(self._hash_seconds_max, finished - started)
+                self._slots.release()
+
+        return self._executor.submit(run)
+
+    def hash(self, password):
+        """Hash password with the configured method, waiting for a pool slot."""
+        return self._submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, stored_hash, password):
+        return self._submit(check_password_hash, stored_hash, password).result()
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self._submit(generate_password_hash, password, self.method))
+
+    async def verify_async(self, stored_hash, password):
+        return await asyncio.wrap_future(self._submit(check_password_hash, stored_hash, password))
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with a different method or cost than the configured one."""
+        if self._method_prefix is None:
+            # werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'), so
+            # take the canonical prefix from a real hash. Worker warm-up pays
+            # for this once.
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_queue_ms": self._queue_seconds_total / self._completed * 1000 if self._completed else 0.0,
+            "max_queue_ms": self._queue_seconds_max * 1000,
+            "avg_hash_ms": self._hash_seconds_total / self._completed * 1000 if self._completed else 0.0,
+            "max_hash_ms": self._hash_seconds_max * 1000
+        }
+
+password_hasher = PasswordHasher(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', '2')),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+)
@@ -0,0 +1,134 @@
+# casino_app/payments/payout_gateway.py
+"""
+Payout gateways used by the withdrawal worker.
+
+A gateway pays out one batch of withdrawals for a single payment method,
+e.g. one multi-output Bitcoin transaction or one bank transfer file, so the
+network or processor fee is paid once per batch rather than per withdrawal.
+
+submit_batch must be idempotent on batch_key: the worker resubmits a batch
+under the same key when it cannot tell whether an earlier submission went
+through, and the gateway must answer with the original outcome instead of
+paying twice.
+
+PAYOUT_GATEWAY selects the implementation, 'package.module:ClassName' for
+a real integration. It has no default: a worker that pays out money must be
+told where. 'simulator' only remembers batch keys in memory, so a restarted
+worker could pay a batch twice; it is refused unless PAYOUT_SIMULATOR_ALLOWED=1
+marks a development setup.
+"""
+import importlib
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+class GatewayUnavailable(Exception):
+    """The gateway could not be reached; the batch may or may not have been submitted."""
+
+class PayoutBatchResult:
+    """
+    Outcome of one submitted batch.
+
+    Attributes:
+        reference: Gateway reference for the payout, e.g. a transaction id
+        fee: Fee charged for the whole batch
+        failed: {withdrawal_id: reason} for payouts the gateway rejected;
+            every other payout in the batch was sent
+    """
+
+    def __init__(self, reference, fee=0, failed=None):
+        self.reference = reference
+        self.fee = fee
+        self.failed = dict(failed or {})
+
+class PayoutGateway(ABC):
+    """Pays out batches of withdrawals for the withdrawal worker."""
+
+    @abstractmethod
+    def submit_batch(self, payment_method, batch_key, payouts):
+        """
+        Pay out a batch of withdrawals.
+
+        Args:
+            payment_method: Method every payout in the batch uses
+            batch_key: Idempotency key for the batch
+            payouts: List of {"withdrawal_id", "destination", "amount"} dicts
+
+        Returns:
+            PayoutBatchResult
+
+        Raises:
+            GatewayUnavailable: If the outcome of the submission is unknown
+        """
+
+class SimulatedPayoutGateway(PayoutGateway):
+    """
+    Local stand-in for a payout provider.
+
+    Payouts without a destination are rejected, and each of the others fails
+    with probability failure_rate. Fees follow a per-batch base plus a small
+    per-output charge, the shape of a Bitcoin transaction fee.
+    """
+
+    FEES = {
+        "bitcoin": (0.0001, 0.00002),
+        "bank_transfer": (0.25, 0.0),
+        "credit_card": (0.0, 0.30)
+    }
+
+    def __init__(self, failure_rate=0.0, latency=0.0, seed=None):
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._submitted = {}
+
+    def submit_batch(self, payment_method, batch_key, payouts):
+        with self._lock:
+            if batch_key in self._submitted:
+                return self._submitted[batch_key]
+
+            if self.latency:
+                time.sleep(self.latency)
+            failed = {}
+            for payout in payouts:
+                if not payout.get('destination'):
+                    failed[payout['withdrawal_id']] = "Missing destination"
+                elif self._random.random() < self.failure_rate:
+                    failed[payout['withdrawal_id']] = "Rejected by simulator"
+
+            base_fee, output_fee = self.FEES.get(payment_method, (0.0, 0.0))
+            sent = len(payouts) - len(failed)
+            result = PayoutBatchResult(
+                reference=f"sim-{payment_method}-{uuid.uuid4().hex[:16]}" if sent else None,
+                fee=base_fee + output_fee * sent if sent else 0,
+                failed=failed
+            )
+            self._submitted[batch_key] = result
+            return result
+
+def load_gateway(spec=None):
+    """
+    Build the gateway named by spec, or by PAYOUT_GATEWAY when spec is None.
+
+    Raises:
+        ValueError: If no gateway is configured, or the simulator is asked
+            for outside a development setup
+    """
+    spec = spec or os.getenv('PAYOUT_GATEWAY')
+    if not spec:
+        raise ValueError("PAYOUT_GATEWAY is not set; name the payout integration as 'module:ClassName'")
+    if spec == 'simulator':
+        if os.getenv('PAYOUT_SIMULATOR_ALLOWED') != '1':
+            raise ValueError("The payout simulator is for development only; set PAYOUT_SIMULATOR_ALLOWED=1 to use it")
+        return SimulatedPayoutGateway(
+            failure_rate=float(os.getenv('PAYOUT_SIMULATOR_FAILURE_RATE', '0')),
+            latency=float(os.getenv('PAYOUT_SIMULATOR_LATENCY', '0'))
+        )
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"PAYOUT_GATEWAY must be 'simulator' or 'module:ClassName', got {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,338 @@
+# casino_app/utils/player_stats.py
+"""
+Materialized player and game statistics.
+
+Settlement and bet placement hand a small stats event to a write-behind
+queue instead of leaving the numbers to be aggregated out of game_results
+and bets later. Each flush coalesces its events and applies one $inc upsert
+per player, per game type and per game type and hour:
+
+    player_stats       _id = user id; totals plus a per-game breakdown
+    game_stats         _id = game type; all-time totals
+    game_stats_hourly  _id = "<game type>|<hour>"; totals per UTC hour
+
+so reads are single-document lookups (or one small range scan for the
+dashboard) and never touch the history collections. Counters trail the
+balance by at most one flush interval. player_stats is keyed like users,
+by user_key().
+
+A flush can fail after updating some of its documents and be retried.
+Every document keeps the ids of the last APPLIED_BATCHES batches folded
+into it, and each update only matches a document that does not list its
+batch yet, so a retry skips the documents that were already updated.
+
+A player's VIP tier follows their lifetime stake: when a flush moves a
+player's wagered total past a tier threshold, users.vip_status is raised.
+
+Usage:
+    python -m utils.player_stats --rebuild   # recompute everything from game_results and bets
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db.database import get_db
+from games.game_registry import GAME_SPECS
+from utils.user_cache import user_cache, user_key
+from utils.write_behind import create_queue
+
+COUNTERS = ('rounds', 'bets', 'wagered', 'paid_out', 'wins')
+
+# Bets on anything that is not a registered game are rolled up together
+OTHER_GAME = 'other'
+
+# (tier, lifetime amount wagered needed to reach it), lowest first
+VIP_TIERS = (
+    ('standard', 0),
+    ('bronze', float(os.getenv('VIP_BRONZE_WAGERED', '1000'))),
+    ('silver', float(os.getenv('VIP_SILVER_WAGERED', '10000'))),
+    ('gold', float(os.getenv('VIP_GOLD_WAGERED', '50000'))),
+    ('platinum', float(os.getenv('VIP_PLATINUM_WAGERED', '250000')))
+)
+
+# Batch ids remembered per counter document; a retry of any of them is skipped
+APPLIED_BATCHES = int(os.getenv('PLAYER_STATS_APPLIED_BATCHES', '256'))
+
+# Longest window the operator dashboard will return
+MAX_DASHBOARD_HOURS = 24 * 31
+
+def stats_event(user_id, game_type, timestamp, rounds=0, bets=0, wagered=0, paid_out=0, wins=0):
+    if game_type not in GAME_SPECS:
+        game_type = OTHER_GAME
+    return {
+        "event_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "game_type": game_type,
+        "timestamp": timestamp,
+        "rounds": rounds,
+        "bets": bets,
+        "wagered": wagered,
+        "paid_out": paid_out,
+        "wins": wins
+    }
+
+def settlement_event(user_id, total_bet, total_payout, records):
+    """Stats event for rounds settled together by utils.settlement.settle_rounds."""
+    first = records[0]
+    return stats_event(
+        user_id, first['game_type'], first['timestamp'],
+        rounds=len(records),
+        wagered=total_bet,
+        paid_out=total_payout,
+        wins=sum(1 for record in records if record['result']['payout'] > 0)
+    )
+
+def bet_event(user_id, game_id, amount, timestamp):
+    """Stats event for a placed bet."""
+    return stats_event(user_id, game_id, timestamp, bets=1, wagered=amount)
+
+def hour_of(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _hourly_id(game_type, hour):
+    return f"{game_type}|{hour:%Y-%m-%dT%H}"
+
+def vip_tier(wagered):
+    tier = VIP_TIERS[0][0]
+    for name, threshold in VIP_TIERS:
+        if wagered >= threshold:
+            tier = name
+    return tier
+
+def _add(totals, event):
+    for counter in COUNTERS:
+        totals[counter] += event[counter]
+
+def _inc(prefix, totals):
+    return {f"{prefix}{counter}": amount for counter, amount in totals.items() if amount}
+
+def batch_id(events):
+    """Id of a batch of events, the same on every retry of it."""
+    digest = hashlib.sha256()
+    for event_id in sorted(event['event_id'] for event in events):
+        digest.update(event_id.encode())
+    return digest.hexdigest()
+
+def _unapplied(doc_id, batch):
+    return {"_id": doc_id, "applied_batches": {"$ne": batch}}
+
+def _applied(batch):
+    return {"applied_batches": {"$each": [batch], "$slice": -APPLIED_BATCHES}}
+
+def apply_stats(events, db=None):
+    """
+    Fold a batch of stats events into the materialized counters.
+
+    Events for the same player, game or hour are summed first, so a batch
+    costs one update per distinct key however many rounds it covers.
+    Applying the same batch again leaves the counters as they are.
+
+    Returns:
+        dict: Number of player, game and hourly documents updated
+    """
+    db = db or get_db()
+    batch = batch_id(events)
+    players = defaultdict(lambda: {"totals": defaultdict(int), "games": defaultdict(lambda: defaultdict(int)),
+                                   "first": None, "last": None})
+    games = defaultdict(lambda: defaultdict(int))
+    hours = defaultdict(lambda: defaultdict(int))
+
+    for event in events:
+        player = players[event['user_id']]
+        _add(player['totals'], event)
+        _add(player['games'][event['game_type']], event)
+        timestamp = event['timestamp']
+        if player['first'] is None or timestamp < player['first']:
+            player['first'] = timestamp
+        if player['last'] is None or timestamp > player['last']:
+            player['last'] = timestamp
+        _add(games[event['game_type']], event)
+        _add(hours[(event['game_type'], hour_of(timestamp))], event)
+
+    for user_id, player in players.items():
+        increments = _inc('totals.', player['totals'])
+        for game_type, totals in player['games'].items():
+            increments.update(_inc(f"games.{game_type}.", totals))
+        try:
+            after = db.player_stats.find_one_and_update(
+                _unapplied(user_key(user_id), batch),
+                {
+                    "$inc": increments,
+                    "$set": {"last_played_at": player['last']},
+                    "$setOnInsert": {"first_played_at": player['first']},
+                    "$push": _applied(batch)
+                },
+                projection={"totals.wagered": True},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Counted by an earlier attempt, which may have stopped short
+            # of the promotion
+            current = db.player_stats.find_one({"_id": user_key(user_id)}, {"totals.wagered": True})
+            _promote(db, user_id, vip_tier(current.get('totals', {}).get('wagered', 0)))
+            continue
+        wagered = after.get('totals', {}).get('wagered', 0)
+        tier = vip_tier(wagered)
+        if tier != vip_tier(wagered - player['totals']['wagered']):
+            _promote(db, user_id, tier)
+
+    for game_type, totals in games.items():
+        _apply_once(db.game_stats, _unapplied(game_type, batch),
+                    {"$inc": _inc('', totals), "$push": _applied(batch)})
+
+    for (game_type, hour), totals in hours.items():
+        _apply_once(db.game_stats_hourly, _unapplied(_hourly_id(game_type, hour), batch), {
+            "$inc": _inc('', totals),
+            "$setOnInsert": {"game_type": game_type, "hour": hour},
+            "$push": _applied(batch)
+        })
+
+    return {"players": len(players), "games": len(games), "hours": len(hours)}
+
+def _apply_once(collection, filter, update):
+    try:
+        collection.update_one(filter, update, upsert=True)
+    except DuplicateKeyError:
+        # The document already lists this batch
+        pass
+
+def _promote(db, user_id, tier):
+    # Only ever raise a tier, so one granted by hand is never taken away
+    tiers = [name for name, _ in VIP_TIERS]
+    lower = tiers[:tiers.index(tier)]
+    if not lower:
+        return
+    result = db.users.update_one(
+        {"_id": user_key(user_id), "vip_status": {"$in": lower}},
+        {"$set": {"vip_status": tier}, "$inc": {"version": 1}}
+    )
+    if result.modified_count:
+        user_cache.invalidate(user_id)
+
+stats_queue = create_queue('player_stats', apply_stats, 'PLAYER_STATS_QUEUE')
+
+def _rates(totals):
+    """Counters plus the realized return-to-player and hit rate."""
+    summary = {counter: totals.get(counter, 0) for counter in COUNTERS}
+    summary["rtp"] = summary['paid_out'] / summary['wagered'] if summary['wagered'] else None
+    summary["hit_rate"] = summary['wins'] / summary['rounds'] if summary['rounds'] else None
+    return summary
+
+def player_summary(doc):
+    """API view of a player_stats document (or of no play at all)."""
+    doc = doc or {}
+    return {
+        "totals": _rates(doc.get('totals', {})),
+        "games": {game_type: _rates(totals) for game_type, totals in sorted(doc.get('games', {}).items())},
+        "first_played_at": doc.get('first_played_at'),
+        "last_played_at": doc.get('last_played_at')
+    }
+
+def vip_summary(vip_status, doc):
+    """Current tier and progress towards the next one."""
+    wagered = (doc or {}).get('totals', {}).get('wagered', 0)
+    summary = {"vip_status": vip_status, "wagered": wagered, "next_tier": None, "wagered_to_next_tier": None}
+    tiers = [name for name, _ in VIP_TIERS]
+    rank = tiers.index(vip_status) if vip_status in tiers else -1
+    for name, threshold in VIP_TIERS[rank + 1:]:
+        if threshold > wagered:
+            summary["next_tier"] = name
+            summary["wagered_to_next_tier"] = threshold - wagered
+            break
+    return summary
+
+def parse_dashboard_hours(value):
+    """Clamp a requested dashboard window to [1, MAX_DASHBOARD_HOURS] hours."""
+    try:
+        hours = int(value) if value is not None else 24
+    except ValueError:
+        hours = 24
+    return max(1, min(hours, MAX_DASHBOARD_HOURS))
+
+def dashboard_window(hours, now):
+    """
+    Returns:
+        tuple: (filter for game_stats_hourly, first hour in the window)
+    """
+    since = hour_of(now) - timedelta(hours=hours - 1)
+    return {"hour": {"$gte": since}}, since
+
+def dashboard_summary(game_docs, hourly_docs, hours, since):
+    """Operator view: all-time per-game totals plus the per-hour series of the window."""
+    games = {doc['_id']: _rates(doc) for doc in game_docs}
+    overall = defaultdict(int)
+    for totals in games.values():
+        _add(overall, totals)
+
+    series = defaultdict(list)
+    for doc in hourly_docs:
+        series[doc['game_type']].append(dict(_rates(doc), hour=doc['hour']))
+
+    return {
+        "overall": _rates(overall),
+        "games": dict(sorted(games.items())),
+        "window": {"hours": hours, "since": since},
+        "hourly": dict(sorted(series.items()))
+    }
+
+def rebuild_stats(db, batch_size=5000):
+    """
+    Recompute every counter from game_results and bets.
+
+    Meant for the first deployment and for repairs; stop the API first, or
+    rounds settled while it runs may be counted twice.
+
+    Returns:
+        dict: Number of game rounds and bets replayed
+    """
+    for collection in ('player_stats', 'game_stats', 'game_stats_hourly'):
+        db[collection].delete_many({})
+
+    replayed = {"rounds": 0, "bets": 0}
+    batch = []
+
+    def flush():
+        apply_stats(batch, db)
+        batch.clear()
+
+    fields = {"user_id": True, "game_type": True, "bet_amount": True, "result.payout": True, "timestamp": True}
+    for record in db.game_results.find({}, fields).batch_size(batch_size):
+        payout = record['result']['payout']
+        batch.append(stats_event(record['user_id'], record['game_type'], record['timestamp'], rounds=1,
+                                 wagered=record['bet_amount'], paid_out=payout, wins=int(payout > 0)))
+        replayed["rounds"] += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    fields = {"user_id": True, "game_id": True, "amount": True, "created_at": True}
+    for bet in db.bets.find({}, fields).batch_size(batch_size):
+        batch.append(bet_event(bet['user_id'], bet.get('game_id'), bet['amount'], bet['created_at']))
+        replayed["bets"] += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return replayed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the materialized player and game statistics")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute all counters from game_results and bets")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if not args.rebuild:
+        parser.print_usage()
+        return 2
+    print(json.dumps(rebuild_stats(get_db(), args.batch_size), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
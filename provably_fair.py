@@ -2,7 +2,13 @@
 import hashlib
 import hmac
 import secrets
-import random
+
+# Derivation every new round is played with, recorded as rng_version on the
+# round. Version 1 is the HMAC chain rounds were settled with before
+# RandomStream; it is kept so those rounds still verify, and rounds stored
+# without an rng_version are version 1.
+RNG_VERSION = 2
+LEGACY_RNG_VERSION = 1
 
 def generate_server_seed(length=32):
     """Generate a random server seed."""
@@ -12,7 +18,90 @@ def hash_server_seed(server_seed):
     """Hash the server seed to share with client while keeping the original secret."""
     return hashlib.sha256(server_seed.encode()).hexdigest()
 
-def generate_random_number(client_seed, server_seed, num_results=1, min_val=0, max_val=1000000):
+def keyed_hmac(server_seed):
+    """
+    HMAC-SHA256 keyed with a server seed, to be copied per message.
+
+    Callers playing several rounds with one seed key it once and pass it to
+    each RandomStream; it is never cached beyond that, so revealed-later
+    seeds do not outlive the request in worker memory.
+    """
+    return hmac.new(server_seed.encode(), digestmod=hashlib.sha256)
+
+class RandomStream:
+    """
+    Deterministic stream of provably fair random bytes for one round.
+    
+    Block i of the stream is HMAC-SHA256(server_seed, "client_seed:nonce:i")
+    (or "client_seed:i" without a nonce). Values are drawn from as few bytes
+    as their range needs and out-of-range draws are rejected rather than
+    reduced with a modulo, so every value is unbiased and one digest usually
+    yields several values.
+    """
+    
+    def __init__(self, client_seed, server_seed, nonce=None, seed_hmac=None):
+        if not client_seed or not server_seed:
+            raise ValueError("Both client_seed and server_seed must be provided")
+        
+        self._keyed_hmac = seed_hmac or keyed_hmac(server_seed)
+        if nonce is None:
+            self._prefix = f"{client_seed}:".encode()
+        else:
+            self._prefix = f"{client_seed}:{nonce}:".encode()
+        self._block = 0
+        self._buffer = b''
+        self._offset = 0
+    
+    def _next_block(self):
+        h = self._keyed_hmac.copy()
+        h.update(self._prefix + str(self._block).encode())
+        self._block += 1
+        return h.digest()
+    
+    def read(self, num_bytes):
+        """Return the next num_bytes bytes of the stream."""
+        chunks = []
+        while num_bytes > 0:
+            if self._offset == len(self._buffer):
+                self._buffer = self._next_block()
+                self._offset = 0
+            take = min(num_bytes, len(self._buffer) - self._offset)
+            chunks.append(self._buffer[self._offset:self._offset + take])
+            self._offset += take
+            num_bytes -= take
+        return b''.join(chunks)
+    
+    def randbelow(self, n):
+        """Return an unbiased integer in [0, n)."""
+        if n <= 0:
+            raise ValueError("n must be positive")
+        if n == 1:
+            return 0
+        
+        bits = (n - 1).bit_length()
+        num_bytes = (bits + 7) // 8
+        mask = (1 << bits) - 1
+        while True:
+            value = int.from_bytes(self.read(num_bytes), byteorder='big') & mask
+            if value < n:
+                return value
+    
+    def randrange(self, min_val, max_val):
+        """Return an unbiased integer in [min_val, max_val)."""
+        return min_val + self.randbelow(max_val - min_val)
+    
+    def shuffle(self, items):
+        """Shuffle a list in place with Fisher-Yates and return it."""
+        for i in range(len(items) - 1, 0, -1):
+            j = self.randbelow(i + 1)
+            items[i], items[j] = items[j], items[i]
+        return items
+
+CARD_RANKS = '23456789TJQKA'
+CARD_SUITS = 'SHDC'
+DECK = tuple(rank + suit for suit in CARD_SUITS for rank in CARD_RANKS)
+
+def generate_random_number(client_seed, server_seed, num_results=1, min_val=0, max_val=1000000, nonce=None):
     """
     Generate provably fair random numbers using client and server seeds.
     
@@ -22,34 +111,85 @@ def generate_random_number(client_seed, server_seed, num_results=1, min_val=0, m
         num_results: Number of random numbers to generate
         min_val: Minimum value (inclusive)
         max_val: Maximum value (exclusive)
+        nonce: Optional round counter mixed into the message so one seed pair
+            can serve several rounds
         
     Returns:
         List of random numbers
     """
+    stream = RandomStream(client_seed, server_seed, nonce)
+    return [stream.randrange(min_val, max_val) for _ in range(num_results)]
+
+def legacy_random_numbers(client_seed, server_seed, num_results=1, min_val=0, max_val=1000000, nonce=None):
+    """
+    Version 1 derivation, for verifying rounds settled before RandomStream.
+    
+    The first value is HMAC-SHA256(server_seed, "client_seed:nonce") (or the
+    bare client seed without a nonce), each further value the HMAC of the
+    previous digest, reduced into [min_val, max_val) with a modulo.
+    """
     if not client_seed or not server_seed:
         raise ValueError("Both client_seed and server_seed must be provided")
     
-    # Create a message using client seed and initial nonce
-    message = f"{client_seed}".encode()
+    seed_hmac = keyed_hmac(server_seed)
+    message = f"{client_seed}".encode() if nonce is None else f"{client_seed}:{nonce}".encode()
+    results = []
+    for _ in range(num_results):
+        h = seed_hmac.copy()
+        h.update(message)
+        message = h.digest()
+        results.append(min_val + int.from_bytes(message, byteorder='big') % (max_val - min_val))
+    return results
+
+def generate_random_batch(client_seed, server_seed, nonces, num_results=1, min_val=0, max_val=1000000):
+    """
+    Generate random numbers for several rounds sharing one seed pair.
     
-    # Use HMAC with SHA-256 for generating random bytes
-    h = hmac.new(server_seed.encode(), message, hashlib.sha256).digest()
+    Each entry equals generate_random_number(..., nonce=nonce) for its nonce.
     
-    results = []
-    for i in range(num_results):
-        if i > 0:
-            # If we need more than one number, update the message with previous hash
-            message = h
-            h = hmac.new(server_seed.encode(), message, hashlib.sha256).digest()
-            
-        # Convert hash bytes to integer and scale to desired range
-        value = int.from_bytes(h, byteorder='big')
-        scaled_value = min_val + (value % (max_val - min_val))
-        results.append(scaled_value)
+    Args:
+        client_seed: Seed provided by the client
+        server_seed: Private seed generated by the server
+        nonces: Iterable of round nonces
+        num_results: Number of random numbers to generate per round
+        min_val: Minimum value (inclusive)
+        max_val: Maximum value (exclusive)
+        
+    Returns:
+        List with one list of random numbers per nonce
+    """
+    if not client_seed or not server_seed:
+        raise ValueError("Both client_seed and server_seed must be provided")
     
-    return results
+    seed_hmac = keyed_hmac(server_seed)
+    batch = []
+    for nonce in nonces:
+        stream = RandomStream(client_seed, server_seed, nonce, seed_hmac)
+        batch.append([stream.randrange(min_val, max_val) for _ in range(num_results)])
+    return batch
 
-def verify_fairness(game_type, client_seed, server_seed_hash, server_seed, nonce, game_result):
+def shuffle_deck(client_seed, server_seed, nonce=None):
+    """
+    Shuffle a standard 52-card deck for one round.
+    
+    Cards are rank + suit codes such as 'AS' or 'TD'. A full shuffle reads
+    about 66 bytes of the stream, i.e. three HMAC calls.
+    
+    Args:
+        client_seed: Seed provided by the client
+        server_seed: Private seed generated by the server
+        nonce: Optional round counter
+        
+    Returns:
+        List of 52 card codes in dealing order
+    """
+    return RandomStream(client_seed, server_seed, nonce).shuffle(list(DECK))
+
+def verify_shuffle(client_seed, server_seed, nonce, deck):
+    """Check that deck is the shuffle produced by the given seeds and nonce."""
+    return list(deck or []) == shuffle_deck(client_seed, server_seed, nonce)
+
+def verify_fairness(game_type, client_seed, server_seed_hash, server_seed, nonce, game_result, rng_version=None):
     """
     Verify that a game result is fair by checking if it matches what would be
     produced using the provided seeds.
@@ -61,6 +201,8 @@ def verify_fairness(game_type, client_seed, server_seed_hash, server_seed, nonce
         server_seed: The revealed server seed after the game
         nonce: The nonce used in the game
         game_result: The result to verify
+        rng_version: Derivation the round was played with; rounds stored
+            without one are version 1
         
     Returns:
         bool: True if the result is verified, False otherwise
@@ -70,14 +212,60 @@ def verify_fairness(game_type, client_seed, server_seed_hash, server_seed, nonce
     if calculated_hash != server_seed_hash:
         return False
     
+    return _replay_matches(game_type, client_seed, server_seed, nonce, game_result, rng_version)
+
+def _replay_matches(game_type, client_seed, server_seed, nonce, game_result, rng_version, slot_machine=None):
+    """Replay a round from its revealed seeds and compare it with the stored result."""
+    rng_version = rng_version or LEGACY_RNG_VERSION
+    if rng_version not in (LEGACY_RNG_VERSION, RNG_VERSION):
+        return False
+    
     # This verification would differ based on game type
     # Here's a simple verification for slots as an example
     if game_type == 'slots':
-        from games.slots import SlotMachine
-        slot_machine = SlotMachine()
-        expected_result = slot_machine.play(0, client_seed, server_seed)  # Bet amount doesn't affect the reels
-        return expected_result['reels'] == game_result['reels']
+        if slot_machine is None:
+            from games.game_registry import get_engine
+            slot_machine = get_engine('slots')
+        return slot_machine.reels(client_seed, server_seed, nonce, rng_version) == game_result.get('reels')
+    
+    # Card games record the shuffled deck they dealt from; they were only
+    # ever dealt from RandomStream
+    if game_type in ('blackjack', 'poker'):
+        return rng_version == RNG_VERSION and verify_shuffle(client_seed, server_seed, nonce, game_result.get('deck'))
     
     # Implementation for other game types would go here
     
     return False
+
+def verify_fairness_batch(games):
+    """
+    Verify many games in one call.
+    
+    Each distinct server seed is hashed once and the shared slots engine
+    replays every slots round. A malformed entry is reported as unverified instead of
+    failing the whole batch.
+    
+    Args:
+        games: Iterable of (game_type, client_seed, server_seed_hash,
+            server_seed, nonce, game_result, rng_version) tuples
+        
+    Returns:
+        list: One bool per game, in input order
+    """
+    from games.game_registry import get_engine
+    slot_machine = get_engine('slots')
+    seed_hashes = {}
+    
+    verdicts = []
+    for game_type, client_seed, server_seed_hash, server_seed, nonce, game_result, rng_version in games:
+        try:
+            if server_seed not in seed_hashes:
+                seed_hashes[server_seed] = hash_server_seed(server_seed)
+            verdicts.append(
+                seed_hashes[server_seed] == server_seed_hash
+                and _replay_matches(game_type, client_seed, server_seed, nonce, game_result, rng_version,
+                                    slot_machine)
+            )
+        except (AttributeError, KeyError, TypeError, ValueError):
+            verdicts.append(False)
+    return verdicts
@@ -0,0 +1,333 @@
+# casino_app/utils/rate_limit.py
+"""
+Per-user and global admission control for the hot game endpoints.
+
+Every admitted request takes tokens from two token buckets, one for the
+player and one shared by everybody, and holds one of the player's
+concurrency slots until it returns. A request costs one token, or as many
+as the rounds it plays for endpoints that declare a cost; a bucket only
+needs to hold min(cost, burst) tokens to admit it and may go into debt for
+the rest, so a large batch is charged in full without being refused
+outright. A request that finds a bucket empty or
+every slot taken is answered 429 straight away, before any of the
+endpoint's own work, with Retry-After saying when a token will be back.
+The player's tier comes from the user cache; endpoints open to callers
+without an account charge each client address at the lowest tier.
+
+The state lives in a small SQLite database on /dev/shm, so every gunicorn
+worker draws from the same buckets without an external service. One
+admission is a single short IMMEDIATE transaction on a memory-backed file.
+Each worker process opens one connection, and its threads or greenlets take
+turns on it. Concurrency slots are leases that
+expire after RATE_LIMIT_LEASE_SECONDS, so a worker killed mid-request
+cannot hold a slot forever.
+
+Player limits follow users.vip_status, with one tier per entry of
+utils.player_stats.VIP_TIERS, and are set per tier with
+RATE_LIMIT_<TIER>_RATE (tokens per second), RATE_LIMIT_<TIER>_BURST and
+RATE_LIMIT_<TIER>_CONCURRENCY. If the store cannot be used, or another
+worker holds it past RATE_LIMIT_BUSY_TIMEOUT, requests are turned away with
+reason 'unavailable': contention is exactly when admitting unchecked
+traffic does the most harm.
+"""
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from db.database import get_async_db, get_db
+from utils.metrics import record_rate_limited
+from utils.player_stats import VIP_TIERS
+from utils.user_cache import load_profile, load_profile_async
+
+logger = logging.getLogger(__name__)
+
+TierLimit = namedtuple('TierLimit', ['rate', 'burst', 'concurrency'])
+
+def _tier_limit(tier, rate, burst, concurrency):
+    prefix = f'RATE_LIMIT_{tier.upper()}'
+    return TierLimit(
+        rate=float(os.getenv(f'{prefix}_RATE', str(rate))),
+        burst=float(os.getenv(f'{prefix}_BURST', str(burst))),
+        concurrency=int(os.getenv(f'{prefix}_CONCURRENCY', str(concurrency)))
+    )
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_PATH = os.getenv('RATE_LIMIT_PATH', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'casino-rate-limit.sqlite3'
+))
+
+# Default (rate, burst, concurrency) by tier rank, lowest first; tiers above
+# the last one get its limits
+DEFAULT_TIER_LIMITS = ((10, 20, 2), (15, 30, 2), (20, 40, 3), (30, 60, 4), (50, 100, 6))
+
+TIER_LIMITS = {
+    tier: _tier_limit(tier, *DEFAULT_TIER_LIMITS[min(rank, len(DEFAULT_TIER_LIMITS) - 1)])
+    for rank, (tier, _) in enumerate(VIP_TIERS)
+}
+LOWEST_TIER = VIP_TIERS[0][0]
+
+# Shared by all players, per endpoint scope
+GLOBAL_LIMIT = TierLimit(
+    rate=float(os.getenv('RATE_LIMIT_GLOBAL_RATE', '2000')),
+    burst=float(os.getenv('RATE_LIMIT_GLOBAL_BURST', '4000')),
+    concurrency=None
+)
+
+# Longer than any request may run (gunicorn's timeout)
+LEASE_SECONDS = float(os.getenv('RATE_LIMIT_LEASE_SECONDS', '30'))
+# What a player over their concurrency cap, or turned away while the store
+# is unavailable, is told to wait
+CONCURRENCY_RETRY_AFTER = 1
+UNAVAILABLE_RETRY_AFTER = 1
+# How long a writer waits for other workers' admissions to commit
+BUSY_TIMEOUT_SECONDS = float(os.getenv('RATE_LIMIT_BUSY_TIMEOUT', '0.5'))
+PRUNE_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    full_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS leases (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_key ON leases (key, expires_at);
+"""
+
+class Admission:
+    """
+    Outcome of an admission check.
+
+    Attributes:
+        admitted: Whether the request may proceed
+        reason: 'rate', 'global_rate', 'concurrency' or 'unavailable' when
+            it may not
+        retry_after: Seconds until a retry can succeed
+        lease_id: Concurrency slot to release once the request is done
+    """
+    __slots__ = ('admitted', 'reason', 'retry_after', 'lease_id')
+
+    def __init__(self, admitted, reason=None, retry_after=0.0, lease_id=None):
+        self.admitted = admitted
+        self.reason = reason
+        self.retry_after = retry_after
+        self.lease_id = lease_id
+
+def _refill(row, limit, now):
+    """Tokens in a bucket at now (negative while in debt); a bucket never seen (or pruned) is full."""
+    if row is None:
+        return limit.burst
+    tokens, updated_at = row
+    return min(limit.burst, tokens + max(0.0, now - updated_at) * limit.rate)
+
+def _shortfall(tokens, cost, limit):
+    """Tokens missing before a request of this cost can be admitted."""
+    return min(cost, limit.burst) - tokens
+
+class AdmissionControl:
+    """Token buckets and concurrency leases in a SQLite file shared by every worker."""
+
+    def __init__(self, path):
+        self.path = path
+        # Guards the connection and the counters
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._next_prune = 0.0
+        self._admitted = 0
+        self._rejected = 0
+        self._errors = 0
+
+    def _connection(self):
+        # One connection per process, opened (and the schema checked) once and
+        # never carried across a fork; callers hold self._lock
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def _take(self, conn, scope, user_id, limit, now, cost):
+        user_key = f'{scope}:user:{user_id}'
+        global_key = f'{scope}:global'
+        rows = {key: (tokens, updated_at) for key, tokens, updated_at in conn.execute(
+            'SELECT key, tokens, updated_at FROM buckets WHERE key IN (?, ?)', (user_key, global_key)
+        )}
+        user_tokens = _refill(rows.get(user_key), limit, now)
+        global_tokens = _refill(rows.get(global_key), GLOBAL_LIMIT, now)
+
+        shortfall = _shortfall(user_tokens, cost, limit)
+        if shortfall > 0:
+            return Admission(False, 'rate', shortfall / limit.rate)
+        shortfall = _shortfall(global_tokens, cost, GLOBAL_LIMIT)
+        if shortfall > 0:
+            return Admission(False, 'global_rate', shortfall / GLOBAL_LIMIT.rate)
+
+        conn.execute('DELETE FROM leases WHERE key = ? AND expires_at < ?', (user_key, now))
+        active = conn.execute('SELECT COUNT(*) FROM leases WHERE key = ?', (user_key,)).fetchone()[0]
+        if active >= limit.concurrency:
+            return Admission(False, 'concurrency', CONCURRENCY_RETRY_AFTER)
+
+        conn.executemany(
+            'INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)', [
+                (user_key, user_tokens - cost, now, now + (limit.burst - user_tokens + cost) / limit.rate),
+                (global_key, global_tokens - cost, now,
+                 now + (GLOBAL_LIMIT.burst - global_tokens + cost) / GLOBAL_LIMIT.rate)
+            ]
+        )
+        lease_id = conn.execute('INSERT INTO leases (key, expires_at) VALUES (?, ?)',
+                                (user_key, now + LEASE_SECONDS)).lastrowid
+        return Admission(True, lease_id=lease_id)
+
+    def _prune(self, conn, now):
+        # Full buckets carry no state, and expired leases hold no slot
+        conn.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+        conn.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+
+    def admit(self, scope, user_id, tier, cost=1):
+        """
+        Take cost tokens and a concurrency slot for one request.
+
+        Returns:
+            Admission; release its lease_id once the request is done
+        """
+        limit = TIER_LIMITS.get(tier, TIER_LIMITS[LOWEST_TIER])
+        with self._lock:
+            now = time.time()
+            try:
+                conn = self._connection()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    admission = self._take(conn, scope, user_id, limit, now, cost)
+                    if now >= self._next_prune:
+                        self._next_prune = now + PRUNE_INTERVAL
+                        self._prune(conn, now)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error:
+                logger.warning("Rate limiter unavailable, turning request away", exc_info=True)
+                self._errors += 1
+                return Admission(False, 'unavailable', UNAVAILABLE_RETRY_AFTER)
+
+            if admission.admitted:
+                self._admitted += 1
+            else:
+                self._rejected += 1
+            return admission
+
+    def release(self, lease_id):
+        if lease_id is None:
+            return
+        try:
+            with self._lock:
+                self._connection().execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+        except sqlite3.Error:
+            # The lease expires on its own
+            logger.warning("Could not release rate limit lease %s", lease_id, exc_info=True)
+
+    def stats(self):
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "path": self.path,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "errors": self._errors
+        }
+
+admission_control = AdmissionControl(RATE_LIMIT_PATH)
+
+def _player_tier(profile):
+    return profile.user.get('vip_status', LOWEST_TIER) if profile else LOWEST_TIER
+
+def _address_key(address):
+    # Kept apart from player ids, which are ObjectId strings
+    return f"addr:{address}"
+
+def _rejection(scope, admission):
+    record_rate_limited(scope, admission.reason)
+    retry_after = max(1, math.ceil(admission.retry_after))
+    return {"error": "Too many requests", "reason": admission.reason, "retry_after": retry_after}, \
+        {"Retry-After": str(retry_after)}
+
+def rate_limited(scope, cost=None, anonymous=False):
+    """
+    Admission control for a Flask view; goes below jwt_required so the
+    player is known.
+
+    Args:
+        scope: Endpoint scope the buckets are kept for
+        cost: Optional function of the JSON request body (None if it has
+            none) returning the tokens the request takes; one otherwise
+        anonymous: Charge the client address at the lowest tier instead of
+            the player, for views that do not require a JWT
+    """
+    from flask import jsonify, request
+    from flask_jwt_extended import get_jwt_identity
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return fn(*args, **kwargs)
+            if anonymous:
+                user_id, tier = _address_key(request.remote_addr), LOWEST_TIER
+            else:
+                user_id = get_jwt_identity()
+                tier = _player_tier(load_profile(get_db(), user_id))
+            tokens = cost(request.get_json(silent=True)) if cost else 1
+            admission = admission_control.admit(scope, user_id, tier, tokens)
+            if not admission.admitted:
+                body, headers = _rejection(scope, admission)
+                return jsonify(body), 429, headers
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                admission_control.release(admission.lease_id)
+        return wrapper
+    return decorator
+
+def rate_limited_async(scope, cost=None, anonymous=False):
+    """Async counterpart of rate_limited for the Quart blueprints."""
+    from quart import jsonify, request
+    from auth.async_user_management import get_jwt_identity
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return await fn(*args, **kwargs)
+            if anonymous:
+                user_id, tier = _address_key(request.remote_addr), LOWEST_TIER
+            else:
+                user_id = get_jwt_identity()
+                tier = _player_tier(await load_profile_async(get_async_db(), user_id))
+            tokens = cost(await request.get_json(silent=True)) if cost else 1
+            # A busy store can make SQLite wait; keep that off the event loop
+            admission = await asyncio.to_thread(admission_control.admit, scope, user_id, tier, tokens)
+            if not admission.admitted:
+                body, headers = _rejection(scope, admission)
+                return jsonify(body), 429, headers
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                await asyncio.to_thread(admission_control.release, admission.lease_id)
+        return wrapper
+    return decorator
@@ -0,0 +1,262 @@
+# casino_app/utils/reconciliation.py
+"""
+Ledger snapshots and balance reconciliation.
+
+A snapshot folds a player's ledger entries posted before a cutoff into one
+document,
+
+    ledger_snapshots  _id = user id; balance and entry count through the cutoff
+
+so their balance can be rebuilt from the snapshot plus the short tail of
+entries posted since, instead of from their whole history. The cutoff is
+on posted_at, which the writer stamps as it inserts an entry, not on
+created_at: an entry held up in the write-behind queue by an outage is
+posted when it lands, after any snapshot already taken. SNAPSHOT_LAG only
+has to cover clock skew between writers and inserts still in flight.
+
+The reconciliation job walks every user in _id order, a chunk at a time:
+one read for the chunk's snapshots, one for their tails, and users.balance
+is compared with snapshot + tail. Memory stays bounded by the chunk size
+whatever the number of users or entries. While it has the tails in hand it
+rolls forward the snapshots of players with a long one.
+
+A balance can be read while the entries for its latest change are still
+queued, so a mismatch is only a suspect at first: suspects are checked
+again after a grace period and reported if their balance has not changed
+since and still disagrees with the ledger.
+
+Usage:
+    python -m utils.reconciliation                  # reconcile and roll snapshots forward
+    python -m utils.reconciliation --no-snapshots   # only reconcile
+    python -m utils.reconciliation --user <user id> # rebuild one balance
+    python -m utils.reconciliation --open-balances  # one-off: snapshot balances that predate the ledger
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import timedelta
+from pymongo import UpdateOne
+from utils.ledger import player_delta
+from utils.user_cache import user_key
+
+CHUNK_SIZE = int(os.getenv('RECONCILE_CHUNK_SIZE', '500'))
+# Entries posted less recently than this are left in the tail
+SNAPSHOT_LAG = float(os.getenv('LEDGER_SNAPSHOT_LAG', '300'))
+# Tail length at which a player's snapshot is rolled forward
+SNAPSHOT_MIN_ENTRIES = int(os.getenv('LEDGER_SNAPSHOT_MIN_ENTRIES', '100'))
+# How long a suspect is given for its queued entries to land
+RECHECK_GRACE = float(os.getenv('RECONCILE_RECHECK_GRACE', '10'))
+# Suspects held for the recheck, and mismatches listed in the report
+MAX_SUSPECTS = int(os.getenv('RECONCILE_MAX_SUSPECTS', '10000'))
+
+# Balances are sums of floats
+BALANCE_TOLERANCE = 1e-6
+
+class LedgerBalance:
+    """A player's balance according to the ledger, split at a snapshot cutoff."""
+    __slots__ = ('snapshot', 'balance', 'entries', 'before_cutoff', 'entries_before_cutoff')
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.balance = snapshot['balance'] if snapshot else 0
+        self.entries = 0
+        # Tail entries a new snapshot at the cutoff would fold in
+        self.before_cutoff = 0
+        self.entries_before_cutoff = 0
+
+def ledger_balances(db, user_ids, cutoff=None):
+    """
+    Rebuild balances from snapshots and ledger tails.
+
+    Args:
+        db: Database handle
+        user_ids: Players to rebuild, as JWT identities
+        cutoff: If given, also total the tail entries before it
+
+    Returns:
+        dict: {user id: LedgerBalance}
+    """
+    snapshots = {snapshot['_id']: snapshot for snapshot in db.ledger_snapshots.find({"_id": {"$in": user_ids}})}
+    balances = {user_id: LedgerBalance(snapshots.get(user_id)) for user_id in user_ids}
+
+    # Players without a snapshot need their whole history; the others only
+    # what was posted after their own snapshot
+    without = [user_id for user_id in user_ids if user_id not in snapshots]
+    tails = [{"user_id": user_id, "posted_at": {"$gte": snapshot['through']}} for user_id, snapshot in snapshots.items()]
+    if without:
+        tails.append({"user_id": {"$in": without}})
+
+    projection = {"_id": False, "user_id": True, "debit": True, "credit": True, "amount": True, "posted_at": True}
+    for entry in db.ledger.find({"$or": tails}, projection):
+        balance = balances[entry['user_id']]
+        delta = player_delta(entry)
+        balance.balance += delta
+        balance.entries += 1
+        if cutoff is not None and entry['posted_at'] < cutoff:
+            balance.before_cutoff += delta
+            balance.entries_before_cutoff += 1
+    return balances
+
+def ledger_balance(db, user_id):
+    """A single player's balance rebuilt from their snapshot and ledger tail."""
+    return ledger_balances(db, [user_id])[user_id].balance
+
+def _snapshot_updates(balances, cutoff, taken_at):
+    updates = []
+    for user_id, balance in balances.items():
+        if balance.entries_before_cutoff < SNAPSHOT_MIN_ENTRIES:
+            continue
+        snapshot = balance.snapshot or {"balance": 0, "entries": 0}
+        updates.append(UpdateOne({"_id": user_id}, {"$set": {
+            "balance": snapshot['balance'] + balance.before_cutoff,
+            "entries": snapshot['entries'] + balance.entries_before_cutoff,
+            "through": cutoff,
+            "taken_at": taken_at
+        }}, upsert=True))
+    return updates
+
+def _agrees(user, balance):
+    return math.isclose(user.get('balance', 0), balance.balance, abs_tol=BALANCE_TOLERANCE)
+
+def _chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _recheck(db, suspects, report):
+    """Report suspects whose balance stood still through the grace period and still disagrees."""
+    for chunk in _chunks(suspects, CHUNK_SIZE):
+        versions = dict(chunk)
+        # Ledger first: if the version is still the one seen in the first
+        # pass, no change can have been posted after this read
+        balances = ledger_balances(db, list(versions))
+        users = db.users.find({"_id": {"$in": [user_key(user_id) for user_id in versions]}},
+                              {"balance": True, "version": True})
+        users = {str(user['_id']): user for user in users}
+        for user_id, version in chunk:
+            user = users.get(user_id)
+            if user is None or user.get('version', 0) != version:
+                # Changed again since; the next run looks at it afresh
+                report["unsettled"] += 1
+            elif _agrees(user, balances[user_id]):
+                report["matched"] += 1
+            else:
+                report["mismatched"] += 1
+                if len(report["mismatches"]) < MAX_SUSPECTS:
+                    report["mismatches"].append({
+                        "user_id": user_id,
+                        "balance": user.get('balance', 0),
+                        "ledger_balance": balances[user_id].balance,
+                        "difference": user.get('balance', 0) - balances[user_id].balance
+                    })
+
+def reconcile(db, chunk_size=CHUNK_SIZE, snapshots=True, grace=RECHECK_GRACE):
+    """
+    Check every users.balance against the ledger.
+
+    Returns:
+        dict: Counts of users checked, matched, mismatched and unsettled
+        (still changing at the recheck), snapshots written, ledger entries
+        read, and the mismatches themselves
+    """
+    now = db.server_timestamp()
+    cutoff = now - timedelta(seconds=SNAPSHOT_LAG)
+    report = defaultdict(int)
+    report["mismatches"] = []
+    suspects = []
+
+    users = db.users.find({}, {"balance": True, "version": True}).sort("_id", 1)
+    for chunk in _chunks(users, chunk_size):
+        user_ids = [str(user['_id']) for user in chunk]
+        balances = ledger_balances(db, user_ids, cutoff if snapshots else None)
+        report["users"] += len(chunk)
+        report["entries_read"] += sum(balance.entries for balance in balances.values())
+
+        for user_id, user in zip(user_ids, chunk):
+            if _agrees(user, balances[user_id]):
+                report["matched"] += 1
+            elif len(suspects) < MAX_SUSPECTS:
+                suspects.append((user_id, user.get('version', 0)))
+            else:
+                report["unchecked"] += 1
+
+        if snapshots:
+            updates = _snapshot_updates(balances, cutoff, now)
+            if updates:
+                db.ledger_snapshots.bulk_write(updates, ordered=False)
+                report["snapshots"] += len(updates)
+
+    if suspects:
+        time.sleep(grace)
+        _recheck(db, suspects, report)
+    return dict(report)
+
+def open_balances(db):
+    """
+    Snapshot the current balance of every user who has no ledger history.
+
+    Balances that predate the ledger have no entries to rebuild them from;
+    run this once, while those users are idle, when the ledger is introduced.
+
+    Returns:
+        int: Number of snapshots written
+    """
+    now = db.server_timestamp()
+    written = 0
+    for chunk in _chunks(db.users.find({}, {"balance": True}).sort("_id", 1), CHUNK_SIZE):
+        user_ids = [str(user['_id']) for user in chunk]
+        with_history = {snapshot['_id'] for snapshot in db.ledger_snapshots.find({"_id": {"$in": user_ids}}, {"_id": True})}
+        with_history.update(entry['user_id'] for entry in
+                            db.ledger.find({"user_id": {"$in": user_ids}}, {"_id": False, "user_id": True}))
+        updates = [
+            UpdateOne({"_id": user_id}, {"$setOnInsert": {
+                "balance": user.get('balance', 0),
+                "entries": 0,
+                "through": now,
+                "taken_at": now,
+                "opening": True
+            }}, upsert=True)
+            for user_id, user in zip(user_ids, chunk)
+            if user_id not in with_history and user.get('balance', 0)
+        ]
+        if updates:
+            db.ledger_snapshots.bulk_write(updates, ordered=False)
+            written += len(updates)
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile user balances against the ledger")
+    parser.add_argument('--no-snapshots', action='store_true', help="Do not roll snapshots forward")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Users checked per round of reads")
+    parser.add_argument('--grace', type=float, default=RECHECK_GRACE,
+                        help="Seconds to wait before rechecking a mismatch")
+    parser.add_argument('--user', help="Only rebuild this user's balance from the ledger")
+    parser.add_argument('--open-balances', action='store_true',
+                        help="Snapshot balances of users with no ledger history")
+    args = parser.parse_args(argv)
+
+    from db.database import get_db
+    db = get_db()
+
+    if args.user:
+        print(json.dumps({"user_id": args.user, "ledger_balance": ledger_balance(db, args.user)}, indent=2))
+        return 0
+    if args.open_balances:
+        print(json.dumps({"snapshots": open_balances(db)}, indent=2))
+        return 0
+
+    report = reconcile(db, args.chunk_size, snapshots=not args.no_snapshots, grace=args.grace)
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("mismatched") else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# casino_app/games/seed_sessions.py
+import weakref
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.provably_fair import generate_server_seed, hash_server_seed
+
+# A seed session commits one server seed per user up front and serves every
+# round from it with an incrementing nonce. The seed stays secret until the
+# player rotates the session, which reveals it so all past rounds can be
+# verified.
+#
+# The _async twins issue the same operations through the async storage API.
+
+# At most one active session per user: get_active_session relies on it when
+# two requests open a session at once. Also serves the nonce claim.
+SESSION_INDEXES = [
+    IndexModel(
+        [("user_id", ASCENDING)],
+        name="active_session_unique",
+        unique=True,
+        partialFilterExpression={"active": True}
+    ),
+]
+
+# Storage handles SESSION_INDEXES are known to exist on
+_indexed = weakref.WeakSet()
+
+def ensure_session_indexes(db):
+    """Create SESSION_INDEXES once per storage handle, whether or not db.indexes ran."""
+    if db not in _indexed:
+        db.seed_sessions.create_indexes(SESSION_INDEXES)
+        _indexed.add(db)
+
+async def ensure_session_indexes_async(db):
+    if db not in _indexed:
+        await db.seed_sessions.create_indexes(SESSION_INDEXES)
+        _indexed.add(db)
+
+def get_active_session(db, user_id):
+    """Return the user's active seed session, creating one if needed."""
+    session = db.seed_sessions.find_one({"user_id": user_id, "active": True})
+    if session:
+        return session
+
+    server_seed = generate_server_seed()
+    session = {
+        "user_id": user_id,
+        "server_seed": server_seed,
+        "server_seed_hash": hash_server_seed(server_seed),
+        "nonce": 0,
+        "active": True,
+        "created_at": db.server_timestamp()
+    }
+    ensure_session_indexes(db)
+    try:
+        session['_id'] = db.seed_sessions.insert_one(session).inserted_id
+    except DuplicateKeyError:
+        # A concurrent request opened the session first
+        return db.seed_sessions.find_one({"user_id": user_id, "active": True})
+    return session
+
+def claim_nonces(db, user_id, server_seed_hash, count=1):
+    """
+    Reserve the next count nonces of an active seed session.
+
+    Args:
+        db: Database handle
+        user_id: Owner of the session
+        server_seed_hash: Hash the player committed to
+        count: Number of rounds to reserve
+
+    Returns:
+        tuple: (session document, list of reserved nonces), or (None, None)
+        when no active session matches the hash
+    """
+    session = db.seed_sessions.find_one_and_update(
+        {"user_id": user_id, "server_seed_hash": server_seed_hash, "active": True},
+        {"$inc": {"nonce": count}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not session:
+        return None, None
+
+    first = session['nonce']
+    return session, list(range(first, first + count))
+
+def rotate_session(db, user_id):
+    """
+    Close the active seed session and open a new one.
+
+    Returns:
+        tuple: (closed session document or None, new session document)
+    """
+    previous = db.seed_sessions.find_one_and_update(
+        {"user_id": user_id, "active": True},
+        {"$set": {"active": False, "revealed_at": db.server_timestamp()}},
+        return_document=ReturnDocument.AFTER
+    )
+    return previous, get_active_session(db, user_id)
+
+async def get_active_session_async(db, user_id):
+    session = await db.seed_sessions.find_one({"user_id": user_id, "active": True})
+    if session:
+        return session
+
+    server_seed = generate_server_seed()
+    session = {
+        "user_id": user_id,
+        "server_seed": server_seed,
+        "server_seed_hash": hash_server_seed(server_seed),
+        "nonce": 0,
+        "active": True,
+        "created_at": db.server_timestamp()
+    }
+    await ensure_session_indexes_async(db)
+    try:
+        session['_id'] = (await db.seed_sessions.insert_one(session)).inserted_id
+    except DuplicateKeyError:
+        return await db.seed_sessions.find_one({"user_id": user_id, "active": True})
+    return session
+
+async def claim_nonces_async(db, user_id, server_seed_hash, count=1):
+    session = await db.seed_sessions.find_one_and_update(
+        {"user_id": user_id, "server_seed_hash": server_seed_hash, "active": True},
+        {"$inc": {"nonce": count}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not session:
+        return None, None
+
+    first = session['nonce']
+    return session, list(range(first, first + count))
+
+async def rotate_session_async(db, user_id):
+    previous = await db.seed_sessions.find_one_and_update(
+        {"user_id": user_id, "active": True},
+        {"$set": {"active": False, "revealed_at": db.server_timestamp()}},
+        return_document=ReturnDocument.AFTER
+    )
+    return previous, await get_active_session_async(db, user_id)
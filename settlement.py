@@ -0,0 +1,150 @@
+# casino_app/utils/settlement.py
+import asyncio
+from pymongo import ReturnDocument
+from db.database import get_db
+from utils.ledger import bet_entry, ledger_queue, round_entries
+from utils.player_stats import bet_event, settlement_event, stats_queue
+from utils.user_cache import user_cache, user_key
+from utils.write_behind import create_queue, insert_many_idempotent
+
+# Balance changes go through a single conditional $inc so concurrent requests
+# for one user cannot overdraw the account or overwrite each other, and the
+# post-update balance comes back from the database in the same round trip.
+# The same update bumps the user's version, and the new balance is written
+# through to this worker's user cache.
+
+# Each helper has an _async twin issuing the same operations through the
+# async storage API for the ASGI app.
+
+# game_results is an audit trail the player does not wait for, so it is
+# written in batches off the request path; so are the ledger entries for
+# rounds and bets
+game_results_queue = create_queue(
+    'game_results',
+    lambda records: insert_many_idempotent(get_db().game_results, records),
+    'GAME_RESULTS_QUEUE'
+)
+
+def adjust_balance(db, user_id, amount, required=0):
+    """
+    Atomically add amount to a user's balance if it covers required.
+
+    Args:
+        db: Database handle
+        user_id: User to update
+        amount: Signed change to apply
+        required: Minimum balance the user must hold before the change
+
+    Returns:
+        The balance after the update, or None if the user does not exist or
+        holds less than required
+    """
+    user = db.users.find_one_and_update(
+        {"_id": user_key(user_id), "balance": {"$gte": required}},
+        {"$inc": {"balance": amount, "version": 1}},
+        projection={"balance": True, "version": True},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
+        return None
+    user_cache.write_balance(user_id, user['balance'], user['version'])
+    return user['balance']
+
+def positive_amount(value):
+    """A positive number; JSON true and false are not amounts. Check it before debit."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+def debit(db, user_id, amount):
+    """Take amount from the balance only if the user can cover it."""
+    return adjust_balance(db, user_id, -amount, required=amount)
+
+def claim_prepared_seed(db, user_id, server_seed_hash):
+    """Mark an unused prepared seed as used and return it, or None if there is none."""
+    return db.game_seeds.find_one_and_update(
+        {"user_id": user_id, "server_seed_hash": server_seed_hash, "used": False},
+        {"$set": {"used": True}}
+    )
+
+def release_prepared_seed(db, seed_doc):
+    """Hand a claimed seed back when its round could not be settled."""
+    db.game_seeds.update_one(
+        {"_id": seed_doc['_id']},
+        {"$set": {"used": False}}
+    )
+
+def settle_rounds(db, user_id, total_bet, total_payout, records):
+    """
+    Settle played rounds: one conditional $inc for the net outcome, then queue
+    the game_results records, their ledger entries and one stats event for
+    write-behind persistence.
+
+    The balance must cover the whole stake, as if no round paid out.
+
+    Returns:
+        The balance after settlement, or None if the balance was too low
+        (nothing is recorded in that case)
+    """
+    new_balance = adjust_balance(db, user_id, total_payout - total_bet, required=total_bet)
+    if new_balance is None:
+        return None
+
+    game_results_queue.put_many(records)
+    ledger_queue.put_many(_round_entries(user_id, total_bet, total_payout, records))
+    stats_queue.put(settlement_event(user_id, total_bet, total_payout, records))
+    return new_balance
+
+def _round_entries(user_id, total_bet, total_payout, records):
+    return round_entries(user_id, records[0]['game_type'], total_bet, total_payout, len(records),
+                         records[0]['timestamp'])
+
+def record_bet(user_id, bet_id, game_id, amount, timestamp):
+    """Post a placed bet to the ledger and count it in the player and game statistics."""
+    ledger_queue.put(bet_entry(user_id, bet_id, game_id, amount, timestamp))
+    stats_queue.put(bet_event(user_id, game_id, amount, timestamp))
+
+async def adjust_balance_async(db, user_id, amount, required=0):
+    user = await db.users.find_one_and_update(
+        {"_id": user_key(user_id), "balance": {"$gte": required}},
+        {"$inc": {"balance": amount, "version": 1}},
+        projection={"balance": True, "version": True},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
+        return None
+    user_cache.write_balance(user_id, user['balance'], user['version'])
+    return user['balance']
+
+async def debit_async(db, user_id, amount):
+    return await adjust_balance_async(db, user_id, -amount, required=amount)
+
+async def claim_prepared_seed_async(db, user_id, server_seed_hash):
+    return await db.game_seeds.find_one_and_update(
+        {"user_id": user_id, "server_seed_hash": server_seed_hash, "used": False},
+        {"$set": {"used": True}}
+    )
+
+async def release_prepared_seed_async(db, seed_doc):
+    await db.game_seeds.update_one(
+        {"_id": seed_doc['_id']},
+        {"$set": {"used": False}}
+    )
+
+async def settle_rounds_async(db, user_id, total_bet, total_payout, records):
+    new_balance = await adjust_balance_async(db, user_id, total_payout - total_bet, required=total_bet)
+    if new_balance is None:
+        return None
+
+    # Only a full queue can block, and that wait must not stall the loop
+    await _put_async(game_results_queue, records)
+    await _put_async(ledger_queue, _round_entries(user_id, total_bet, total_payout, records))
+    await _put_async(stats_queue, [settlement_event(user_id, total_bet, total_payout, records)])
+    return new_balance
+
+async def record_bet_async(user_id, bet_id, game_id, amount, timestamp):
+    await _put_async(ledger_queue, [bet_entry(user_id, bet_id, game_id, amount, timestamp)])
+    await _put_async(stats_queue, [bet_event(user_id, game_id, amount, timestamp)])
+
+async def _put_async(write_queue, records):
+    overflow = write_queue.put_many_nowait(records)
+    if overflow:
+        await asyncio.to_thread(write_queue.put_many, overflow)
@@ -0,0 +1,314 @@
+# casino_app/simulation/simulator.py
+"""
+Monte Carlo simulator for validating slot machine math.
+
+Runs either raw spins (empirical RTP, hit frequency, variance) or whole
+player sessions with a bankroll and a bet-size strategy (ruin probability,
+drawdown distribution). Reel draws are vectorized with NumPy and the work is
+split into fixed-size chunks, each seeded from one master seed, and fanned
+out over a process pool. Results depend only on the seed and the chunk
+layout, never on the number of worker processes.
+
+Usage:
+    python -m simulation.simulator spins --spins 500000000 --seed 42
+    python -m simulation.simulator sessions --sessions 1000000 --bankroll 500 \\
+        --base-bet 5 --strategy martingale --max-spins 1000 --seed 42
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+from statistics import NormalDist
+
+import numpy as np
+
+from games.slots import SlotMachine, NUM_REELS
+
+# Work units handed to the pool; each one draws its reels in sub-batches
+SPINS_PER_CHUNK = 10_000_000
+SPINS_PER_DRAW = 1_000_000
+SESSIONS_PER_CHUNK = 20_000
+
+STRATEGIES = ('flat', 'martingale', 'paroli', 'proportional')
+
+def _machine_arrays():
+    machine = SlotMachine()
+    return len(machine.symbols), np.asarray(machine.payout_table, dtype=np.float64)
+
+def _draw_multipliers(rng, table, num_symbols, size):
+    """Draw uniform reel stops, as live spins do, and look up their multipliers."""
+    stops = rng.integers(0, num_symbols, size=(size, NUM_REELS))
+    index = (stops[:, 0] * num_symbols + stops[:, 1]) * num_symbols + stops[:, 2]
+    return table[index]
+
+def _run_spin_chunk(args):
+    seed_sequence, num_spins = args
+    num_symbols, table = _machine_arrays()
+    rng = np.random.default_rng(seed_sequence)
+
+    total = 0.0
+    total_sq = 0.0
+    hits = 0
+    remaining = num_spins
+    while remaining:
+        size = min(remaining, SPINS_PER_DRAW)
+        multipliers = _draw_multipliers(rng, table, num_symbols, size)
+        total += float(multipliers.sum())
+        total_sq += float(np.dot(multipliers, multipliers))
+        hits += int(np.count_nonzero(multipliers))
+        remaining -= size
+
+    return num_spins, total, total_sq, hits
+
+def _next_bets(strategy, bets, bankrolls, multipliers, params):
+    """Bet for the next spin given this spin's outcome, before table limits."""
+    base_bet = params['base_bet']
+    if strategy == 'flat':
+        return np.full_like(bets, base_bet)
+    if strategy == 'martingale':
+        # Double after a loss, back to base after anything that paid
+        return np.where(multipliers == 0, bets * 2, base_bet)
+    if strategy == 'paroli':
+        # Double after a net win, up to three wins in a row
+        won = multipliers > 1
+        doubled = bets * 2
+        return np.where(won & (doubled <= base_bet * 8), doubled, base_bet)
+    if strategy == 'proportional':
+        return np.floor(bankrolls * params['bet_fraction'])
+    raise ValueError(f"Unknown strategy '{strategy}'")
+
+def _run_session_chunk(args):
+    seed_sequence, num_sessions, params = args
+    num_symbols, table = _machine_arrays()
+    rng = np.random.default_rng(seed_sequence)
+
+    strategy = params['strategy']
+    min_bet = params['min_bet']
+    max_bet = params['max_bet']
+    target = params['target']
+
+    bankrolls = np.full(num_sessions, float(params['bankroll']))
+    peaks = bankrolls.copy()
+    max_drawdowns = np.zeros(num_sessions)
+    bets = np.full(num_sessions, float(params['base_bet']))
+    spins_played = np.zeros(num_sessions, dtype=np.int64)
+    active = np.ones(num_sessions, dtype=bool)
+    total_wagered = 0.0
+    total_paid = 0.0
+
+    for _ in range(params['max_spins']):
+        # A session ends once it cannot cover the table minimum or hits its target
+        active &= bankrolls >= min_bet
+        if target is not None:
+            active &= bankrolls < target
+        live = np.flatnonzero(active)
+        if not live.size:
+            break
+
+        stakes = np.clip(bets[live], min_bet, max_bet)
+        stakes = np.minimum(stakes, np.floor(bankrolls[live]))
+        multipliers = _draw_multipliers(rng, table, num_symbols, live.size)
+        payouts = stakes * multipliers
+
+        bankrolls[live] += payouts - stakes
+        peaks[live] = np.maximum(peaks[live], bankrolls[live])
+        max_drawdowns[live] = np.maximum(max_drawdowns[live], peaks[live] - bankrolls[live])
+        bets[live] = _next_bets(strategy, stakes, bankrolls[live], multipliers, params)
+        spins_played[live] += 1
+        total_wagered += float(stakes.sum())
+        total_paid += float(payouts.sum())
+
+    ruined = int(np.count_nonzero(bankrolls < min_bet))
+    return {
+        "sessions": num_sessions,
+        "ruined": ruined,
+        "total_wagered": total_wagered,
+        "total_paid": total_paid,
+        "total_spins": int(spins_played.sum()),
+        "final_bankrolls": bankrolls,
+        "max_drawdowns": max_drawdowns
+    }
+
+def _chunks(total, per_chunk):
+    sizes = [per_chunk] * (total // per_chunk)
+    if total % per_chunk:
+        sizes.append(total % per_chunk)
+    return sizes
+
+def _map(function, tasks, processes):
+    if processes == 1:
+        return [function(task) for task in tasks]
+    with Pool(processes=processes) as pool:
+        return pool.map(function, tasks, chunksize=1)
+
+def _interval(mean, std_error, confidence):
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return [mean - z * std_error, mean + z * std_error]
+
+def simulate_spins(num_spins, seed, processes=None, confidence=0.95):
+    """
+    Simulate independent spins at a unit bet.
+
+    Args:
+        num_spins: Total number of spins
+        seed: Master seed; the same seed always gives the same report
+        processes: Worker processes (defaults to every core)
+        confidence: Confidence level for the RTP interval
+
+    Returns:
+        dict: Empirical RTP with its confidence interval, hit frequency and
+        variance, next to the exact figures from the compiled paytable
+    """
+    sizes = _chunks(num_spins, SPINS_PER_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    started = time.perf_counter()
+    parts = _map(_run_spin_chunk, list(zip(seeds, sizes)), processes or os.cpu_count())
+    elapsed = time.perf_counter() - started
+
+    count = sum(part[0] for part in parts)
+    total = sum(part[1] for part in parts)
+    total_sq = sum(part[2] for part in parts)
+    hits = sum(part[3] for part in parts)
+
+    rtp = total / count
+    variance = total_sq / count - rtp * rtp
+    std_error = math.sqrt(variance / count)
+    return {
+        "mode": "spins",
+        "seed": seed,
+        "spins": count,
+        "rtp": rtp,
+        "rtp_std_error": std_error,
+        "rtp_interval": _interval(rtp, std_error, confidence),
+        "confidence": confidence,
+        "hit_frequency": hits / count,
+        "variance": variance,
+        "exact": SlotMachine().stats,
+        "elapsed_seconds": elapsed,
+        "spins_per_second": count / elapsed if elapsed else None
+    }
+
+def simulate_sessions(num_sessions, seed, bankroll, base_bet, max_spins, strategy='flat',
+                      bet_fraction=0.01, target=None, min_bet=1, max_bet=100,
+                      processes=None, confidence=0.95):
+    """
+    Simulate whole player sessions with a bankroll and a bet-size strategy.
+
+    Args:
+        num_sessions: Number of independent sessions
+        seed: Master seed; the same seed always gives the same report
+        bankroll: Starting bankroll of every session
+        base_bet: Opening bet (and the reset bet for progressive strategies)
+        max_spins: Spins after which a surviving session stops
+        strategy: One of STRATEGIES
+        bet_fraction: Share of the bankroll bet by the proportional strategy
+        target: Optional bankroll at which a session cashes out
+        min_bet: Table minimum; a session below it is ruined
+        max_bet: Table maximum
+        processes: Worker processes (defaults to every core)
+        confidence: Confidence level for the ruin probability interval
+
+    Returns:
+        dict: Ruin probability with its interval, realized RTP over all
+        wagers, and final bankroll and max drawdown percentiles
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'")
+
+    params = {
+        "strategy": strategy,
+        "bankroll": bankroll,
+        "base_bet": base_bet,
+        "bet_fraction": bet_fraction,
+        "max_spins": max_spins,
+        "min_bet": min_bet,
+        "max_bet": max_bet,
+        "target": target
+    }
+    sizes = _chunks(num_sessions, SESSIONS_PER_CHUNK)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    started = time.perf_counter()
+    parts = _map(_run_session_chunk, [(s, n, params) for s, n in zip(seeds, sizes)], processes or os.cpu_count())
+    elapsed = time.perf_counter() - started
+
+    ruined = sum(part['ruined'] for part in parts)
+    wagered = sum(part['total_wagered'] for part in parts)
+    paid = sum(part['total_paid'] for part in parts)
+    spins = sum(part['total_spins'] for part in parts)
+    final_bankrolls = np.concatenate([part['final_bankrolls'] for part in parts])
+    max_drawdowns = np.concatenate([part['max_drawdowns'] for part in parts])
+
+    ruin_probability = ruined / num_sessions
+    std_error = math.sqrt(ruin_probability * (1 - ruin_probability) / num_sessions)
+    percentiles = [5, 25, 50, 75, 95, 99]
+    return {
+        "mode": "sessions",
+        "seed": seed,
+        "params": params,
+        "sessions": num_sessions,
+        "ruin_probability": ruin_probability,
+        "ruin_interval": _interval(ruin_probability, std_error, confidence),
+        "confidence": confidence,
+        "realized_rtp": paid / wagered if wagered else None,
+        "average_spins": spins / num_sessions,
+        "final_bankroll": {
+            "mean": float(final_bankrolls.mean()),
+            **{f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(final_bankrolls, percentiles))}
+        },
+        "max_drawdown": {
+            "mean": float(max_drawdowns.mean()),
+            "max": float(max_drawdowns.max()),
+            **{f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(max_drawdowns, percentiles))}
+        },
+        "elapsed_seconds": elapsed,
+        "spins_per_second": spins / elapsed if elapsed else None
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo validation of the slot machine paytable")
+    parser.add_argument('--seed', type=int, required=True, help="Master seed for a reproducible run")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    modes = parser.add_subparsers(dest='mode', required=True)
+
+    spins = modes.add_parser('spins', help="Independent unit-bet spins")
+    spins.add_argument('--spins', type=int, required=True)
+
+    sessions = modes.add_parser('sessions', help="Player sessions with a bankroll")
+    sessions.add_argument('--sessions', type=int, required=True)
+    sessions.add_argument('--bankroll', type=float, required=True)
+    sessions.add_argument('--base-bet', type=float, required=True)
+    sessions.add_argument('--max-spins', type=int, required=True)
+    sessions.add_argument('--strategy', choices=STRATEGIES, default='flat')
+    sessions.add_argument('--bet-fraction', type=float, default=0.01)
+    sessions.add_argument('--target', type=float, default=None)
+    sessions.add_argument('--min-bet', type=float, default=1)
+    sessions.add_argument('--max-bet', type=float, default=100)
+
+    args = parser.parse_args(argv)
+    if args.mode == 'spins':
+        report = simulate_spins(args.spins, args.seed, args.processes, args.confidence)
+    else:
+        report = simulate_sessions(
+            args.sessions, args.seed, args.bankroll, args.base_bet, args.max_spins,
+            strategy=args.strategy, bet_fraction=args.bet_fraction, target=args.target,
+            min_bet=args.min_bet, max_bet=args.max_bet,
+            processes=args.processes, confidence=args.confidence
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,64 +1,159 @@
 # casino_app/games/slots.py
-import random
-from utils.provably_fair import generate_random_number
+from fractions import Fraction
+from types import MappingProxyType
+from utils.provably_fair import LEGACY_RNG_VERSION, RNG_VERSION, RandomStream, keyed_hmac, legacy_random_numbers
+
+NUM_REELS = 3
+
+# Upper bound (exclusive) of the version 1 RNG values mapped onto reel symbols
+LEGACY_RNG_RANGE = 1000000
+
+# A paytable returning this much or more per unit bet is rejected outright
+MAX_RTP = 1.0
+
+SYMBOLS = ('7', 'BAR', 'Cherry', 'Lemon', 'Orange', 'Plum', 'Bell')
+PAYOUTS = MappingProxyType({
+    '7-7-7': 10,      # Jackpot
+    'BAR-BAR-BAR': 5, # High payout
+    'Cherry-Cherry-Cherry': 3,
+    'Lemon-Lemon-Lemon': 2,
+    'Orange-Orange-Orange': 2,
+    'Plum-Plum-Plum': 2,
+    'Bell-Bell-Bell': 2,
+    'Cherry-Cherry-*': 1,  # Two cherries pays 1x
+    'Cherry-*-Cherry': 1,  # Two cherries in non-consecutive positions
+    '*-Cherry-Cherry': 1,  # Two cherries in non-consecutive positions
+})
 
 class SlotMachine:
-    def __init__(self):
-        self.symbols = ['7', 'BAR', 'Cherry', 'Lemon', 'Orange', 'Plum', 'Bell']
-        self.payouts = {
-            '7-7-7': 10,      # Jackpot
-            'BAR-BAR-BAR': 5, # High payout
-            'Cherry-Cherry-Cherry': 3,
-            'Lemon-Lemon-Lemon': 2,
-            'Orange-Orange-Orange': 2,
-            'Plum-Plum-Plum': 2,
-            'Bell-Bell-Bell': 2,
-            'Cherry-Cherry-*': 1,  # Two cherries pays 1x
-            'Cherry-*-Cherry': 1,  # Two cherries in non-consecutive positions
-            '*-Cherry-Cherry': 1,  # Two cherries in non-consecutive positions
-        }
+    """
+    Three-reel slot machine.
+    
+    All tables are read-only once built, so one instance can serve every
+    request; games.game_registry keeps a shared one per worker.
+    """
+    
+    def __init__(self, symbols=SYMBOLS, payouts=PAYOUTS):
+        self.symbols = tuple(symbols)
+        self.payouts = MappingProxyType(dict(payouts))
         # House edge is built into the symbol probabilities and payouts
+        
+        # Compile the paytable once so a spin is a single tuple lookup
+        self.payout_table = self._compile_payouts()
+        self.stats = self._compute_stats()
+        if self.stats['rtp'] >= MAX_RTP:
+            raise ValueError(f"Paytable return-to-player {self.stats['rtp']:.4f} exceeds {MAX_RTP}")
     
-    def play(self, bet_amount, client_seed, server_seed):
-        # Use provably fair mechanism to generate the reel results
-        rng_sequence = generate_random_number(client_seed, server_seed, 3)
+    def _compile_payouts(self):
+        """
+        Build a dense multiplier table indexed by reel symbol indices.
         
-        # Select symbols based on RNG values
-        reels = []
-        for i in range(3):
-            # Map the RNG value to a symbol (with weighted probabilities)
-            index = rng_sequence[i] % len(self.symbols)
-            reels.append(self.symbols[index])
+        Entry i * n^2 + j * n + k holds the multiplier for reels
+        (symbols[i], symbols[j], symbols[k]); exact matches win over
+        wildcard patterns, and wildcards apply in paytable order.
         
-        # Check for winning combinations
-        result_key = '-'.join(reels)
-        payout_multiplier = 0
+        Raises:
+            ValueError: If a pattern or multiplier is malformed
+        """
+        symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        exact = {}
+        wildcards = []
         
-        # Check exact matches first
-        if result_key in self.payouts:
-            payout_multiplier = self.payouts[result_key]
-        else:
-            # Check for partial matches (like two cherries)
-            for pattern, multiplier in self.payouts.items():
-                if '*' in pattern:
-                    pattern_parts = pattern.split('-')
-                    matches = True
-                    
-                    for i, symbol in enumerate(pattern_parts):
-                        if symbol != '*' and reels[i] != symbol:
-                            matches = False
-                            break
-                    
-                    if matches:
-                        payout_multiplier = multiplier
-                        break
+        for pattern, multiplier in self.payouts.items():
+            parts = pattern.split('-')
+            if len(parts) != NUM_REELS:
+                raise ValueError(f"Paytable pattern '{pattern}' must have {NUM_REELS} reels")
+            for part in parts:
+                if part != '*' and part not in symbol_index:
+                    raise ValueError(f"Paytable pattern '{pattern}' uses unknown symbol '{part}'")
+            if isinstance(multiplier, bool) or not isinstance(multiplier, (int, float)) or multiplier < 0:
+                raise ValueError(f"Paytable multiplier for '{pattern}' must be a non-negative number")
+            
+            if '*' in parts:
+                wildcards.append(([symbol_index.get(part) for part in parts], multiplier))
+            else:
+                exact[tuple(symbol_index[part] for part in parts)] = multiplier
+        
+        n = len(self.symbols)
+        table = [0] * (n ** NUM_REELS)
+        for i in range(n):
+            for j in range(n):
+                for k in range(n):
+                    reels = (i, j, k)
+                    multiplier = exact.get(reels)
+                    if multiplier is None:
+                        multiplier = 0
+                        for parts, wildcard_multiplier in wildcards:
+                            if all(part is None or part == reel for part, reel in zip(parts, reels)):
+                                multiplier = wildcard_multiplier
+                                break
+                    table[i * n * n + j * n + k] = multiplier
+        return tuple(table)
+    
+    def _compute_stats(self):
+        """
+        Exact return-to-player, hit frequency and variance per unit bet.
+        
+        Reel stops are drawn without bias, so every symbol on a reel is
+        equally likely.
+        """
+        n = len(self.symbols)
+        weights = [Fraction(1, n)] * n
+        
+        rtp = Fraction(0)
+        hit_frequency = Fraction(0)
+        second_moment = Fraction(0)
+        for i in range(n):
+            for j in range(n):
+                for k in range(n):
+                    multiplier = Fraction(self.payout_table[i * n * n + j * n + k])
+                    if not multiplier:
+                        continue
+                    probability = weights[i] * weights[j] * weights[k]
+                    rtp += probability * multiplier
+                    hit_frequency += probability
+                    second_moment += probability * multiplier * multiplier
+        
+        variance = second_moment - rtp * rtp
+        return {
+            "rtp": float(rtp),
+            "hit_frequency": float(hit_frequency),
+            "variance": float(variance),
+            "std_dev": float(variance) ** 0.5
+        }
+    
+    def play(self, bet_amount, client_seed, server_seed, nonce=None, seed_hmac=None):
+        # Use provably fair mechanism to pick a stop on each reel
+        stream = RandomStream(client_seed, server_seed, nonce, seed_hmac)
+        n = len(self.symbols)
+        i, j, k = (stream.randbelow(n) for _ in range(NUM_REELS))
+        return self._evaluate(bet_amount, i, j, k)
+    
+    def reels(self, client_seed, server_seed, nonce=None, rng_version=RNG_VERSION):
+        """The symbols a round played with rng_version showed, for verification."""
+        n = len(self.symbols)
+        if rng_version == LEGACY_RNG_VERSION:
+            # Version 1 reduced each value modulo the number of symbols
+            values = legacy_random_numbers(client_seed, server_seed, NUM_REELS, max_val=LEGACY_RNG_RANGE, nonce=nonce)
+            return [self.symbols[value % n] for value in values]
+        return self.play(0, client_seed, server_seed, nonce)['reels']
+    
+    def _evaluate(self, bet_amount, i, j, k):
+        n = len(self.symbols)
+        # Look up the precompiled multiplier for this reel combination
+        payout_multiplier = self.payout_table[i * n * n + j * n + k]
         
         # Calculate payout
         payout = bet_amount * payout_multiplier
         
         return {
-            "reels": reels,
+            "reels": [self.symbols[i], self.symbols[j], self.symbols[k]],
             "payout": payout,
             "payout_multiplier": payout_multiplier,
             "win": payout > 0
         }
+    
+    def play_batch(self, bet_amount, client_seed, server_seed, nonces):
+        """Play one spin per nonce with a single seed pair; spin i matches play(..., nonce=nonces[i])."""
+        seed_hmac = keyed_hmac(server_seed) if server_seed else None
+        return [self.play(bet_amount, client_seed, server_seed, nonce, seed_hmac) for nonce in nonces]
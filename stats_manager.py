@@ -0,0 +1,61 @@
+# casino_app/stats/stats_manager.py
+import hmac
+import os
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db.database import get_db
+from utils.player_stats import (dashboard_summary, dashboard_window, parse_dashboard_hours, player_summary,
+                                vip_summary)
+from utils.user_cache import load_profile, user_key
+
+stats_blueprint = Blueprint('stats', __name__)
+
+# The operator dashboard is not for players; it is served only to callers
+# presenting this shared secret in the X-Operator-Token header
+OPERATOR_TOKEN = os.getenv('OPERATOR_TOKEN')
+
+def operator_error(token):
+    """
+    Returns:
+        The (error response body, status) for a rejected operator token, or
+        None if the token is accepted
+    """
+    if not OPERATOR_TOKEN:
+        return {"error": "Operator access is not configured"}, 403
+    if not token or not hmac.compare_digest(token.encode(), OPERATOR_TOKEN.encode()):
+        return {"error": "Invalid operator token"}, 401
+    return None
+
+@stats_blueprint.route('/me', methods=['GET'])
+@jwt_required()
+def get_player_stats():
+    # One document, maintained at settlement; nothing is aggregated here
+    doc = get_db().player_stats.find_one({"_id": user_key(get_jwt_identity())})
+    return jsonify(player_summary(doc))
+
+@stats_blueprint.route('/vip', methods=['GET'])
+@jwt_required()
+def get_vip_status():
+    current_user_id = get_jwt_identity()
+    db = get_db()
+    
+    profile = load_profile(db, current_user_id)
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+    
+    doc = db.player_stats.find_one({"_id": user_key(current_user_id)}, {"totals.wagered": True})
+    return jsonify(vip_summary(profile.user.get('vip_status'), doc))
+
+@stats_blueprint.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    error = operator_error(request.headers.get('X-Operator-Token'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    db = get_db()
+    hours = parse_dashboard_hours(request.args.get('hours'))
+    hourly_filter, since = dashboard_window(hours, db.server_timestamp())
+    
+    game_docs = list(db.game_stats.find({}))
+    hourly_docs = list(db.game_stats_hourly.find(hourly_filter).sort([("hour", 1), ("game_type", 1)]))
+    return jsonify(dashboard_summary(game_docs, hourly_docs, hours, since))
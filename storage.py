@@ -0,0 +1,54 @@
+# casino_app/db/storage.py
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+# The blueprints talk to storage through a small subset of the pymongo API.
+# Every backend provides collections that support:
+#
+#   find_one(filter, projection=None)
+#   find(filter=None, projection=None) -> cursor with sort(), skip(), limit(),
+#       batch_size() and iteration
+#   insert_one(document) -> result with inserted_id
+#   insert_many(documents, ordered=True) -> result with inserted_ids
+#   update_one / update_many(filter, update, upsert=False) -> result with
+#       matched_count, modified_count and upserted_id
+#   find_one_and_update(filter, update, projection=None, sort=None,
+#       upsert=False, return_document=ReturnDocument.BEFORE)
+#   bulk_write(requests, ordered=True) with pymongo UpdateOne/UpdateMany
+#       requests -> result with matched_count and modified_count
+#   delete_one / delete_many(filter), count_documents(filter)
+#   create_indexes(index_models)
+#
+# Updates use the $set, $inc, $unset, $push and $setOnInsert operators.
+# Duplicate keys raise pymongo.errors.DuplicateKeyError (BulkWriteError from
+# insert_many), whatever the backend.
+
+def utc_now():
+    """Naive UTC timestamp, the form pymongo returns dates in."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class Storage(ABC):
+    """A database: named collections plus a server-side clock."""
+
+    @abstractmethod
+    def collection(self, name):
+        """Return the collection called name, creating it if needed."""
+
+    def server_timestamp(self):
+        """Timestamp stored in created_at/timestamp fields."""
+        return utc_now()
+
+    def ping(self):
+        """Check the backend is reachable."""
+        return True
+
+    def close(self):
+        """Release connections or files held by the backend."""
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.collection(name)
+
+    def __getitem__(self, name):
+        return self.collection(name)
@@ -0,0 +1,44 @@
+# casino_app/tests/test_benchmark.py
+import json
+import subprocess
+import sys
+from benchmarks.benchmark import compare, main
+from conftest import APP_DIR
+
+def test_workload_runs_every_endpoint_successfully(tmp_path):
+    output = tmp_path / 'bench.json'
+
+    # The workload installs its own database and closes the write-behind
+    # queues, so it gets a process of its own
+    subprocess.run([sys.executable, '-m', 'benchmarks.benchmark', 'workload', '--players', '3',
+                    '--concurrency', '2', '--rounds', '2', '--batch-spins', '2', '--output', str(output)],
+                   cwd=APP_DIR, check=True, capture_output=True, timeout=120)
+    report = json.loads(output.read_text())
+
+    endpoints = report['workload']['endpoints']
+    assert endpoints['POST /api/games/play']['statuses'] == {"200": 6}
+    assert endpoints['POST /api/games/play-batch']['statuses'] == {"200": 3}
+    assert endpoints['POST /api/payments/withdraw']['statuses'] == {"200": 3}
+    assert all(int(status) < 300 for stats in endpoints.values() for status in stats['statuses'])
+    assert report['workload']['overall']['requests'] == sum(stats['requests'] for stats in endpoints.values())
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {
+        "workload": {"endpoints": {"POST /api/games/play": {"p95_ms": 10, "p99_ms": 20}}},
+        "micro": {"verify_fairness": {"best_ns_per_op": 1000}}
+    }
+    report = {
+        "workload": {"endpoints": {"POST /api/games/play": {"p95_ms": 10.5, "p99_ms": 30},
+                                   "GET /api/auth/profile": {"p95_ms": 99, "p99_ms": 99}}},
+        "micro": {"verify_fairness": {"best_ns_per_op": 500}}
+    }
+
+    assert compare(report, baseline, 0.10) == [("POST /api/games/play p99_ms", 20, 30, 0.5)]
+
+def test_compare_exit_code(tmp_path):
+    report, baseline = tmp_path / 'new.json', tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({"micro": {"verify_fairness": {"best_ns_per_op": 1e-3}}}))
+    args = ['micro', '--iterations', '10', '--repeats', '1', '--output', str(report)]
+
+    assert main(args + ['--compare', str(baseline)]) == 1
+    assert main(args + ['--compare', str(report)]) == 0
@@ -0,0 +1,140 @@
+# casino_app/tests/test_deposit_ingestion.py
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+import pytest
+from db.async_storage import AsyncEmbeddedStorage
+from payments.deposit_ingestion import ingest_deposits, ingest_deposits_async
+from utils.user_cache import user_key
+
+WEBHOOK_SECRET = os.environ['PAYMENT_WEBHOOK_SECRET']
+
+def deposit(transaction_id, user_id, amount=10):
+    return {"transaction_id": transaction_id, "user_id": user_id, "amount": amount, "payment_method": "card"}
+
+def post_webhook(client, events, signature=None):
+    body = json.dumps({"events": events}).encode()
+    if signature is None:
+        signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return client.post('/api/payments/deposit/webhook', data=body, content_type='application/json',
+                       headers={"X-Webhook-Signature": signature})
+
+def balance(db, user_id):
+    return db.users.find_one({"_id": user_key(user_id)})['balance']
+
+def ledger_total(db, user_id):
+    return sum(entry['amount'] for entry in db.ledger.find({"user_id": user_id, "kind": "deposit"}))
+
+def crash(*args, **kwargs):
+    raise RuntimeError("database down")
+
+def statuses(summary):
+    return [result['status'] for result in summary['results']]
+
+def test_webhook_credits_each_transaction_once(db, client, make_user):
+    user_id = make_user()
+    events = [deposit('t1', user_id), deposit('t2', user_id, 5), deposit('t1', user_id), {"transaction_id": "t3"}]
+
+    first = post_webhook(client, events)
+    retry = post_webhook(client, events)
+
+    assert first.status_code == 200
+    assert statuses(first.get_json()) == ["credited", "credited", "duplicate", "invalid"]
+    assert statuses(retry.get_json()) == ["duplicate", "duplicate", "duplicate", "invalid"]
+    assert balance(db, user_id) == 15
+    assert ledger_total(db, user_id) == 15
+
+def test_webhook_rejects_bad_signature(db, client, make_user):
+    user_id = make_user()
+
+    response = post_webhook(client, [deposit('t1', user_id)], signature='0' * 64)
+
+    assert response.status_code == 401
+    assert balance(db, user_id) == 0
+
+def test_unknown_user_is_not_recorded(db, make_user):
+    missing_user = make_user()
+    db.users.delete_one({"_id": user_key(missing_user)})
+
+    summary = ingest_deposits(db, [deposit('t1', missing_user)])
+
+    assert statuses(summary) == ["unknown_user"]
+    assert db.transactions.find_one({"transaction_id": "t1"}) is None
+
+def test_retry_credits_records_an_earlier_delivery_left_pending(monkeypatch, db, make_user):
+    user_id = make_user()
+
+    # The first delivery dies between recording and claiming its records
+    with monkeypatch.context() as patch:
+        patch.setattr(db.transactions, 'update_many', crash)
+        with pytest.raises(RuntimeError):
+            ingest_deposits(db, [deposit('t1', user_id), deposit('t2', user_id, 5)])
+    assert {record['status'] for record in db.transactions.find({})} == {"pending"}
+
+    summary = ingest_deposits(db, [deposit('t1', user_id), deposit('t2', user_id, 5), deposit('t3', user_id, 1)])
+
+    assert statuses(summary) == ["credited", "credited", "credited"]
+    assert balance(db, user_id) == 16
+    assert ledger_total(db, user_id) == 16
+
+def test_records_being_credited_are_never_credited_again(monkeypatch, db, make_user):
+    user_id = make_user()
+
+    # The first delivery dies after claiming its records, so it cannot be
+    # told whether the balance was credited
+    with monkeypatch.context() as patch:
+        patch.setattr(db.users, 'bulk_write', crash)
+        with pytest.raises(RuntimeError):
+            ingest_deposits(db, [deposit('t1', user_id)])
+
+    summary = ingest_deposits(db, [deposit('t1', user_id)])
+
+    assert statuses(summary) == ["processing"]
+    assert balance(db, user_id) == 0
+
+def test_concurrent_deliveries_credit_once(db, make_user):
+    user_id = make_user()
+    events = [deposit(f't{i}', user_id, 1) for i in range(50)]
+    barrier = threading.Barrier(4)
+    summaries = []
+
+    def deliver():
+        barrier.wait()
+        summaries.append(ingest_deposits(db, events))
+
+    threads = [threading.Thread(target=deliver) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(summary['counts'].get('credited', 0) for summary in summaries) == 50
+    assert balance(db, user_id) == 50
+    assert ledger_total(db, user_id) == 50
+
+def test_async_ingestion_matches_sync(db, make_user):
+    user_id = make_user()
+    ingest_deposits(db, [deposit('t1', user_id)])
+
+    summary = asyncio.run(ingest_deposits_async(AsyncEmbeddedStorage(db), [
+        deposit('t1', user_id), deposit('t2', user_id, 5), deposit('t2', user_id, 5)
+    ]))
+
+    assert statuses(summary) == ["duplicate", "credited", "duplicate"]
+    assert balance(db, user_id) == 15
+    assert ledger_total(db, user_id) == 15
+
+def test_confirmed_deposit_is_credited_once(db, client, make_user, auth_headers):
+    user_id = make_user()
+    body = {"amount": 3, "payment_method": "card", "transaction_id": "manual-1"}
+
+    first = client.post('/api/payments/deposit/confirm', headers=auth_headers(user_id), json=body)
+    again = client.post('/api/payments/deposit/confirm', headers=auth_headers(user_id), json=body)
+
+    assert first.status_code == 200 and not first.get_json().get('duplicate')
+    assert again.get_json()['duplicate'] is True
+    assert balance(db, user_id) == 3
+    assert ledger_total(db, user_id) == 3
@@ -0,0 +1,83 @@
+# casino_app/tests/test_embedded_storage.py
+import os
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from db.embedded_storage import EmbeddedStorage
+
+@pytest.fixture
+def store(tmp_path):
+    storage = EmbeddedStorage(str(tmp_path))
+    storage.users.create_indexes([IndexModel([("username", 1)], name="username_unique", unique=True)])
+    storage.transactions.create_indexes([
+        IndexModel([("transaction_id", 1)], name="deposit_transaction_unique", unique=True,
+                   partialFilterExpression={"type": "deposit"})
+    ])
+    yield storage
+    storage.close()
+
+def test_unique_index_follows_updates_and_deletes(store):
+    user_id = store.users.insert_one({"username": "alice"}).inserted_id
+    with pytest.raises(DuplicateKeyError):
+        store.users.insert_one({"username": "alice"})
+
+    # Renaming frees the old key and takes the new one
+    store.users.update_one({"_id": user_id}, {"$set": {"username": "bob"}})
+    store.users.insert_one({"username": "alice"})
+    with pytest.raises(DuplicateKeyError):
+        store.users.update_one({"username": "alice"}, {"$set": {"username": "bob"}})
+
+    store.users.delete_one({"username": "bob"})
+    store.users.insert_one({"username": "bob"})
+    assert store.users.count_documents({}) == 2
+
+def test_partial_unique_index(store):
+    store.transactions.insert_one({"type": "deposit", "transaction_id": "t1", "amount": 5})
+    # Outside the partial filter the key may repeat
+    store.transactions.insert_one({"type": "withdrawal", "transaction_id": "t1", "amount": 7})
+    with pytest.raises(DuplicateKeyError):
+        store.transactions.insert_one({"type": "deposit", "transaction_id": "t1"})
+
+    assert store.transactions.find_one({"type": "deposit", "transaction_id": "t1"})['amount'] == 5
+    assert store.transactions.find_one({"type": "withdrawal", "transaction_id": "t1"})['amount'] == 7
+    assert store.transactions.count_documents({"transaction_id": "t1"}) == 2
+    assert store.transactions.find_one({"type": "deposit", "transaction_id": "t2"}) is None
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_reopen_restores_documents_and_indexes(tmp_path, store, compact):
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 6000)
+    user_id = store.users.insert_one({"username": "alice", "created_at": created_at, "tags": ["vip"]}).inserted_id
+    store.users.insert_one({"username": "gone"})
+    if compact:
+        store.compact()
+    store.users.delete_one({"username": "gone"})
+    store.close()
+
+    reopened = EmbeddedStorage(str(tmp_path))
+    assert list(reopened.users.find({})) == [
+        {"_id": user_id, "username": "alice", "created_at": created_at, "tags": ["vip"]}
+    ]
+    with pytest.raises(DuplicateKeyError):
+        reopened.users.insert_one({"username": "alice"})
+    reopened.close()
+
+def test_torn_log_record_is_cut_off(tmp_path, store):
+    store.users.insert_one({"_id": ObjectId(), "username": "alice"})
+    store.close()
+    wal_path = os.path.join(tmp_path, EmbeddedStorage.WAL)
+    length = os.path.getsize(wal_path)
+    with open(wal_path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00torn')
+
+    reopened = EmbeddedStorage(str(tmp_path))
+    assert [user['username'] for user in reopened.users.find({})] == ["alice"]
+    assert os.path.getsize(wal_path) == length
+    reopened.close()
+
+def test_pickle_files_are_never_loaded(tmp_path):
+    (tmp_path / 'wal.log').write_bytes(b'\x80\x04K\x01.')
+
+    with pytest.raises(ValueError):
+        EmbeddedStorage(str(tmp_path))
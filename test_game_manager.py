@@ -0,0 +1,67 @@
+# casino_app/tests/test_game_manager.py
+import pytest
+from games.slots import SlotMachine
+from utils.user_cache import user_key
+
+def prepare(client, headers):
+    return client.post('/api/games/prepare', headers=headers, json={"game_type": "slots"}).get_json()['server_seed_hash']
+
+@pytest.mark.parametrize('path, extra', [('/api/games/play', {}), ('/api/games/play-batch', {"num_spins": 2})])
+@pytest.mark.parametrize('bet_amount', [True, 0, -1, "5"])
+def test_rejects_invalid_bet_amounts(client, make_user, auth_headers, path, extra, bet_amount):
+    headers = auth_headers(make_user(balance=100))
+
+    response = client.post(path, headers=headers, json={
+        "game_type": "slots", "bet_amount": bet_amount, "client_seed": "client",
+        "server_seed_hash": prepare(client, headers), **extra
+    })
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Bet amount must be positive"}
+
+def test_rejects_boolean_spin_count(client, make_user, auth_headers):
+    headers = auth_headers(make_user(balance=100))
+
+    response = client.post('/api/games/play-batch', headers=headers, json={
+        "game_type": "slots", "bet_amount": 1, "client_seed": "client", "num_spins": True,
+        "server_seed_hash": prepare(client, headers)
+    })
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('path, method, extra', [
+    ('/api/games/play', 'play', {}),
+    ('/api/games/play-batch', 'play_batch', {"num_spins": 3}),
+])
+def test_engine_failure_releases_prepared_seed(monkeypatch, db, client, make_user, auth_headers, path, method, extra):
+    headers = auth_headers(make_user(balance=100))
+    server_seed_hash = prepare(client, headers)
+    body = {"game_type": "slots", "bet_amount": 1, "client_seed": "client", "server_seed_hash": server_seed_hash,
+            **extra}
+
+    def broken(self, *args, **kwargs):
+        raise RuntimeError("engine failure")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SlotMachine, method, broken)
+        with pytest.raises(RuntimeError):
+            client.post(path, headers=headers, json=body)
+
+    assert db.game_seeds.find_one({"server_seed_hash": server_seed_hash})['used'] is False
+    # The seed can still be played once
+    assert client.post(path, headers=headers, json=body).status_code == 200
+    assert client.post(path, headers=headers, json=body).status_code == 400
+
+@pytest.mark.parametrize('path, body, error', [
+    ('/api/betting/place-bet', {"game_id": "g"}, "Bet amount must be positive"),
+    ('/api/payments/withdraw', {"payment_method": "bitcoin", "destination": "bc1"}, "Withdrawal amount must be positive"),
+])
+@pytest.mark.parametrize('amount', [True, None, "5", 0, -1])
+def test_debits_reject_invalid_amounts(db, client, make_user, auth_headers, path, body, error, amount):
+    user_id = make_user(balance=100)
+
+    response = client.post(path, headers=auth_headers(user_id), json=dict(body, amount=amount))
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+    assert db.users.find_one({"_id": user_key(user_id)})['balance'] == 100
@@ -0,0 +1,103 @@
+# casino_app/tests/test_gunicorn.py
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import pytest
+from conftest import APP_DIR
+
+CONFIG_PATH = os.path.join(APP_DIR, 'gunicorn.conf.py')
+
+# Worker class each profile selects, and the module it needs
+PROFILES = {
+    'sync': ('sync', None),
+    'gthread': ('gthread', None),
+    'gevent': ('gevent', 'gevent'),
+    'asgi': ('uvicorn_worker.UvicornWorker', 'uvicorn_worker'),
+}
+
+def load_config(monkeypatch, profile):
+    monkeypatch.setenv('GUNICORN_PROFILE', profile)
+    # The config points prometheus_client at a multiprocess directory;
+    # setenv first so teardown takes that back out of the session
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', '')
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR')
+    spec = importlib.util.spec_from_file_location(f'gunicorn_conf_{profile}', CONFIG_PATH)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return config
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_profile_settings(monkeypatch, profile):
+    config = load_config(monkeypatch, profile)
+
+    assert config.worker_class == PROFILES[profile][0]
+    assert config.wsgi_app == ('asgi:app' if profile == 'asgi' else 'main:app')
+    # gevent has to patch the standard library before the app is imported
+    assert config.preload_app == (profile != 'gevent')
+    # The embedded store lives in one process
+    assert config.workers == 1
+
+def test_unknown_profile_is_rejected(monkeypatch):
+    with pytest.raises(ValueError):
+        load_config(monkeypatch, 'threads')
+
+@pytest.mark.parametrize('profile', ['sync', 'gthread'])
+def test_post_worker_init_warms_up_embedded_store(monkeypatch, db, profile):
+    from db.database import get_db
+    from games.game_registry import get_engine
+
+    monkeypatch.setenv('WARMUP_CONNECTIONS', '4')
+    config = load_config(monkeypatch, profile)
+    config.post_fork(None, None)
+    config.post_worker_init(None)
+
+    # post_fork dropped the handle from before the fork; warm-up built the
+    # new one and created the indexes on it
+    warmed = get_db()
+    assert warmed is not db
+    assert 'user_history_keyset' in warmed.bets.index_information()
+    assert get_engine('slots') is not None
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_profile_boots_and_serves(tmp_path, profile):
+    if PROFILES[profile][1]:
+        pytest.importorskip(PROFILES[profile][1])
+    port = free_port()
+    env = dict(
+        os.environ,
+        GUNICORN_PROFILE=profile,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        STORAGE_BACKEND='embedded',
+        METRICS_DIR=str(tmp_path / 'metrics'),
+        RATE_LIMIT_PATH=str(tmp_path / 'rate-limit.sqlite3'),
+        PYTHONPATH=APP_DIR
+    )
+    log_path = tmp_path / 'gunicorn.log'
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', CONFIG_PATH], cwd=APP_DIR, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=2) as response:
+                    assert response.status == 200
+                    break
+            except OSError:
+                if server.poll() is not None:
+                    pytest.fail(f"gunicorn exited: {log_path.read_text()[-2000:]}")
+                if time.monotonic() > deadline:
+                    pytest.fail(f"{profile} worker did not answer within 30s")
+                time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,28 @@
+# casino_app/tests/test_json_provider.py
+from datetime import datetime
+from decimal import Decimal
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from utils.json_provider import dumps, loads
+from utils.pagination import export_rows
+
+def test_decimals_are_encoded_as_exact_strings():
+    encoded = loads(dumps({"amount": Decimal('0.10000000000000000001'), "fee": Decimal128('1234567890.123456789')}))
+    assert encoded == {"amount": "0.10000000000000000001", "fee": "1234567890.123456789"}
+
+def test_csv_export_formats_each_type_explicitly(db):
+    doc_id = ObjectId()
+    db.transactions.insert_one({
+        "_id": doc_id,
+        "user_id": "player",
+        "amount": Decimal128('10.05'),
+        "status": 'completed',
+        "refunded": False,
+        "created_at": datetime(2026, 1, 2, 3, 4, 5),
+        "details": {"method": "card"}
+    })
+    fields = ['_id', 'amount', 'status', 'refunded', 'created_at', 'details', 'missing']
+    header, row = list(export_rows(db.transactions, {"user_id": "player"}, fields, 'csv'))
+
+    assert header == '_id,amount,status,refunded,created_at,details,missing\r\n'
+    assert row == f'{doc_id},10.05,completed,false,2026-01-02T03:04:05,"{{""method"":""card""}}",\r\n'
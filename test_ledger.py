@@ -0,0 +1,121 @@
+# casino_app/tests/test_ledger.py
+from collections import Counter
+from datetime import timedelta
+import pytest
+from conftest import drain
+from payments.payout_gateway import SimulatedPayoutGateway
+from payments.withdrawal_worker import process_once
+from utils import reconciliation
+from utils.ledger import deposit_entry, ledger_queue, post_entries
+from utils.reconciliation import ledger_balance, open_balances, reconcile
+from utils.user_cache import user_key
+
+@pytest.fixture
+def player(client, make_user, auth_headers):
+    """A player with a deposit, single and batched rounds, a bet and a refunded withdrawal."""
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    assert client.post('/api/payments/deposit/confirm', headers=headers, json={
+        "amount": 500, "payment_method": "card", "transaction_id": f"deposit-{user_id}"
+    }).status_code == 200
+
+    server_seed_hash = client.get('/api/games/seed-session', headers=headers).get_json()['server_seed_hash']
+    play = {"game_type": "slots", "bet_amount": 2, "client_seed": "client", "seed_session": True,
+            "server_seed_hash": server_seed_hash}
+    for _ in range(5):
+        assert client.post('/api/games/play', headers=headers, json=play).status_code == 200
+    assert client.post('/api/games/play-batch', headers=headers, json=dict(play, num_spins=10)).status_code == 200
+    assert client.post('/api/betting/place-bet', headers=headers, json={"game_id": "g", "amount": 3}).status_code == 200
+    for destination in ('bc1-destination', None):
+        assert client.post('/api/payments/withdraw', headers=headers, json={
+            "amount": 20, "payment_method": "bitcoin", "destination": destination
+        }).status_code == 200
+    return user_id
+
+def settle(db):
+    process_once(db, SimulatedPayoutGateway())
+    drain(ledger_queue)
+
+def balance(db, user_id):
+    return db.users.find_one({"_id": user_key(user_id)})['balance']
+
+def test_every_balance_change_is_in_the_ledger(db, player):
+    settle(db)
+
+    kinds = Counter(entry['kind'] for entry in db.ledger.find({"user_id": player}))
+    assert kinds['deposit'] == kinds['bet'] == kinds['refund'] == 1
+    assert kinds['withdrawal'] == 2
+    assert kinds['stake'] == 6
+    assert ledger_balance(db, player) == pytest.approx(balance(db, player))
+
+    report = reconcile(db, grace=0)
+    assert (report['users'], report['matched'], report.get('mismatched', 0)) == (1, 1, 0)
+
+def test_reconcile_reports_a_balance_the_ledger_disagrees_with(db, player):
+    settle(db)
+    db.users.update_one({"_id": user_key(player)}, {"$inc": {"balance": 7}})
+
+    report = reconcile(db, grace=0)
+
+    assert report['mismatched'] == 1
+    assert report['mismatches'][0]['user_id'] == player
+    assert report['mismatches'][0]['difference'] == pytest.approx(7)
+
+def test_balance_changing_during_the_recheck_is_unsettled(monkeypatch, db, player):
+    settle(db)
+    db.users.update_one({"_id": user_key(player)}, {"$inc": {"balance": 7}})
+    recheck = reconciliation._recheck
+
+    def change_then_recheck(db, suspects, report):
+        # The player's next change lands while the suspect waits out the grace period
+        db.users.update_one({"_id": user_key(player)}, {"$inc": {"version": 1}})
+        recheck(db, suspects, report)
+
+    monkeypatch.setattr(reconciliation, '_recheck', change_then_recheck)
+    report = reconcile(db, grace=0)
+
+    assert (report['unsettled'], report.get('mismatched', 0)) == (1, 0)
+
+def test_snapshots_roll_forward_without_changing_balances(monkeypatch, db, player, client, auth_headers):
+    monkeypatch.setattr(reconciliation, 'SNAPSHOT_LAG', 0)
+    monkeypatch.setattr(reconciliation, 'SNAPSHOT_MIN_ENTRIES', 1)
+    settle(db)
+
+    assert reconcile(db, grace=0)['snapshots'] == 1
+    snapshot = db.ledger_snapshots.find_one({"_id": player})
+    assert snapshot['balance'] == pytest.approx(balance(db, player))
+
+    # Entries after the snapshot are read from the tail
+    assert client.post('/api/payments/deposit/confirm', headers=auth_headers(player), json={
+        "amount": 11, "payment_method": "card", "transaction_id": f"again-{player}"
+    }).status_code == 200
+    report = reconcile(db, grace=0, snapshots=False)
+    assert (report['matched'], report['entries_read']) == (1, 1)
+    assert ledger_balance(db, player) == pytest.approx(balance(db, player))
+
+def test_late_entry_after_a_snapshot_is_counted(monkeypatch, db, make_user):
+    monkeypatch.setattr(reconciliation, 'SNAPSHOT_LAG', 0)
+    monkeypatch.setattr(reconciliation, 'SNAPSHOT_MIN_ENTRIES', 1)
+    user_id = make_user()
+    an_hour_ago = db.server_timestamp() - timedelta(hours=1)
+
+    post_entries(db, [deposit_entry(user_id, 't1', 'card', 10, an_hour_ago)])
+    db.users.update_one({"_id": user_key(user_id)}, {"$set": {"balance": 10}})
+    assert reconcile(db, grace=0)['snapshots'] == 1
+
+    # Created before the snapshot's cutoff, but held up in a queue until now
+    post_entries(db, [deposit_entry(user_id, 't2', 'card', 5, an_hour_ago)])
+    db.users.update_one({"_id": user_key(user_id)}, {"$set": {"balance": 15}})
+
+    assert ledger_balance(db, user_id) == 15
+    assert reconcile(db, grace=0)['matched'] == 1
+
+def test_open_balances_snapshots_users_without_history(db, make_user):
+    legacy_user = make_user(balance=42)
+    make_user()
+
+    assert reconcile(db, grace=0)['mismatched'] == 1
+    assert open_balances(db) == 1
+    assert open_balances(db) == 0
+    assert ledger_balance(db, legacy_user) == 42
+    assert reconcile(db, grace=0).get('mismatched', 0) == 0
@@ -0,0 +1,26 @@
+# casino_app/tests/test_metrics.py
+import asyncio
+import pytest
+from conftest import OPERATOR_TOKEN
+
+@pytest.mark.parametrize('headers, status', [
+    ({}, 401),
+    ({"X-Operator-Token": "not-the-token"}, 401),
+    ({"X-Operator-Token": OPERATOR_TOKEN}, 200),
+])
+def test_metrics_require_operator_token(client, headers, status):
+    response = client.get('/api/metrics', headers=headers)
+
+    assert response.status_code == status
+    if status == 200:
+        assert b'casino_request_duration_seconds' in response.data
+
+def test_async_metrics_require_operator_token(db):
+    from asgi import app
+
+    async def statuses():
+        client = app.test_client()
+        return [(await client.get('/api/metrics', headers=headers)).status_code
+                for headers in ({}, {"X-Operator-Token": OPERATOR_TOKEN})]
+
+    assert asyncio.run(statuses()) == [401, 200]
@@ -0,0 +1,90 @@
+# casino_app/tests/test_pagination.py
+import csv
+import io
+import json
+from datetime import timedelta
+from bson import ObjectId
+
+def add_bets(db, user_id, count, created_at):
+    """Insert count bets, every second pair sharing a created_at."""
+    bets = [{"_id": ObjectId(), "user_id": user_id, "game_id": f"g{i}", "amount": i + 1, "status": "placed",
+             "created_at": created_at - timedelta(seconds=i // 2)} for i in range(count)]
+    db.bets.insert_many(bets)
+    return bets
+
+def newest_first(bets):
+    return [str(bet['_id']) for bet in sorted(bets, key=lambda bet: (bet['created_at'], bet['_id']), reverse=True)]
+
+def history(client, headers, query=''):
+    response = client.get(f'/api/betting/bet-history{query}', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_cursor_walks_history_without_gaps_or_repeats(db, client, make_user, auth_headers):
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    bets = add_bets(db, user_id, 7, db.server_timestamp())
+    add_bets(db, make_user(), 3, db.server_timestamp())
+
+    seen, cursor = [], None
+    while True:
+        page = history(client, headers, f'?limit=3&cursor={cursor}' if cursor else '?limit=3')
+        seen.extend(bet['_id'] for bet in page['bets'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(page['bets']) == 1
+    assert seen == newest_first(bets)
+
+def test_new_bets_do_not_shift_later_pages(db, client, make_user, auth_headers):
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    now = db.server_timestamp()
+    bets = add_bets(db, user_id, 6, now)
+
+    first = history(client, headers, '?limit=3')
+    add_bets(db, user_id, 2, now + timedelta(minutes=1))
+    second = history(client, headers, f"?limit=3&cursor={first['next_cursor']}")
+
+    assert [bet['_id'] for bet in second['bets']] == newest_first(bets)[3:]
+
+def test_exact_last_page_has_no_cursor(db, client, make_user, auth_headers):
+    user_id = make_user()
+    add_bets(db, user_id, 3, db.server_timestamp())
+
+    page = history(client, auth_headers(user_id), '?limit=3')
+
+    assert len(page['bets']) == 3
+    assert page['next_cursor'] is None
+
+def test_fields_limit_the_projection(db, client, make_user, auth_headers):
+    user_id = make_user()
+    add_bets(db, user_id, 1, db.server_timestamp())
+
+    bet, = history(client, auth_headers(user_id), '?fields=amount,unknown')['bets']
+
+    assert set(bet) == {"_id", "amount", "created_at"}
+
+def test_malformed_cursor_is_rejected(client, make_user, auth_headers):
+    headers = auth_headers(make_user())
+
+    for cursor in ('garbage', 'eyJjcmVhdGVkX2F0IjogMX0='):
+        response = client.get(f'/api/betting/bet-history?cursor={cursor}', headers=headers)
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid cursor"}
+
+def test_exports_stream_the_whole_history(db, client, make_user, auth_headers):
+    user_id = make_user()
+    headers = auth_headers(user_id)
+    bets = add_bets(db, user_id, 5, db.server_timestamp())
+
+    ndjson = client.get('/api/betting/bet-history/export', headers=headers)
+    exported = client.get('/api/betting/bet-history/export?format=csv&fields=game_id,amount', headers=headers)
+    rows = list(csv.DictReader(io.StringIO(exported.get_data(as_text=True))))
+
+    assert [json.loads(line)['_id'] for line in ndjson.get_data(as_text=True).splitlines()] == newest_first(bets)
+    assert exported.headers['Content-Disposition'] == 'attachment; filename=bet-history.csv'
+    assert list(rows[0]) == ['_id', 'game_id', 'amount']
+    assert [row['_id'] for row in rows] == newest_first(bets)
+    assert client.get('/api/betting/bet-history/export?format=xml', headers=headers).status_code == 400
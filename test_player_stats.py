@@ -0,0 +1,74 @@
+# casino_app/tests/test_player_stats.py
+import pytest
+from conftest import OPERATOR_TOKEN, drain
+from utils import player_stats
+from utils.player_stats import VIP_TIERS, apply_stats, stats_event, stats_queue
+from utils.user_cache import user_key
+
+def crash(*args, **kwargs):
+    raise RuntimeError("database down")
+
+def wagers(db, user_id, *amounts):
+    now = db.server_timestamp()
+    return [stats_event(user_id, 'slots', now, rounds=1, wagered=amount) for amount in amounts]
+
+def test_retried_batch_is_counted_once(monkeypatch, db, make_user):
+    user_id = make_user()
+    events = wagers(db, user_id, 5, 7)
+
+    # The first attempt updates the player, then fails on the game counters
+    with monkeypatch.context() as patch:
+        patch.setattr(db.game_stats, 'update_one', crash)
+        with pytest.raises(RuntimeError):
+            apply_stats(events, db)
+    apply_stats(events, db)
+    apply_stats(events, db)
+
+    assert db.player_stats.find_one({"_id": user_key(user_id)})['totals'] == {"rounds": 2, "wagered": 12}
+    assert db.game_stats.find_one({"_id": "slots"})['rounds'] == 2
+    assert [doc['rounds'] for doc in db.game_stats_hourly.find({})] == [2]
+
+def test_applied_batches_are_bounded(monkeypatch, db, make_user):
+    monkeypatch.setattr(player_stats, 'APPLIED_BATCHES', 2)
+    user_id = make_user()
+
+    for _ in range(5):
+        apply_stats(wagers(db, user_id, 1), db)
+
+    doc = db.player_stats.find_one({"_id": user_key(user_id)})
+    assert doc['totals']['wagered'] == 5
+    assert len(doc['applied_batches']) == 2
+
+def test_crossing_a_threshold_promotes_the_player(db, make_user):
+    (_, bronze), (_, silver) = VIP_TIERS[1], VIP_TIERS[2]
+    user_id = make_user()
+
+    apply_stats(wagers(db, user_id, bronze - 1), db)
+    assert db.users.find_one({"_id": user_key(user_id)})['vip_status'] == 'standard'
+    apply_stats(wagers(db, user_id, silver - bronze + 1), db)
+
+    assert db.users.find_one({"_id": user_key(user_id)})['vip_status'] == 'silver'
+
+def test_promotion_never_lowers_a_granted_tier(db, make_user):
+    user_id = make_user(vip_status='platinum')
+
+    apply_stats(wagers(db, user_id, VIP_TIERS[1][1]), db)
+
+    assert db.users.find_one({"_id": user_key(user_id)})['vip_status'] == 'platinum'
+
+def test_settled_rounds_reach_the_stats_endpoints(db, client, make_user, auth_headers):
+    user_id = make_user(balance=100)
+    headers = auth_headers(user_id)
+    server_seed_hash = client.get('/api/games/seed-session', headers=headers).get_json()['server_seed_hash']
+    assert client.post('/api/games/play-batch', headers=headers, json={
+        "game_type": "slots", "bet_amount": 2, "client_seed": "client", "num_spins": 5,
+        "seed_session": True, "server_seed_hash": server_seed_hash
+    }).status_code == 200
+    drain(stats_queue)
+
+    me = client.get('/api/stats/me', headers=headers).get_json()
+    dashboard = client.get('/api/stats/dashboard', headers={"X-Operator-Token": OPERATOR_TOKEN}).get_json()
+
+    assert (me['totals']['rounds'], me['totals']['wagered']) == (5, 10)
+    assert dashboard['games']['slots']['rounds'] == 5
+    assert client.get('/api/stats/dashboard').status_code == 401
@@ -0,0 +1,80 @@
+# casino_app/tests/test_rate_limit.py
+import sqlite3
+import pytest
+from utils import rate_limit
+from utils.player_stats import VIP_TIERS
+from utils.rate_limit import TIER_LIMITS, AdmissionControl
+
+def seed_session(client, headers):
+    return client.get('/api/games/seed-session', headers=headers).get_json()['server_seed_hash']
+
+def play_batch(client, headers, server_seed_hash, num_spins):
+    return client.post('/api/games/play-batch', headers=headers, json={
+        "game_type": "slots", "bet_amount": 1, "client_seed": "client", "num_spins": num_spins,
+        "seed_session": True, "server_seed_hash": server_seed_hash
+    })
+
+def test_every_vip_tier_has_limits():
+    assert list(TIER_LIMITS) == [tier for tier, _ in VIP_TIERS]
+
+def test_bets_over_the_burst_get_429_with_retry_after(client, make_user, auth_headers):
+    headers = auth_headers(make_user(balance=1000))
+    burst = int(TIER_LIMITS['standard'].burst)
+
+    statuses = [client.post('/api/betting/place-bet', headers=headers, json={"game_id": "g", "amount": 1}).status_code
+                for _ in range(burst)]
+    rejected = client.post('/api/betting/place-bet', headers=headers, json={"game_id": "g", "amount": 1})
+
+    assert statuses == [200] * burst
+    assert rejected.status_code == 429
+    assert rejected.get_json()['reason'] == 'rate'
+    assert int(rejected.headers['Retry-After']) >= 1
+
+def test_play_batch_is_charged_per_spin(client, make_user, auth_headers):
+    headers = auth_headers(make_user(balance=1000))
+    server_seed_hash = seed_session(client, headers)
+    limit = TIER_LIMITS['standard']
+
+    # A batch larger than the burst is admitted on a full bucket and leaves
+    # it in debt for the rest
+    assert play_batch(client, headers, server_seed_hash, 100).status_code == 200
+    rejected = play_batch(client, headers, server_seed_hash, 1)
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= (100 - limit.burst) / limit.rate
+
+def test_contention_turns_requests_away(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'BUSY_TIMEOUT_SECONDS', 0.01)
+    path = str(tmp_path / 'rate-limit.sqlite3')
+    admission_control = AdmissionControl(path)
+    assert admission_control.admit('test', 'player', 'standard').admitted
+
+    # Another worker holding the write lock past the busy timeout
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        admission = admission_control.admit('test', 'player', 'standard')
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+
+    assert not admission.admitted
+    assert admission.reason == 'unavailable'
+    assert admission_control.stats()['errors'] == 1
+
+def test_unusable_store_turns_requests_away(tmp_path):
+    # A directory cannot be opened as a database
+    admission = AdmissionControl(str(tmp_path)).admit('test', 'player', 'standard')
+
+    assert (admission.admitted, admission.reason) == (False, 'unavailable')
+
+@pytest.mark.parametrize('data, cost', [
+    ({"num_spins": 40}, 40),
+    ({"num_spins": True}, 1),
+    ({"num_spins": 10_000}, 1),
+    (None, 1),
+])
+def test_batch_cost(data, cost):
+    from games.game_manager import batch_cost
+
+    assert batch_cost(data) == cost
@@ -0,0 +1,32 @@
+# casino_app/tests/test_seed_sessions.py
+import asyncio
+import pytest
+from pymongo.errors import DuplicateKeyError
+from db.async_storage import AsyncEmbeddedStorage
+from db.embedded_storage import EmbeddedStorage
+from games.seed_sessions import get_active_session, get_active_session_async, rotate_session
+
+def test_session_index_exists_without_index_bootstrap():
+    db = EmbeddedStorage()
+    session = get_active_session(db, 'player')
+
+    assert 'active_session_unique' in db.seed_sessions.index_information()
+    with pytest.raises(DuplicateKeyError):
+        db.seed_sessions.insert_one({"user_id": 'player', "active": True})
+    # A second request finds the session instead of opening another
+    assert get_active_session(db, 'player')['_id'] == session['_id']
+
+def test_async_session_index_exists_without_index_bootstrap():
+    db = EmbeddedStorage()
+    asyncio.run(get_active_session_async(AsyncEmbeddedStorage(db), 'player'))
+
+    assert 'active_session_unique' in db.seed_sessions.index_information()
+
+def test_rotate_leaves_one_active_session():
+    db = EmbeddedStorage()
+    first = get_active_session(db, 'player')
+
+    previous, current = rotate_session(db, 'player')
+
+    assert previous['_id'] == first['_id'] and not previous['active']
+    assert [session['_id'] for session in db.seed_sessions.find({"active": True})] == [current['_id']]
@@ -0,0 +1,56 @@
+# casino_app/tests/test_verification.py
+from games.slots import SlotMachine
+from utils import verification
+from utils.provably_fair import RNG_VERSION, generate_server_seed, hash_server_seed
+from utils.rate_limit import TIER_LIMITS, LOWEST_TIER
+from utils.verification import GAMES_PER_TOKEN, MAX_BULK_VERIFICATIONS
+
+def rounds(count, seeds=3):
+    """count slots rounds played over a few server seeds, interleaved."""
+    machine = SlotMachine()
+    server_seeds = [generate_server_seed() for _ in range(seeds)]
+    games = []
+    for nonce in range(count):
+        server_seed = server_seeds[nonce % seeds]
+        games.append({
+            "game_type": "slots", "client_seed": "auditor", "server_seed": server_seed,
+            "server_seed_hash": hash_server_seed(server_seed), "nonce": nonce, "rng_version": RNG_VERSION,
+            "result": machine.play(1, "auditor", server_seed, nonce=nonce)
+        })
+    return games
+
+def bulk(client, games, address):
+    return client.post('/api/verify-fairness/bulk', json={"games": games}, environ_base={"REMOTE_ADDR": address})
+
+def test_pool_verdicts_come_back_in_input_order(monkeypatch, client):
+    monkeypatch.setattr(verification, 'PARALLEL_THRESHOLD', 1)
+    monkeypatch.setattr(verification, 'POOL_PROCESSES', 2)
+    monkeypatch.setattr(verification, 'CHUNK_SIZE', 4)
+    games = rounds(20)
+    tampered = {3, 10, 17}
+    for i in tampered:
+        games[i]["nonce"] += 1000
+
+    response = bulk(client, games, '10.0.0.1')
+
+    assert response.status_code == 200
+    assert [result['verified'] for result in response.get_json()['results']] == \
+        [i not in tampered for i in range(20)]
+    assert (response.get_json()['verified'], response.get_json()['failed']) == (17, 3)
+
+def test_auditors_are_charged_per_game_by_address(client):
+    limit = TIER_LIMITS[LOWEST_TIER]
+    games = [{}] * MAX_BULK_VERIFICATIONS
+
+    # No JWT needed; a full batch runs on a fresh bucket and leaves it in debt
+    assert bulk(client, games, '10.0.0.2').status_code == 200
+    rejected = bulk(client, games[:1], '10.0.0.2')
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= (MAX_BULK_VERIFICATIONS / GAMES_PER_TOKEN - limit.burst) / limit.rate
+    assert bulk(client, games[:1], '10.0.0.3').status_code == 200
+
+def test_batches_over_the_cap_are_refused(client):
+    response = bulk(client, [{}] * (MAX_BULK_VERIFICATIONS + 1), '10.0.0.4')
+
+    assert response.status_code == 400
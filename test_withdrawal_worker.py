@@ -0,0 +1,163 @@
+# casino_app/tests/test_withdrawal_worker.py
+import threading
+import pytest
+from payments.payout_gateway import GatewayUnavailable, SimulatedPayoutGateway, load_gateway
+from payments.withdrawal_worker import _refund, claim_withdrawals, process_once
+from utils.reconciliation import ledger_balance
+from utils.user_cache import user_key
+
+class FlakyGateway(SimulatedPayoutGateway):
+    """Submits every batch but loses the answer while down."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.submissions = []
+
+    def submit_batch(self, payment_method, batch_key, payouts):
+        self.submissions.append(batch_key)
+        result = super().submit_batch(payment_method, batch_key, payouts)
+        if self.down:
+            raise GatewayUnavailable("timeout")
+        return result
+
+@pytest.fixture
+def withdraw(client, auth_headers):
+    def withdraw(user_id, amount, destination='bc1-destination', payment_method='bitcoin'):
+        response = client.post('/api/payments/withdraw', headers=auth_headers(user_id), json={
+            "amount": amount, "payment_method": payment_method, "destination": destination
+        })
+        assert response.status_code == 200
+        return response.get_json()['withdrawal_id']
+    return withdraw
+
+def balance(db, user_id):
+    return db.users.find_one({"_id": user_key(user_id)})['balance']
+
+def crash(*args, **kwargs):
+    raise RuntimeError("worker died")
+
+def statuses(db):
+    return sorted(doc['status'] for doc in db.transactions.find({"type": "withdrawal"}))
+
+def test_batch_pays_out_and_refunds_rejected_withdrawals(db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 30)
+    withdraw(user_id, 20, destination=None)
+
+    summary = process_once(db, SimulatedPayoutGateway())
+
+    assert (summary['claimed'], summary['completed'], summary['failed']) == (2, 1, 1)
+    assert statuses(db) == ["completed", "failed"]
+    assert balance(db, user_id) == 70
+    assert ledger_balance(db, user_id) == balance(db, user_id) - 100
+
+def test_refund_is_paid_once(db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 20, destination=None)
+    process_once(db, SimulatedPayoutGateway())
+    failed = list(db.transactions.find({"type": "withdrawal", "status": "failed"}))
+
+    # A second worker finishing the same rejection
+    assert _refund(db, failed, db.server_timestamp()) == 0
+
+    assert balance(db, user_id) == 100
+    assert db.transactions.count_documents({"type": "refund"}) == 1
+
+def test_refund_recorded_before_a_crash_is_credited_by_recovery(monkeypatch, db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 20, destination=None)
+    update_many = db.transactions.update_many
+
+    def crash_on_refund_claim(query, update, *args, **kwargs):
+        if query.get('type') == 'refund' and 'withdrawal_id' in query:
+            raise RuntimeError("worker died")
+        return update_many(query, update, *args, **kwargs)
+
+    # The worker dies after recording the refund, before crediting it
+    with monkeypatch.context() as patch:
+        patch.setattr(db.transactions, 'update_many', crash_on_refund_claim)
+        with pytest.raises(RuntimeError):
+            process_once(db, SimulatedPayoutGateway())
+    assert balance(db, user_id) == 80
+
+    summary = process_once(db, SimulatedPayoutGateway(), claim_timeout=0)
+
+    assert summary['refunds_recovered'] == 1
+    assert balance(db, user_id) == 100
+    assert ledger_balance(db, user_id) == balance(db, user_id) - 100
+    assert db.transactions.find_one({"type": "refund"})['status'] == "completed"
+
+def test_refund_interrupted_while_crediting_is_reported_not_repaid(monkeypatch, db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 20, destination=None)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.users, 'bulk_write', crash)
+        with pytest.raises(RuntimeError):
+            process_once(db, SimulatedPayoutGateway())
+
+    summary = process_once(db, SimulatedPayoutGateway(), claim_timeout=0)
+
+    assert (summary.get('refunds_recovered', 0), summary['refunds_stuck']) == (0, 1)
+    assert balance(db, user_id) == 80
+
+def test_concurrent_claims_never_share_a_withdrawal(db, make_user, withdraw):
+    user_id = make_user(balance=1000)
+    for _ in range(40):
+        withdraw(user_id, 1)
+    barrier = threading.Barrier(4)
+    claims = []
+
+    def claim():
+        barrier.wait()
+        claims.append(claim_withdrawals(db, 40)[1])
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed_ids = [withdrawal['_id'] for claim in claims for withdrawal in claim]
+    assert len(claimed_ids) == len(set(claimed_ids)) == 40
+
+def test_unknown_outcome_is_resubmitted_under_the_same_key(db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 30)
+    gateway = FlakyGateway()
+
+    gateway.down = True
+    assert process_once(db, gateway)['unresolved'] == 1
+    assert statuses(db) == ["submitted"]
+
+    gateway.down = False
+    summary = process_once(db, gateway, claim_timeout=0)
+
+    assert (summary['resubmitted'], summary['completed']) == (1, 1)
+    assert gateway.submissions[0] == gateway.submissions[1]
+    assert db.payout_batches.count_documents({}) == 1
+    assert balance(db, user_id) == 70
+
+def test_abandoned_claims_go_back_to_pending(db, make_user, withdraw):
+    user_id = make_user(balance=100)
+    withdraw(user_id, 30)
+    claim_withdrawals(db, 10)
+
+    summary = process_once(db, SimulatedPayoutGateway(), claim_timeout=0)
+
+    assert (summary['released'], summary['claimed'], summary['completed']) == (1, 1, 1)
+    assert statuses(db) == ["completed"]
+
+@pytest.mark.parametrize('gateway', [None, 'simulator', 'payments.payout_gateway'])
+def test_gateway_must_be_configured(monkeypatch, gateway):
+    monkeypatch.delenv('PAYOUT_GATEWAY', raising=False)
+    monkeypatch.delenv('PAYOUT_SIMULATOR_ALLOWED', raising=False)
+
+    with pytest.raises(ValueError):
+        load_gateway(gateway)
+
+def test_simulator_when_allowed(monkeypatch):
+    monkeypatch.setenv('PAYOUT_SIMULATOR_ALLOWED', '1')
+
+    assert isinstance(load_gateway('simulator'), SimulatedPayoutGateway)
@@ -1,24 +1,31 @@
 # casino_app/payments/transaction_manager.py
 import os
 import uuid
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from pymongo.errors import DuplicateKeyError
 from db.database import get_db
+from payments.deposit_ingestion import MAX_WEBHOOK_EVENTS, ingest_deposits, webhook_error
+from utils.ledger import deposit_entry, post_entries, withdrawal_entry
+from utils.settlement import adjust_balance, debit, positive_amount
+from utils.user_cache import user_cache, user_key
+from utils.pagination import EXPORT_FORMATS, export_rows, keyset_page, parse_fields, parse_page_size
 
 # In a real application, you would use a Bitcoin or payment gateway SDK here
 # For demonstration, we'll simulate the API calls
 
 payment_blueprint = Blueprint('payments', __name__)
 
+DEPOSIT_METHODS = [
+    {"id": "bitcoin", "name": "Bitcoin", "min_amount": 0.001, "max_amount": 10},
+    {"id": "credit_card", "name": "Credit Card", "min_amount": 10, "max_amount": 5000},
+    {"id": "bank_transfer", "name": "Bank Transfer", "min_amount": 50, "max_amount": 10000}
+]
+
 @payment_blueprint.route('/deposit/methods', methods=['GET'])
 @jwt_required()
 def get_deposit_methods():
-    methods = [
-        {"id": "bitcoin", "name": "Bitcoin", "min_amount": 0.001, "max_amount": 10},
-        {"id": "credit_card", "name": "Credit Card", "min_amount": 10, "max_amount": 5000},
-        {"id": "bank_transfer", "name": "Bank Transfer", "min_amount": 50, "max_amount": 10000}
-    ]
-    return jsonify({"methods": methods})
+    return jsonify({"methods": DEPOSIT_METHODS})
 
 @payment_blueprint.route('/deposit/bitcoin/address', methods=['GET'])
 @jwt_required()
@@ -27,7 +34,7 @@ def get_bitcoin_address():
     db = get_db()
     
     # Retrieve or generate a Bitcoin address for the user
-    wallet = db.wallets.find_one({"user_id": current_user_id})
+    wallet = db.wallets.find_one({"user_id": user_key(current_user_id)})
     
     if not wallet:
         return jsonify({"error": "Wallet not found"}), 404
@@ -39,8 +46,9 @@ def get_bitcoin_address():
         
         db.wallets.update_one(
             {"_id": wallet['_id']},
-            {"$set": {"bitcoin_address": bitcoin_address}}
+            {"$set": {"bitcoin_address": bitcoin_address}, "$inc": {"version": 1}}
         )
+        user_cache.invalidate(current_user_id)
     else:
         bitcoin_address = wallet['bitcoin_address']
     
@@ -64,22 +72,29 @@ def confirm_deposit():
     
     db = get_db()
     
-    # Record the transaction
-    db.transactions.insert_one({
-        "user_id": current_user_id,
-        "type": "deposit",
-        "amount": amount,
-        "payment_method": payment_method,
-        "transaction_id": transaction_id,
-        "status": "completed",
-        "created_at": db.server_timestamp()
-    })
-    
-    # Update user balance
-    db.users.update_one(
-        {"_id": current_user_id},
-        {"$inc": {"balance": amount}}
-    )
+    # Record the transaction; transaction_id is unique among deposits, so a
+    # repeated confirmation is acknowledged without crediting it again
+    created_at = db.server_timestamp()
+    try:
+        db.transactions.insert_one({
+            "user_id": current_user_id,
+            "type": "deposit",
+            "amount": amount,
+            "payment_method": payment_method,
+            "transaction_id": transaction_id,
+            "status": "completed",
+            "created_at": created_at
+        })
+    except DuplicateKeyError:
+        return jsonify({
+            "message": "Deposit already confirmed",
+            "transaction_id": transaction_id,
+            "duplicate": True
+        })
+    
+    # Update user balance and post the credit to the ledger
+    if adjust_balance(db, current_user_id, amount) is not None:
+        post_entries(db, [deposit_entry(current_user_id, transaction_id, payment_method, amount, created_at)])
     
     return jsonify({
         "message": "Deposit confirmed successfully",
@@ -87,6 +102,25 @@ def confirm_deposit():
         "transaction_id": transaction_id
     })
 
+@payment_blueprint.route('/deposit/webhook', methods=['POST'])
+def deposit_webhook():
+    # Called by the payment processor, which signs the body instead of
+    # holding a user token
+    error = webhook_error(request.get_data(), request.headers.get('X-Webhook-Signature'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "events must be a non-empty list"}), 400
+    if len(events) > MAX_WEBHOOK_EVENTS:
+        return jsonify({"error": f"At most {MAX_WEBHOOK_EVENTS} events per request"}), 400
+    
+    # Every event gets a status; the batch as a whole succeeds so that the
+    # processor stops retrying it
+    return jsonify(ingest_deposits(get_db(), events))
+
 @payment_blueprint.route('/withdraw', methods=['POST'])
 @jwt_required()
 def request_withdrawal():
@@ -97,17 +131,21 @@ def request_withdrawal():
     payment_method = data.get('payment_method')
     destination = data.get('destination')  # Bitcoin address, bank details, etc.
     
-    db = get_db()
+    # Validate withdrawal amount
+    if not positive_amount(amount):
+        return jsonify({"error": "Withdrawal amount must be positive"}), 400
     
-    # Check user balance
-    user = db.users.find_one({"_id": current_user_id})
-    if not user:
-        return jsonify({"error": "User not found"}), 404
+    db = get_db()
     
-    if user['balance'] < amount:
+    # Reserve the amount (deduct from balance if it is covered)
+    remaining_balance = debit(db, current_user_id, amount)
+    if remaining_balance is None:
+        if not db.users.find_one({"_id": user_key(current_user_id)}, {"_id": True}):
+            return jsonify({"error": "User not found"}), 404
         return jsonify({"error": "Insufficient balance"}), 400
     
     # Create withdrawal request
+    created_at = db.server_timestamp()
     withdrawal_id = db.transactions.insert_one({
         "user_id": current_user_id,
         "type": "withdrawal",
@@ -115,14 +153,9 @@ def request_withdrawal():
         "payment_method": payment_method,
         "destination": destination,
         "status": "pending",
-        "created_at": db.server_timestamp()
+        "created_at": created_at
     }).inserted_id
-    
-    # Reserve the amount (deduct from balance)
-    db.users.update_one(
-        {"_id": current_user_id},
-        {"$inc": {"balance": -amount}}
-    )
+    post_entries(db, [withdrawal_entry(current_user_id, withdrawal_id, payment_method, amount, created_at)])
     
     # In a real app, you would initiate the withdrawal through your payment processor
     # For demonstration, we'll assume it's being processed
@@ -131,22 +164,48 @@ def request_withdrawal():
         "message": "Withdrawal request submitted",
         "withdrawal_id": str(withdrawal_id),
         "status": "pending",
-        "remaining_balance": user['balance'] - amount
+        "remaining_balance": remaining_balance
     })
 
+# Fields a client may request from the transaction history
+TRANSACTION_FIELDS = ('type', 'amount', 'payment_method', 'transaction_id', 'destination', 'status', 'created_at')
+
 @payment_blueprint.route('/transactions', methods=['GET'])
 @jwt_required()
 def get_transactions():
     current_user_id = get_jwt_identity()
     db = get_db()
     
-    # Get user's transaction history
-    transactions = list(db.transactions.find({"user_id": current_user_id}).sort("created_at", -1).limit(50))
+    page_size = parse_page_size(request.args.get('limit'))
+    _, projection = parse_fields(request.args.get('fields'), TRANSACTION_FIELDS)
+    
+    # Get one page of the user's transaction history
+    try:
+        transactions, next_cursor = keyset_page(
+            db.transactions,
+            {"user_id": current_user_id},
+            page_size,
+            cursor=request.args.get('cursor'),
+            projection=projection
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
     
-    # Format transactions for JSON response
-    formatted_transactions = []
-    for transaction in transactions:
-        transaction['_id'] = str(transaction['_id'])
-        formatted_transactions.append(transaction)
+    return jsonify({"transactions": transactions, "next_cursor": next_cursor})
+
+@payment_blueprint.route('/transactions/export', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    current_user_id = get_jwt_identity()
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Format must be ndjson or csv"}), 400
     
-    return jsonify({"transactions": formatted_transactions})
+    fields, _ = parse_fields(request.args.get('fields'), TRANSACTION_FIELDS)
+    rows = export_rows(get_db().transactions, {"user_id": current_user_id}, fields, fmt)
+    
+    return Response(
+        stream_with_context(rows),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{fmt}"}
+    )
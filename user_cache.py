@@ -0,0 +1,167 @@
+# casino_app/utils/user_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from bson import ObjectId
+
+# Users and wallets carry a version that every balance (or wallet) mutation
+# increments in the same atomic update. The per-process cache below keeps
+# the latest profile it has seen per user and only ever moves forward in
+# version, and profile ETags are built from the versions, so a client that
+# has seen a newer version on another worker forces a fresh read here.
+
+def user_key(user_id):
+    """
+    The users._id / wallets.user_id value for a JWT identity.
+
+    register stores ObjectIds while tokens carry their string form; ids
+    that are not ObjectId strings are used as they are.
+    """
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return ObjectId(user_id)
+    return user_id
+
+def profile_etag(user, wallet):
+    return f'v{user.get("version", 0)}.{(wallet or {}).get("version", 0)}'
+
+def parse_profile_etag(etag):
+    """(user version, wallet version) from a profile_etag value, or None."""
+    try:
+        user_version, wallet_version = etag[1:].split('.')
+        return int(user_version), int(wallet_version)
+    except (ValueError, TypeError):
+        return None
+
+def _older(versions, other):
+    """True if either version in versions is behind the one in other."""
+    return versions[0] < other[0] or versions[1] < other[1]
+
+class CachedProfile:
+    __slots__ = ('user', 'wallet', 'etag', 'versions', 'expires_at')
+
+    def __init__(self, user, wallet, ttl):
+        self.user = user
+        self.wallet = wallet
+        self.etag = profile_etag(user, wallet)
+        self.versions = (user.get('version', 0), (wallet or {}).get('version', 0))
+        self.expires_at = time.monotonic() + ttl
+
+class UserCache:
+    """
+    Bounded LRU cache of user profiles (without the password) and wallets.
+
+    Entries expire ttl seconds after they were last loaded or written
+    through, which bounds how long a change made by another worker can go
+    unseen: nothing tells this process about another's version bumps, so
+    they are only picked up on expiry or when a client presents a newer
+    ETag. Entries are shared: callers must not mutate them.
+    """
+
+    def __init__(self, max_size=10000, ttl=5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, user_id, min_versions=None):
+        """
+        Return the cached profile, or None if it is missing, expired or older
+        than min_versions (user version, wallet version).
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            expired = entry is None or entry.expires_at < time.monotonic()
+            if expired or (min_versions and _older(entry.versions, min_versions)):
+                self._misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._hits += 1
+            return entry
+
+    def put(self, user_id, user, wallet):
+        """Cache a freshly read profile unless a newer version is already cached."""
+        entry = CachedProfile(user, wallet, self.ttl)
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None and _older(entry.versions, current.versions):
+                if not _older(current.versions, entry.versions):
+                    return current
+                # Each is newer in one part; neither can be trusted whole
+                del self._entries[user_id]
+                return entry
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return entry
+
+    def write_balance(self, user_id, balance, version):
+        """Write through a balance returned by an atomic update at version."""
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is None or current.versions[0] >= version:
+                return
+            user = dict(current.user, balance=balance, version=version)
+            self._entries[user_id] = CachedProfile(user, current.wallet, self.ttl)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions
+        }
+
+user_cache = UserCache(
+    max_size=int(os.getenv('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '5'))
+)
+
+def load_profile(db, user_id, min_versions=None):
+    """
+    Return a user's CachedProfile, reading users and wallets on a miss.
+
+    Returns:
+        CachedProfile, or None if the user does not exist
+    """
+    entry = user_cache.get(user_id, min_versions)
+    if entry:
+        return entry
+
+    key = user_key(user_id)
+    user = db.users.find_one({"_id": key}, {"password": False})
+    if not user:
+        return None
+    wallet = db.wallets.find_one({"user_id": key})
+    return user_cache.put(user_id, user, wallet)
+
+async def load_profile_async(db, user_id, min_versions=None):
+    entry = user_cache.get(user_id, min_versions)
+    if entry:
+        return entry
+
+    key = user_key(user_id)
+    user = await db.users.find_one({"_id": key}, {"password": False})
+    if not user:
+        return None
+    wallet = await db.wallets.find_one({"user_id": key})
+    return user_cache.put(user_id, user, wallet)
+
+def newest_seen_versions(etags):
+    """Highest (user version, wallet version) among a request's If-None-Match tags."""
+    seen = [parse_profile_etag(etag) for etag in etags.as_set(include_weak=True)]
+    seen = [versions for versions in seen if versions]
+    if not seen:
+        return None
+    return max(versions[0] for versions in seen), max(versions[1] for versions in seen)
@@ -2,13 +2,35 @@
 import os
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 from db.database import get_db
+from utils.password_hashing import HasherBusy, password_hasher
+from utils.user_cache import load_profile, newest_seen_versions
 
 # Initialize JWT and blueprint
 jwt = JWTManager()
 auth_blueprint = Blueprint('auth', __name__)
 
+# Returned with a 503 when the password hashing pool is saturated, e.g. by a
+# login storm at a promotion start
+HASHER_BUSY_ERROR = "Too many sign-ins in progress, please retry shortly"
+
+def rehash_password(db, user, password):
+    """
+    Re-hash a verified password with the current PASSWORD_HASH_METHOD.
+
+    The update only applies if the stored hash is still the one that was
+    verified, so a concurrent password change is never overwritten. A busy
+    hashing pool skips the upgrade until the next sign-in.
+    """
+    try:
+        new_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return
+    db.users.update_one(
+        {"_id": user['_id'], "password": user['password']},
+        {"$set": {"password": new_hash}}
+    )
+
 @auth_blueprint.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -19,13 +41,17 @@ def register():
         return jsonify({"error": "Username already exists"}), 400
 
     # Create new user
-    hashed_password = generate_password_hash(data['password'])
+    try:
+        hashed_password = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return jsonify({"error": HASHER_BUSY_ERROR}), 503, {"Retry-After": "1"}
     new_user = {
         "username": data['username'],
         "password": hashed_password,
         "email": data['email'],
         "balance": 0,
         "vip_status": "standard",
+        "version": 0,
         "created_at": db.server_timestamp()
     }
     
@@ -36,7 +62,8 @@ def register():
         "user_id": user_id,
         "bitcoin_address": "",  # To be generated or provided by user
         "balance": 0,
-        "transactions": []
+        "transactions": [],
+        "version": 0
     })
     
     return jsonify({"message": "User registered successfully"}), 201
@@ -48,28 +75,48 @@ def login():
     
     user = db.users.find_one({"username": data['username']})
     
-    if not user or not check_password_hash(user['password'], data['password']):
+    try:
+        valid = bool(user) and password_hasher.verify(user['password'], data['password'])
+    except HasherBusy:
+        return jsonify({"error": HASHER_BUSY_ERROR}), 503, {"Retry-After": "1"}
+    
+    if not valid:
         return jsonify({"error": "Invalid credentials"}), 401
     
+    # Upgrade hashes made with older cost settings while the password is at hand
+    if password_hasher.needs_rehash(user['password']):
+        rehash_password(db, user, data['password'])
+    
     access_token = create_access_token(identity=str(user['_id']))
     return jsonify({"token": access_token, "user_id": str(user['_id'])}), 200
 
 @auth_blueprint.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
+    """
+    The player's profile and wallet, served from this worker's user cache.
+
+    Staleness: a change made through this worker shows at once. A change
+    made by another worker, or by the payment and withdrawal jobs, can take
+    up to USER_CACHE_TTL seconds (default 5) to show here, unless the client
+    sends the newer ETag it was given, which forces a fresh read. Balance
+    checks for bets and withdrawals are made in the database, never here.
+    """
     current_user_id = get_jwt_identity()
-    db = get_db()
     
-    user = db.users.find_one({"_id": current_user_id})
-    wallet = db.wallets.find_one({"user_id": current_user_id})
-    
-    if not user:
+    # Served from the user cache; a client holding a newer version than the
+    # cached one (seen on another worker) forces a fresh read
+    profile = load_profile(get_db(), current_user_id, newest_seen_versions(request.if_none_match))
+    if not profile:
         return jsonify({"error": "User not found"}), 404
     
-    # Remove sensitive information
-    user.pop('password', None)
+    if profile.etag in request.if_none_match:
+        return '', 304, {"ETag": f'"{profile.etag}"', "Cache-Control": "private, no-cache"}
     
-    return jsonify({
-        "user": user,
-        "wallet": wallet
-    }), 200
+    response = jsonify({
+        "user": profile.user,
+        "wallet": profile.wallet
+    })
+    response.set_etag(profile.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response, 200
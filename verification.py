@@ -0,0 +1,98 @@
+# casino_app/utils/verification.py
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from utils.provably_fair import verify_fairness_batch
+
+# Batches smaller than this are verified inline; shipping them to the pool
+# costs more than replaying them
+PARALLEL_THRESHOLD = int(os.getenv('VERIFY_PARALLEL_THRESHOLD', '500'))
+CHUNK_SIZE = int(os.getenv('VERIFY_CHUNK_SIZE', '250'))
+POOL_PROCESSES = int(os.getenv('VERIFY_POOL_PROCESSES', str(os.cpu_count() or 1)))
+
+# Largest number of games accepted by one bulk verification request
+MAX_BULK_VERIFICATIONS = int(os.getenv('MAX_BULK_VERIFICATIONS', '10000'))
+# Games replayed per rate limit token taken by a bulk verification request
+GAMES_PER_TOKEN = int(os.getenv('VERIFY_GAMES_PER_TOKEN', '100'))
+
+_SEED_FIELDS = ('game_type', 'client_seed', 'server_seed_hash', 'server_seed')
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork belongs to the parent process
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=POOL_PROCESSES)
+            _pool_pid = os.getpid()
+        return _pool
+
+def bulk_cost(data):
+    """Rate limit tokens for a bulk verification request body: one per GAMES_PER_TOKEN games."""
+    games = data.get('games') if isinstance(data, dict) else None
+    if not isinstance(games, list):
+        return 1
+    return max(1, math.ceil(min(len(games), MAX_BULK_VERIFICATIONS) / GAMES_PER_TOKEN))
+
+def verification_error(game):
+    """
+    Check one game of a verification request body.
+
+    Returns:
+        str: What is wrong with it, or None if it can be verified
+    """
+    if not isinstance(game, dict):
+        return "Request body must be a JSON object"
+    for field in _SEED_FIELDS:
+        if not isinstance(game.get(field), str) or not game[field]:
+            return f"{field} must be a non-empty string"
+    for field in ('nonce', 'rng_version'):
+        value = game.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            return f"{field} must be a non-negative integer"
+    if not isinstance(game.get('result'), dict):
+        return "result must be an object"
+    return None
+
+def verification_args(game):
+    """Turn one game of a verification request body into a verify_fairness argument tuple."""
+    if not isinstance(game, dict):
+        return (None,) * 7
+    return (
+        game.get('game_type'),
+        game.get('client_seed'),
+        game.get('server_seed_hash'),
+        game.get('server_seed'),
+        game.get('nonce'),
+        game.get('result'),
+        game.get('rng_version')
+    )
+
+def verify_games(games):
+    """
+    Verify a list of (game_type, client_seed, server_seed_hash, server_seed,
+    nonce, game_result, rng_version) tuples, spreading large batches over a
+    process pool; malformed games come back unverified.
+
+    Games are grouped by server seed before chunking so each worker hashes a
+    seed once for all of its rounds in a chunk.
+
+    Returns:
+        list: One bool per game, in input order
+    """
+    if len(games) < PARALLEL_THRESHOLD or POOL_PROCESSES < 2:
+        return verify_fairness_batch(games)
+
+    order = sorted(range(len(games)), key=lambda i: str(games[i][3]))
+    chunks = [order[i:i + CHUNK_SIZE] for i in range(0, len(order), CHUNK_SIZE)]
+    results = _get_pool().map(verify_fairness_batch, [[games[i] for i in chunk] for chunk in chunks])
+
+    verdicts = [False] * len(games)
+    for chunk, chunk_verdicts in zip(chunks, results):
+        for i, verified in zip(chunk, chunk_verdicts):
+            verdicts[i] = verified
+    return verdicts
@@ -0,0 +1,62 @@
+# casino_app/warmup.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db.database import get_db
+from db.indexes import ensure_indexes
+from games.game_registry import load_engines
+from utils.password_hashing import password_hasher
+
+logger = logging.getLogger(__name__)
+
+# Cheap routes exercised once so the first real request does not pay for
+# lazy Flask, JSON provider and blueprint setup
+WARMUP_ROUTES = ('/api/health', '/api/games/available')
+
+def warm_up(app, connections=0):
+    """
+    Prepare a freshly forked worker before it accepts traffic.
+
+    Pings the database (which opens the pool), optionally opens extra pooled
+    connections, makes sure the indexes exist, builds the game engines,
+    resolves the password hash parameters and runs the cheap routes once.
+
+    Args:
+        app: The Flask application
+        connections: Pooled connections to open before the first burst of
+            requests. They are pinged at the same time, since pings one after
+            another would all reuse the first connection; MONGO_MIN_POOL_SIZE
+            (which defaults to WARMUP_CONNECTIONS) keeps them open afterwards.
+
+    Returns:
+        float: Seconds spent warming up
+    """
+    started = time.perf_counter()
+    db = get_db()
+    db.ping()
+    if connections > 1:
+        _ping_concurrently(db, connections)
+    ensure_indexes(db)
+    load_engines()
+    password_hasher.needs_rehash('')
+
+    client = app.test_client()
+    for route in WARMUP_ROUTES:
+        client.get(route)
+
+    elapsed = time.perf_counter() - started
+    logger.info("Worker warmed up in %.3fs", elapsed)
+    return elapsed
+
+def _ping_concurrently(db, connections):
+    # Every ping waits for the others to start, so each checks out its own connection
+    barrier = threading.Barrier(connections)
+
+    def ping():
+        barrier.wait(timeout=5)
+        return db.ping()
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        for future in [pool.submit(ping) for _ in range(connections)]:
+            future.result()
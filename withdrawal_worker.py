@@ -0,0 +1,355 @@
+# casino_app/payments/withdrawal_worker.py
+"""
+Background processor for pending withdrawals.
+
+request_withdrawal debits the balance and records a pending withdrawal;
+this worker pays them out. Each cycle it
+
+    1. claims up to --batch-size pending withdrawals: one update_many moves
+       them to processing under a fresh claim id, conditional on their still
+       being pending, so any number of workers can run side by side and each
+       withdrawal lands in exactly one claim
+    2. groups the claim by payment_method and submits every group to the
+       payout gateway as one batch (one multi-output Bitcoin transaction,
+       one bank file, ...)
+    3. writes the outcome back in bulk: one update_many for the payouts
+       that went out, one bulk_write for the ones the gateway rejected, and
+       for those the refund records (unique per withdrawal, so a refund is
+       never paid twice), one refund $inc per user and their ledger entries
+       under the same pending -> crediting -> completed claim as deposits
+
+A withdrawal moves pending -> processing -> submitted -> completed | failed.
+Claims that stay in processing longer than --claim-timeout (a worker died
+before submitting) go back to pending. Claims stuck in submitted (the
+outcome of the submission is unknown) are taken over and resubmitted under
+their original batch key, which the gateway deduplicates, so nothing is paid
+twice. Refunds still pending after --claim-timeout (a worker died before
+crediting them) are credited, and ones stuck crediting are reported.
+
+Usage:
+    python -m payments.withdrawal_worker
+    python -m payments.withdrawal_worker --once --batch-size 500
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from payments.payout_gateway import GatewayUnavailable, load_gateway
+from utils.ledger import post_entries, refund_entry
+from utils.user_cache import user_cache, user_key
+from utils.write_behind import DUPLICATE_KEY
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv('WITHDRAWAL_BATCH_SIZE', '200'))
+POLL_INTERVAL = float(os.getenv('WITHDRAWAL_POLL_INTERVAL', '5'))
+CLAIM_TIMEOUT = float(os.getenv('WITHDRAWAL_CLAIM_TIMEOUT', '300'))
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+def _claimed(db, claim_id):
+    return list(db.transactions.find({"type": "withdrawal", "claim_id": claim_id}))
+
+def claim_withdrawals(db, batch_size):
+    """
+    Claim the oldest pending withdrawals for this worker.
+
+    Returns:
+        tuple: (claim id, claimed withdrawal documents)
+    """
+    candidates = db.transactions.find(
+        {"type": "withdrawal", "status": "pending"}, {"_id": True}
+    ).sort("created_at", 1).limit(batch_size)
+    ids = [doc['_id'] for doc in candidates]
+    if not ids:
+        return None, []
+
+    # Another worker may claim some of the same candidates first; the status
+    # condition gives each withdrawal to exactly one of us
+    claim_id = ObjectId()
+    db.transactions.update_many(
+        {"_id": {"$in": ids}, "status": "pending"},
+        {"$set": {"status": "processing", "claim_id": claim_id, "claimed_by": WORKER_ID,
+                  "claimed_at": db.server_timestamp()}}
+    )
+    return claim_id, _claimed(db, claim_id)
+
+def recover_stale_claims(db, claim_timeout):
+    """
+    Release claims a worker abandoned before submitting, and take over the
+    ones whose submission outcome is unknown.
+
+    Returns:
+        tuple: (number of withdrawals returned to pending, claim id, list of
+        withdrawals to resubmit)
+    """
+    now = db.server_timestamp()
+    cutoff = now - timedelta(seconds=claim_timeout)
+
+    released = db.transactions.update_many(
+        {"type": "withdrawal", "status": "processing", "claimed_at": {"$lt": cutoff}},
+        {"$set": {"status": "pending"}, "$unset": {"claim_id": "", "claimed_by": "", "claimed_at": ""}}
+    ).modified_count
+
+    claim_id = ObjectId()
+    db.transactions.update_many(
+        {"type": "withdrawal", "status": "submitted", "claimed_at": {"$lt": cutoff}},
+        {"$set": {"claim_id": claim_id, "claimed_by": WORKER_ID, "claimed_at": now}}
+    )
+    return released, claim_id, _claimed(db, claim_id)
+
+def _credit_refunds(db, claim_id):
+    """Credit the refunds claimed under claim_id: one $inc per user, one ledger entry per refund."""
+    refunds = list(db.transactions.find({"type": "refund", "status": "crediting", "claim_id": claim_id}))
+    if not refunds:
+        return 0
+
+    totals = defaultdict(int)
+    for refund in refunds:
+        totals[refund['user_id']] += refund['amount']
+    db.users.bulk_write([
+        UpdateOne({"_id": user_key(user_id)}, {"$inc": {"balance": amount, "version": 1}})
+        for user_id, amount in totals.items()
+    ], ordered=False)
+    for user_id in totals:
+        user_cache.invalidate(user_id)
+    post_entries(db, [
+        refund_entry(refund['user_id'], refund['withdrawal_id'], refund.get('payment_method'),
+                     refund['amount'], refund['created_at'])
+        for refund in refunds
+    ])
+    db.transactions.update_many(
+        {"_id": {"$in": [refund['_id'] for refund in refunds]}, "claim_id": claim_id},
+        {"$set": {"status": "completed"}}
+    )
+    return len(refunds)
+
+def _claim_refunds(db, refund_filter):
+    claim_id = ObjectId()
+    db.transactions.update_many(
+        dict(refund_filter, type="refund", status="pending"),
+        {"$set": {"status": "crediting", "claim_id": claim_id}}
+    )
+    return claim_id
+
+def _refund(db, withdrawals, timestamp):
+    """
+    Give rejected withdrawals back.
+
+    Refund records go pending -> crediting -> completed, as deposits do in
+    payments.deposit_ingestion. The records are inserted as pending and are
+    unique per withdrawal; only the worker whose conditional update moves a
+    record to crediting credits it, with one $inc per user and one ledger
+    entry per refund, and then marks it completed. A record that is already
+    there but still pending (an earlier attempt died before crediting it) is
+    claimed and credited like a new one.
+
+    Returns:
+        int: Number of withdrawals refunded by this call
+    """
+    try:
+        db.transactions.insert_many([{
+            "user_id": withdrawal['user_id'],
+            "type": "refund",
+            "amount": withdrawal['amount'],
+            "payment_method": withdrawal.get('payment_method'),
+            "withdrawal_id": str(withdrawal['_id']),
+            "status": "pending",
+            "created_at": timestamp
+        } for withdrawal in withdrawals], ordered=False)
+    except BulkWriteError as e:
+        if any(error.get('code') != DUPLICATE_KEY for error in e.details.get('writeErrors', [])):
+            raise
+
+    claim_id = _claim_refunds(db, {"withdrawal_id": {"$in": [str(withdrawal['_id']) for withdrawal in withdrawals]}})
+    return _credit_refunds(db, claim_id)
+
+def recover_refunds(db, claim_timeout):
+    """
+    Credit refunds a worker recorded but died before crediting, and report
+    the ones it died while crediting.
+
+    A refund stuck in crediting cannot be told apart from one whose $inc
+    landed, so it is never credited again; it is logged for reconciliation
+    against the ledger to settle.
+
+    Returns:
+        tuple: (number of refunds credited, number stuck in crediting)
+    """
+    cutoff = db.server_timestamp() - timedelta(seconds=claim_timeout)
+    credited = _credit_refunds(db, _claim_refunds(db, {"created_at": {"$lt": cutoff}}))
+
+    stuck = db.transactions.count_documents({"type": "refund", "status": "crediting", "created_at": {"$lt": cutoff}})
+    if stuck:
+        logger.warning("%d refunds are stuck crediting; reconcile their balances against the ledger", stuck)
+    return credited, stuck
+
+def submit_batch(db, gateway, claim_id, payment_method, batch_key, withdrawals):
+    """
+    Pay out one group of claimed withdrawals and record the outcome.
+
+    Returns:
+        dict: Number of withdrawals completed, failed (and refunded) and
+        left unresolved
+    """
+    ids = [withdrawal['_id'] for withdrawal in withdrawals]
+    marked = db.transactions.update_many(
+        {"_id": {"$in": ids}, "claim_id": claim_id},
+        {"$set": {"status": "submitted", "payout_batch": batch_key}}
+    ).matched_count
+    if marked < len(ids):
+        # Part of the claim timed out and went to another worker; only pay
+        # out what is still ours
+        withdrawals = list(db.transactions.find({"_id": {"$in": ids}, "claim_id": claim_id}))
+        if not withdrawals:
+            return {"completed": 0, "failed": 0, "unresolved": 0}
+
+    try:
+        result = gateway.submit_batch(payment_method, batch_key, [{
+            "withdrawal_id": str(withdrawal['_id']),
+            "destination": withdrawal.get('destination'),
+            "amount": withdrawal['amount']
+        } for withdrawal in withdrawals])
+    except GatewayUnavailable:
+        # Left in submitted; resubmitted under the same key once the claim times out
+        logger.warning("Payout batch %s (%d %s withdrawals) has an unknown outcome",
+                       batch_key, len(withdrawals), payment_method, exc_info=True)
+        return {"completed": 0, "failed": 0, "unresolved": len(withdrawals)}
+
+    now = db.server_timestamp()
+    sent = [withdrawal for withdrawal in withdrawals if str(withdrawal['_id']) not in result.failed]
+    rejected = [withdrawal for withdrawal in withdrawals if str(withdrawal['_id']) in result.failed]
+
+    if sent:
+        db.transactions.update_many(
+            {"_id": {"$in": [withdrawal['_id'] for withdrawal in sent]}, "claim_id": claim_id, "status": "submitted"},
+            {"$set": {"status": "completed", "payout_reference": result.reference, "completed_at": now}}
+        )
+
+    if rejected:
+        db.transactions.bulk_write([
+            UpdateOne(
+                {"_id": withdrawal['_id'], "claim_id": claim_id, "status": "submitted"},
+                {"$set": {"status": "failed", "failure_reason": result.failed[str(withdrawal['_id'])],
+                          "completed_at": now}}
+            )
+            for withdrawal in rejected
+        ], ordered=False)
+        _refund(db, rejected, now)
+
+    db.payout_batches.update_one(
+        {"_id": batch_key},
+        {"$set": {
+            "payment_method": payment_method,
+            "reference": result.reference,
+            "fee": result.fee,
+            "withdrawals": len(withdrawals),
+            "sent": len(sent),
+            "amount": sum(withdrawal['amount'] for withdrawal in sent),
+            "completed_at": now
+        }},
+        upsert=True
+    )
+    return {"completed": len(sent), "failed": len(rejected), "unresolved": 0}
+
+def _submit_groups(db, gateway, claim_id, groups, summary):
+    for batch_key, (payment_method, withdrawals) in groups.items():
+        for key, count in submit_batch(db, gateway, claim_id, payment_method, batch_key, withdrawals).items():
+            summary[key] += count
+        summary["batches"] += 1
+
+def process_once(db, gateway, batch_size=BATCH_SIZE, claim_timeout=CLAIM_TIMEOUT):
+    """
+    Run one claim-and-pay cycle.
+
+    Returns:
+        dict: Counts of claimed, completed, failed, unresolved, released and
+        resubmitted withdrawals, of payout batches submitted, and of
+        recovered and stuck refunds
+    """
+    summary = defaultdict(int)
+
+    recovered, stuck = recover_refunds(db, claim_timeout)
+    if recovered:
+        summary["refunds_recovered"] = recovered
+    if stuck:
+        summary["refunds_stuck"] = stuck
+
+    released, recovery_id, stale = recover_stale_claims(db, claim_timeout)
+    summary["released"] = released
+    summary["resubmitted"] = len(stale)
+    if stale:
+        groups = {}
+        for withdrawal in stale:
+            groups.setdefault(withdrawal['payout_batch'], (withdrawal.get('payment_method'), []))[1].append(withdrawal)
+        _submit_groups(db, gateway, recovery_id, groups, summary)
+
+    claim_id, claimed = claim_withdrawals(db, batch_size)
+    summary["claimed"] = len(claimed)
+    if claimed:
+        groups = {}
+        for withdrawal in claimed:
+            payment_method = withdrawal.get('payment_method')
+            groups.setdefault(f"{claim_id}:{payment_method}", (payment_method, []))[1].append(withdrawal)
+        _submit_groups(db, gateway, claim_id, groups, summary)
+
+    return dict(summary)
+
+def run(db, gateway, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL, claim_timeout=CLAIM_TIMEOUT, stop=None):
+    """Process withdrawals until stop is set, sleeping poll_interval whenever there is nothing to claim."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            summary = process_once(db, gateway, batch_size, claim_timeout)
+        except Exception:
+            logger.exception("Withdrawal cycle failed")
+            stop.wait(poll_interval)
+            continue
+        if any(summary.get(key) for key in ('claimed', 'resubmitted', 'released', 'refunds_recovered')):
+            logger.info("Withdrawal cycle: %s", summary)
+        # A full claim means more is waiting
+        if summary.get('claimed', 0) < batch_size:
+            stop.wait(poll_interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pay out pending withdrawals in batches")
+    parser.add_argument('--once', action='store_true', help="Run a single cycle and print its summary")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Withdrawals claimed per cycle")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="Seconds between polls when idle")
+    parser.add_argument('--claim-timeout', type=float, default=CLAIM_TIMEOUT,
+                        help="Seconds after which another worker may take over a claim")
+    parser.add_argument('--gateway', default=None, help="Overrides PAYOUT_GATEWAY")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        gateway = load_gateway(args.gateway)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from db.database import get_db
+    db = get_db()
+
+    if args.once:
+        print(json.dumps(process_once(db, gateway, args.batch_size, args.claim_timeout), indent=2))
+        return 0
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    logger.info("Withdrawal worker %s started", WORKER_ID)
+    run(db, gateway, args.batch_size, args.interval, args.claim_timeout, stop)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+# casino_app/utils/write_behind.py
+import atexit
+import glob
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+# Where records that overflow a full queue, or that could not be written,
+# are kept as JSON lines
+SPILL_DIR = os.getenv('WRITE_BEHIND_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'casino-write-behind'))
+
+# Keeps ObjectIds, datetimes and int/float apart through the round trip
+_JSON_OPTIONS = json_util.JSONOptions(json_mode=json_util.JSONMode.CANONICAL, tz_aware=False)
+
+def _append_lines(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.writelines(json_util.dumps(record, json_options=_JSON_OPTIONS) + '\n' for record in records)
+
+def _read_lines(path):
+    with open(path) as f:
+        return [json_util.loads(line, json_options=_JSON_OPTIONS) for line in f if line.strip()]
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def insert_many_idempotent(collection, documents):
+    """
+    insert_many that can be retried with the same documents.
+
+    pymongo assigns each document its _id on the first attempt, so after a
+    partial failure the retry reports the rows that already landed as
+    duplicate keys; those count as written.
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY for error in errors):
+            raise
+
+async def insert_many_idempotent_async(collection, documents):
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY for error in errors):
+            raise
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue that persists records off the request path.
+
+    A background thread hands records to flush in batches once batch_size
+    records are waiting or flush_interval seconds have passed. When the queue
+    is full, put blocks for up to put_timeout seconds and then appends the
+    record to a spill file on local disk, so a request never waits on the
+    database; the thread writes spilled records once the queue has drained,
+    as do other workers for the files of a worker that died.
+
+    A failed flush is retried with backoff up to max_retries times. A batch
+    that still fails is moved to a dead-letter file and logged, so it cannot
+    hold up the records behind it; replay it once the cause is fixed by
+    renaming it to <name>.<pid>.spill.jsonl. close() drains everything still
+    queued. The thread starts lazily, so a queue created before a gunicorn
+    fork runs in each worker.
+    """
+
+    def __init__(self, name, flush, max_size=10000, batch_size=500, flush_interval=0.05,
+                 put_timeout=1.0, max_retry_delay=5.0, max_retries=8, spill_dir=SPILL_DIR):
+        self.name = name
+        self._flush = flush
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._thread = None
+        self._stopping = threading.Event()
+        # Counters are bumped from request threads and the flush thread
+        self._stats_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_pending = False
+        self._enqueued = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._failures = 0
+        self._spilled = 0
+        self._dead_lettered = 0
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+        self._last_flush_seconds = 0.0
+
+    def _count(self, counter, n=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _spill_path(self, pid=None):
+        return os.path.join(self.spill_dir, f'{self.name}.{pid or os.getpid()}.spill.jsonl')
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked child: the parent's thread and queue do not exist here
+                self._reset()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+                self._thread.start()
+
+    def put(self, record):
+        """Queue one record, spilling it to disk if the queue stays full for put_timeout."""
+        self._ensure_started()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._spill([record])
+            return
+        self._count('_enqueued')
+
+    def _spill(self, records):
+        with self._spill_lock:
+            _append_lines(self._spill_path(), records)
+            self._spill_pending = True
+        self._count('_spilled', len(records))
+        logger.warning("Write-behind queue %s is full, spilled %d records to disk", self.name, len(records))
+
+    def put_many(self, records):
+        for record in records:
+            self.put(record)
+
+    def put_many_nowait(self, records):
+        """
+        Queue as many records as fit without blocking.
+
+        Returns:
+            list: The records that did not fit, for the caller to hand to
+            put_many off the event loop
+        """
+        self._ensure_started()
+        for i, record in enumerate(records):
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                return records[i:]
+            self._count('_enqueued')
+        return []
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        delay = 0.05
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self._flush(batch)
+            except Exception:
+                self._count('_failures')
+                if attempt == self.max_retries:
+                    logger.exception("Write-behind flush of %d %s records failed, giving up", len(batch), self.name)
+                    break
+                logger.exception("Write-behind flush of %d %s records failed, retrying", len(batch), self.name)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._flushes += 1
+                self._flushed += len(batch)
+                self._last_flush_seconds = elapsed
+                self._flush_seconds_total += elapsed
+                self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+            return True
+        self._dead_letter(batch)
+        return False
+
+    def _dead_letter(self, batch):
+        path = os.path.join(self.spill_dir, f'{self.name}.{os.getpid()}.dead-letter.jsonl')
+        try:
+            _append_lines(path, batch)
+        except (OSError, TypeError, ValueError):
+            logger.critical("Dropped %d %s records that could not be written: %r", len(batch), self.name, batch,
+                            exc_info=True)
+        else:
+            logger.error("Moved %d %s records to %s after %d attempts",
+                         len(batch), self.name, path, self.max_retries + 1)
+        self._count('_dead_lettered', len(batch))
+
+    def _spill_files(self):
+        """Spill files this process may replay: its own and those of dead processes."""
+        own = self._spill_path()
+        claimed = None
+        with self._spill_lock:
+            if self._spill_pending and os.path.exists(own):
+                # Claim the file under the lock so no put appends to it mid-replay
+                claimed = f'{own}.{time.time_ns()}'
+                os.rename(own, claimed)
+            self._spill_pending = False
+        if claimed:
+            yield claimed
+
+        for path in glob.glob(os.path.join(self.spill_dir, f'{self.name}.*.spill.jsonl')):
+            pid = path[len(os.path.join(self.spill_dir, self.name)) + 1:].split('.')[0]
+            if not pid.isdigit() or int(pid) == os.getpid() or _process_alive(int(pid)):
+                continue
+            claimed = f'{path}.{os.getpid()}.{time.time_ns()}'
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Another worker got there first
+                continue
+            yield claimed
+
+    def _replay_spilled(self):
+        for path in self._spill_files():
+            records = _read_lines(path)
+            for i in range(0, len(records), self.batch_size):
+                self._write(records[i:i + self.batch_size])
+            os.remove(path)
+
+    def _run(self):
+        # Pick up whatever a previous worker left behind
+        self._spill_pending = True
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._spill_pending:
+                try:
+                    self._replay_spilled()
+                except (OSError, ValueError):
+                    logger.exception("Could not replay spilled %s records", self.name)
+        try:
+            self._replay_spilled()
+        except (OSError, ValueError):
+            logger.exception("Could not replay spilled %s records", self.name)
+
+    def close(self, timeout=30):
+        """Stop the background thread once every queued record is written."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Write-behind queue %s still has %d records after %ss", self.name, self._queue.qsize(), timeout)
+
+    def stats(self):
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self.max_size,
+            "enqueued": self._enqueued,
+            "flushed": self._flushed,
+            "flushes": self._flushes,
+            "flush_failures": self._failures,
+            "spilled": self._spilled,
+            "dead_lettered": self._dead_lettered,
+            "last_flush_ms": self._last_flush_seconds * 1000,
+            "max_flush_ms": self._flush_seconds_max * 1000,
+            "avg_flush_ms": self._flush_seconds_total / self._flushes * 1000 if self._flushes else 0.0
+        }
+
+def create_queue(name, flush, env_prefix):
+    """Build a queue configured from <env_prefix>_* variables and drain it at exit."""
+    write_queue = WriteBehindQueue(
+        name,
+        flush,
+        max_size=int(os.getenv(f'{env_prefix}_MAX_SIZE', '10000')),
+        batch_size=int(os.getenv(f'{env_prefix}_BATCH_SIZE', '500')),
+        flush_interval=float(os.getenv(f'{env_prefix}_FLUSH_INTERVAL', '0.05')),
+        put_timeout=float(os.getenv(f'{env_prefix}_PUT_TIMEOUT', '1.0')),
+        max_retries=int(os.getenv(f'{env_prefix}_MAX_RETRIES', '8'))
+    )
+    atexit.register(write_queue.close)
+    return write_queue